@@ -0,0 +1,120 @@
+import asyncio
+import os
+import shutil
+
+import testInterface
+from testInterface import async_run_sumo_pretest, async_run_sumo_drytest
+
+
+# Max test files pretested together by the daemon runner
+PRETEST_BATCH_SIZE = int(os.getenv("PRETEST_BATCH_SIZE", "8"))
+
+
+def copy_to_workspace(test_file_path: str, workspace: str) -> str:
+    """
+    Make a test file available in the test folder of a workspace.
+
+    :return: the path to the test file in the workspace
+    """
+    test_dir_name = os.path.basename(os.path.dirname(test_file_path))
+    workspace_test_file_path = os.path.join(workspace, test_dir_name, os.path.basename(test_file_path))
+    if os.path.abspath(workspace_test_file_path) != os.path.abspath(test_file_path):
+        shutil.copy2(test_file_path, workspace_test_file_path)
+    return workspace_test_file_path
+
+
+class AsyncSuMoExecutor:
+    """
+    Runs the SuMo stages of the asyncio pipeline on the event loop.
+    Mutants are processed in worker threads (LLM stages block on the network there), while their
+    pretests and drytests are submitted to the loop and executed as asyncio subprocesses on a pool
+    of SUT workspaces, at most one SuMo process per workspace.
+    With the daemon runner, the pretests waiting for a workspace are run together as one batch,
+    so the compilation and Mocha start-up are paid once per batch.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, workspaces: list):
+        """
+        :param loop: the running event loop
+        :param workspaces: the SUT folders in which SuMo can be run concurrently
+        """
+        self.loop = loop
+        self.workspaces = asyncio.Queue()
+        for workspace in workspaces:
+            self.workspaces.put_nowait(workspace)
+        # Pretests waiting for a workspace: (test file path, future of the outcome)
+        self._pretests = []
+        self._dispatches = set()
+
+    async def _run_in_workspace(self, test_file_path: str, run):
+        workspace = await self.workspaces.get()
+        try:
+            return await run(copy_to_workspace(test_file_path, workspace), workspace)
+        finally:
+            self.workspaces.put_nowait(workspace)
+
+    async def pretest(self, test_file_path: str) -> str:
+        """
+        Run sumo pretest on the first available workspace, batched with the other waiting pretests.
+        """
+        outcome = self.loop.create_future()
+        self._pretests.append((test_file_path, outcome))
+        # Whichever dispatch gets a workspace first runs all the pretests waiting by then
+        dispatch = self.loop.create_task(self._dispatch_pretests())
+        self._dispatches.add(dispatch)
+        dispatch.add_done_callback(self._dispatches.discard)
+        return await outcome
+
+    async def _dispatch_pretests(self):
+        workspace = await self.workspaces.get()
+        try:
+            batch_size = PRETEST_BATCH_SIZE if testInterface.sumo_runner == "daemon" else 1
+            batch = self._pretests[:batch_size]
+            del self._pretests[:len(batch)]
+            if len(batch) == 0:
+                return
+            try:
+                paths = [copy_to_workspace(test_file_path, workspace) for test_file_path, _ in batch]
+                if testInterface.sumo_runner == "daemon":
+                    from sumoDaemon import get_sumo_daemon
+                    outcomes = await asyncio.to_thread(get_sumo_daemon(workspace).run_sumo_pretests, paths)
+                else:
+                    outcomes = {paths[0]: await async_run_sumo_pretest(paths[0], workspace)}
+            except asyncio.CancelledError:
+                for _, outcome in batch:
+                    outcome.cancel()
+                raise
+            except Exception as e:
+                for _, outcome in batch:
+                    if not outcome.done():
+                        outcome.set_exception(e)
+                return
+            for path, (_, outcome) in zip(paths, batch):
+                if not outcome.done():
+                    outcome.set_result(outcomes[path])
+        finally:
+            self.workspaces.put_nowait(workspace)
+
+    async def drytest(self, mutant_id: str, test_file_path: str) -> str:
+        """
+        Run sumo drytest on the first available workspace.
+        """
+        async def run(path, workspace):
+            if testInterface.sumo_runner == "daemon":
+                from sumoDaemon import get_sumo_daemon
+                return await asyncio.to_thread(get_sumo_daemon(workspace).run_sumo_drytest, mutant_id, path)
+            return await async_run_sumo_drytest(mutant_id, path, workspace)
+        return await self._run_in_workspace(test_file_path, run)
+
+    def run_sumo_pretest(self, test_file_path: str, project_dir: str) -> str:
+        """
+        Blocking entry point for worker threads (see testInterface.run_sumo_pretest).
+        The workspace is picked by the executor, so project_dir is ignored.
+        """
+        return asyncio.run_coroutine_threadsafe(self.pretest(test_file_path), self.loop).result()
+
+    def run_sumo_drytest(self, mutant_id: str, test_file_path: str, project_dir: str) -> str:
+        """
+        Blocking entry point for worker threads (see testInterface.run_sumo_drytest).
+        The workspace is picked by the executor, so project_dir is ignored.
+        """
+        return asyncio.run_coroutine_threadsafe(self.drytest(mutant_id, test_file_path), self.loop).result()
@@ -0,0 +1,201 @@
+import os
+
+import pandas as pd
+
+from mutantScheduler import PRIOR_STRENGTH, execution_tokens, iter_previous_runs
+
+# Loops of processMutant: hypotheses per mutant, and fixes per generated test
+LOOPS = ["hypothesis", "fix"]
+ATTEMPT_COLUMNS = ['Operator', 'Loop', 'Attempt', 'Converted', 'Tokens']
+
+
+def _is_success(result) -> bool:
+    # Results are booleans or SuMo outcomes, possibly read back as strings
+    return str(result).lower() in ["true", "killed"]
+
+
+def mutant_operator(mutant) -> str:
+    """
+    Returns the mutation operator of a mutant (unknown if the dataset has none).
+    """
+    operator = mutant.get('Operator')
+    return str(operator) if isinstance(operator, str) else "unknown"
+
+
+def load_attempt_history(workspace: str, dataset_name: str, exclude: str = None) -> pd.DataFrame:
+    """
+    Loads the attempts made by the previous runs in a workspace (see iter_previous_runs).
+    A hypothesis attempt converts if its test killed the mutant, and its tokens include the test and its fixes.
+    A fix attempt converts if the fixed test passed the pretest.
+    The tests that passed the pretest are loaded as "test" attempts, converting if they killed the mutant.
+
+    :param workspace: the workspace folder of the SUT
+    :param dataset_name: the file name of the dataset copy saved in each results folder
+    :param exclude: a results folder to be ignored (e.g.: the current run)
+    :return: one row per attempt (see ATTEMPT_COLUMNS)
+    """
+    attempts = []
+    for executions, dataset in iter_previous_runs(workspace, dataset_name, exclude):
+        operators = {row['Mutant_id']: mutant_operator(row) for _, row in dataset.iterrows()}
+        executions = executions.assign(Tokens=execution_tokens(executions))
+        # Executions are logged in order for each mutant, also when it was resumed
+        for mutant_id, mutant_executions in executions.groupby('Mutant_id', sort=False):
+            operator = operators.get(mutant_id, "unknown")
+            hypothesis, fix = None, None
+            for _, execution in mutant_executions.iterrows():
+                phase = execution['Phase']
+                if phase == "Generate-Hypothesis":
+                    hypothesis = {'Operator': operator, 'Loop': "hypothesis", 'Attempt': int(execution['Attempt']), 'Converted': False, 'Tokens': 0.0}
+                    attempts.append(hypothesis)
+                elif phase == "Generate-Fixed-Test":
+                    fix = {'Operator': operator, 'Loop': "fix", 'Attempt': int(execution['Attempt']), 'Converted': False, 'Tokens': execution['Tokens']}
+                    attempts.append(fix)
+                elif phase == "SuMo-Pretest" and fix is not None:
+                    fix['Converted'] = _is_success(execution['Result'])
+                    fix = None
+                elif phase == "SuMo-Test":
+                    killed = _is_success(execution['Result'])
+                    attempts.append({'Operator': operator, 'Loop': "test", 'Attempt': int(execution['Attempt']), 'Converted': killed, 'Tokens': 0.0})
+                    if hypothesis is not None:
+                        hypothesis['Converted'] = hypothesis['Converted'] or killed
+                if hypothesis is not None:
+                    hypothesis['Tokens'] += execution['Tokens']
+    return pd.DataFrame(attempts, columns=ATTEMPT_COLUMNS)
+
+
+class AttemptPolicy:
+    """
+    Decides how many hypotheses are generated for a mutant and how many times a generated test is fixed.
+    This policy applies the fixed budgets (HYP_LOOP and FIX_LOOP).
+    """
+    adaptive = False
+
+    def __init__(self, hypothesis_loop: int, fix_loop: int):
+        """
+        :param hypothesis_loop: the max number of hypotheses per mutant
+        :param fix_loop: the max number of fixes per generated test
+        """
+        self.limits = {"hypothesis": hypothesis_loop, "fix": fix_loop}
+
+    def allows(self, loop: str, operator: str, attempt: int) -> tuple[bool, str]:
+        """
+        Decides whether an attempt is made.
+
+        :param loop: hypothesis or fix
+        :param operator: the mutation operator of the mutant
+        :param attempt: the attempt number (from 1)
+        :return: the decision, and its reason (None if there was nothing to decide, e.g.: the first hypothesis)
+        """
+        return attempt <= self.limits[loop], None
+
+
+class AdaptiveAttemptPolicy(AttemptPolicy):
+    """
+    Budgets learned from the previous runs of the SUT. Attempt k of a loop is made if its marginal kill probability
+    per token, for the operator of the mutant, is at least min_value times the kills per token of the previous runs:
+    hopeless attempts are skipped, and attempts that used to convert are made beyond the fixed budgets (up to
+    max_hypothesis_loop and max_fix_loop).
+    The marginal kill probability of hypothesis k is the rate at which hypotheses k killed their mutant; the one of fix k
+    is the rate at which fixes k passed the pretest, times the rate at which pretested tests killed their mutant.
+    Rates are smoothed from all operators towards the operator of the mutant. Positions with fewer than min_samples
+    previous attempts keep the fixed budgets.
+    """
+    adaptive = True
+
+    def __init__(self, attempts: pd.DataFrame, hypothesis_loop: int, fix_loop: int, max_hypothesis_loop: int, max_fix_loop: int,
+                 min_samples: int, min_value: float = 1.0):
+        """
+        :param attempts: the attempts of the previous runs (see load_attempt_history)
+        :param hypothesis_loop: the fixed max number of hypotheses per mutant
+        :param fix_loop: the fixed max number of fixes per generated test
+        :param max_hypothesis_loop: the max number of hypotheses per mutant
+        :param max_fix_loop: the max number of fixes per generated test
+        :param min_samples: the min number of previous attempts at a position of a loop to learn its budget
+        :param min_value: the min ratio of the kills per token of an attempt to the kills per token of the previous runs
+        """
+        super().__init__(hypothesis_loop, fix_loop)
+        self.attempts = attempts
+        self.max_limits = {"hypothesis": max(hypothesis_loop, max_hypothesis_loop), "fix": max(fix_loop, max_fix_loop)}
+        self.min_samples = min_samples
+        self.min_value = min_value
+        hypotheses = attempts[attempts['Loop'] == "hypothesis"]
+        # Without token usage (e.g.: cached responses only), attempts are the cost unit
+        self.unit_costs = hypotheses['Tokens'].sum() <= 0
+        costs = len(hypotheses) if self.unit_costs else hypotheses['Tokens'].sum()
+        self.baseline = hypotheses['Converted'].sum() / costs if costs > 0 else 0.0
+
+    @staticmethod
+    def _rate(attempts: pd.DataFrame, operator: str) -> float:
+        # Conversion rate of the operator, smoothed towards the rate of all operators
+        overall_rate = (attempts['Converted'].sum() + 1) / (len(attempts) + 2)
+        operator_attempts = attempts[attempts['Operator'] == operator]
+        return (operator_attempts['Converted'].sum() + PRIOR_STRENGTH * overall_rate) / (len(operator_attempts) + PRIOR_STRENGTH)
+
+    def estimate(self, loop: str, operator: str, attempt: int) -> tuple[int, float, float]:
+        """
+        Estimates the marginal kill probability and cost of an attempt.
+
+        :return: the number of previous attempts at this position of the loop, the kill probability and the cost
+                 (tokens, or 1 without token usage)
+        """
+        attempts = self.attempts[(self.attempts['Loop'] == loop) & (self.attempts['Attempt'] == attempt)]
+        if len(attempts) == 0:
+            return 0, 0.0, 0.0
+        probability = self._rate(attempts, operator)
+        if loop == "fix":
+            tests = self.attempts[self.attempts['Loop'] == "test"]
+            probability *= self._rate(tests, operator)
+        cost = 1.0 if self.unit_costs else max(attempts['Tokens'].mean(), 1.0)
+        return len(attempts), probability, cost
+
+    def allows(self, loop: str, operator: str, attempt: int) -> tuple[bool, str]:
+        if loop == "hypothesis" and attempt == 1:
+            return True, None
+        if attempt > self.max_limits[loop]:
+            return False, f"max {self.max_limits[loop]} attempts reached"
+        samples, probability, cost = self.estimate(loop, operator, attempt)
+        if samples < self.min_samples or self.baseline <= 0:
+            allowed = attempt <= self.limits[loop]
+            return allowed, f"{samples} previous attempts - fixed budget of {self.limits[loop]}"
+        value = probability / cost / self.baseline
+        unit = "attempt" if self.unit_costs else f"{cost:.0f} tokens"
+        return value >= self.min_value, (f"kill probability {probability:.3f} for {unit} over {samples} previous attempts, "
+                                         f"{value:.2f}x the kills per {'attempt' if self.unit_costs else 'token'} of previous runs")
+
+    def save(self, path: str):
+        """
+        Saves the estimates of each operator and position of the loops seen in the previous runs.
+        """
+        rows = []
+        operators = sorted(self.attempts['Operator'].unique())
+        for loop in LOOPS:
+            positions = sorted(self.attempts[self.attempts['Loop'] == loop]['Attempt'].unique())
+            for attempt in positions:
+                for operator in operators:
+                    samples, probability, cost = self.estimate(loop, operator, attempt)
+                    allowed, _ = self.allows(loop, operator, attempt)
+                    rows.append({'Loop': loop, 'Attempt': attempt, 'Operator': operator, 'Samples': samples,
+                                 'Kill_probability': round(probability, 4), 'Cost': round(cost, 1), 'Allowed': allowed})
+        pd.DataFrame(rows, columns=['Loop', 'Attempt', 'Operator', 'Samples', 'Kill_probability', 'Cost', 'Allowed']).to_csv(path, index=False)
+
+
+def create_attempt_policy(adaptive: bool, workspace: str, dataset_name: str, results_path: str, hypothesis_loop: int, fix_loop: int,
+                          max_hypothesis_loop: int, max_fix_loop: int, min_samples: int) -> AttemptPolicy:
+    """
+    Creates the attempt policy of a run: fixed budgets, or budgets learned from the previous runs of the SUT
+    (see AdaptiveAttemptPolicy), whose estimates are saved to attempt_policy.csv in the results folder.
+
+    :param adaptive: learn the budgets from the previous runs
+    :param workspace: the workspace folder of the SUT, holding the results of the previous runs
+    :param dataset_name: the file name of the dataset copy saved in each results folder
+    :param results_path: the results folder of the current run
+    """
+    if not adaptive:
+        return AttemptPolicy(hypothesis_loop, fix_loop)
+    attempts = load_attempt_history(workspace, dataset_name, exclude=results_path)
+    policy = AdaptiveAttemptPolicy(attempts, hypothesis_loop, fix_loop, max_hypothesis_loop, max_fix_loop, min_samples)
+    counts = attempts['Loop'].value_counts()
+    print(f"## Adaptive attempts: {counts.get('hypothesis', 0)} hypotheses and {counts.get('fix', 0)} fixes from previous runs, "
+          f"up to {policy.max_limits['hypothesis']} hypotheses and {policy.max_limits['fix']} fixes per test")
+    policy.save(os.path.join(results_path, "attempt_policy.csv"))
+    return policy
@@ -0,0 +1,421 @@
+"""
+Offline benchmark of the experiment orchestrator.
+The model API is replaced by a local OpenAI-compatible mock server and `npx sumo` by a scripted stub, both with
+configurable latencies and outcomes, so that the overhead of the orchestrator (dataset updates, logging, file I/O,
+prompt building) is measured without network and Hardhat noise.
+
+Each size runs in its own process (fresh env, fresh peak RSS):
+    python benchmark.py --sizes 100,10000,100000 --output ./benchmark_results
+    python benchmark.py --sizes 100 --baseline ./benchmark_results/benchmark.csv
+"""
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+OPERATORS = ["AOR", "BOR", "ROR", "LOR", "UORD", "ECS", "FVR", "GVR", "RSD", "VUR"]
+TEST_FILE = "test/Benchmark.test.ts"
+CANNED_RESPONSE = """Hypothesis: the mutant changes the value returned by the function, which a direct call observes.
+```typescript
+import { expect } from "chai";
+import { ethers } from "hardhat";
+
+describe("Benchmark", function () {
+  it("observes the mutated value", async function () {
+    const contract = await ethers.deployContract("Benchmark");
+    expect(await contract.compute(2, 3)).to.equal(5);
+  });
+});
+```
+"""
+
+# Stand-in for `npx` in the SUT: only `npx sumo pretest <file>` and `npx sumo testDry <mutant> <file>` are scripted
+FAKE_SUMO_SCRIPT = """#!{python}
+import hashlib, json, math, os, random, sys, time
+
+def duration(prefix):
+    median = float(os.environ.get(prefix + "_TIME", "0"))
+    sigma = float(os.environ.get("BENCH_SUMO_SIGMA", "0"))
+    return median * math.exp(random.gauss(0, sigma)) if median > 0 else 0
+
+def draw(key, rate):
+    # Deterministic outcome per key, so that runs are comparable
+    return int(hashlib.md5(key.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF < rate
+
+args = sys.argv[1:]
+if args[:2] == ["sumo", "pretest"]:
+    time.sleep(duration("BENCH_SUMO_PRETEST"))
+    if draw("pretest" + args[2], float(os.environ.get("BENCH_PRETEST_PASS_RATE", "1"))):
+        print("Pre-test OK\\n  1 passing")
+        sys.exit(0)
+    report_dir = os.path.join(os.getcwd(), "mochawesome-report")
+    os.makedirs(report_dir, exist_ok=True)
+    test = {{"title": "observes the mutated value", "state": "failed", "err": {{"message": "AssertionError: expected 6 to equal 5"}}}}
+    with open(os.path.join(report_dir, "test-results.json"), "w") as report:
+        json.dump({{"results": [{{"suites": [{{"tests": [test]}}]}}]}}, report)
+    print("  0 passing\\n  1 failing\\n[mochawesome] Report JSON saved to " + report_dir)
+    print("Error: Pre-test failed", file=sys.stderr)
+    sys.exit(1)
+if args[:2] == ["sumo", "testDry"]:
+    time.sleep(duration("BENCH_SUMO_TEST"))
+    killed = draw(args[2], float(os.environ.get("BENCH_KILL_RATE", "0.5")))
+    print("Mutant " + args[2] + (" was killed by the tests" if killed else " survived testing"))
+    sys.exit(0)
+print("Unsupported command: " + " ".join(args), file=sys.stderr)
+sys.exit(1)
+"""
+
+
+class MockLLMServer:
+    """
+    Local OpenAI-compatible chat completions endpoint answering with a canned response (a hypothesis and a
+    typescript test), after a lognormal latency; a share of the requests fail with a retryable HTTP 503.
+    Streamed requests are answered with server-sent events.
+    """
+    def __init__(self, latency: float, sigma: float, failure_rate: float, response: str = CANNED_RESPONSE):
+        """
+        :param latency: the median latency of a response (in seconds)
+        :param sigma: the sigma of the lognormal latency distribution (0 for a constant latency)
+        :param failure_rate: the share of requests failing with HTTP 503
+        :param response: the content of the responses
+        """
+        self.latency = latency
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.response = response
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1/chat/completions"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with server._lock:
+                    server.requests += 1
+                    failed = random.random() < server.failure_rate
+                    server.failures += failed
+                if server.latency > 0:
+                    time.sleep(server.latency * math.exp(random.gauss(0, server.sigma)))
+                if failed:
+                    self.send_response(503)
+                    self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                usage = {"prompt_tokens": len(json.dumps(data.get("messages", []))) // 4,
+                         "completion_tokens": len(server.response) // 4,
+                         "total_tokens": len(json.dumps(data.get("messages", []))) // 4 + len(server.response) // 4,
+                         "prompt_tokens_details": {"cached_tokens": 0}}
+                if data.get("stream"):
+                    self._stream(data, usage)
+                    return
+                body = json.dumps({"id": "bench", "object": "chat.completion", "model": data.get("model"),
+                                   "choices": [{"index": 0, "message": {"role": "assistant", "content": server.response}, "finish_reason": "stop"}],
+                                   "usage": usage}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, data, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                lines = server.response.splitlines(keepends=True)
+                try:
+                    for line in lines:
+                        self.wfile.write(f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': line}}]})}\n\n".encode())
+                    if (data.get("stream_options") or {}).get("include_usage"):
+                        self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stops reading once the code block is closed
+                    pass
+
+        return Handler
+
+
+def install_fake_sumo(bin_dir: str) -> str:
+    """
+    Writes the scripted `npx` stub to bin_dir (to be put first in the PATH).
+
+    :return: the path to the stub
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    script_path = os.path.join(bin_dir, "npx")
+    with open(script_path, "w", encoding="utf-8") as file:
+        file.write(FAKE_SUMO_SCRIPT.format(python=sys.executable))
+    os.chmod(script_path, os.stat(script_path).st_mode | stat.S_IEXEC | stat.S_IXGRP | stat.S_IXOTH)
+    return script_path
+
+
+def generate_mutations(path: str, size: int, mutants_per_contract: int = 50, seed: int = 0):
+    """
+    Writes a synthetic mutations.json of live mutants, grouped by contract.
+
+    :param path: the path to the mutations.json
+    :param size: the number of mutants
+    :param mutants_per_contract: the number of mutants of each contract
+    :param seed: the seed of the generator
+    """
+    generator = random.Random(seed)
+    mutations = {}
+    for index in range(size):
+        contract_index = index // mutants_per_contract
+        function_index = generator.randrange(8)
+        functions = " ".join(f"function f{i}(uint a, uint b) public pure returns (uint) {{ uint c = a * {i + 1}; return c + b; }}" for i in range(8))
+        mutations.setdefault(f"Contract{contract_index}.sol", []).append({
+            "id": f"m{index:08x}",
+            "mostCoveringTestFile": TEST_FILE,
+            "functionName": f"f{function_index}",
+            "status": "live",
+            "original": "c + b",
+            "replace": generator.choice(["c - b", "c * b", "c / b", "b"]),
+            "diff": "- return c + b;\n+ return c - b;",
+            "startLine": function_index + 3,
+            "operator": generator.choice(OPERATORS),
+            "codeContext": f"pragma solidity ^0.8.0;\ncontract Contract{contract_index} {{\n  uint public total;\n  {functions}\n}}\n",
+            "testSetup": f"describe('Contract{contract_index}', function () {{ beforeEach(async function () {{ }}); }});",
+        })
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(mutations, file)
+
+
+def percentiles(values: pd.Series) -> dict:
+    """
+    Returns the p50, p95 and p99 of a series (in seconds).
+    """
+    return {f"p{q}": round(float(values.quantile(q / 100)), 4) for q in [50, 95, 99]} if len(values) else {}
+
+
+class ExternalTimer:
+    """
+    Accumulates the time the current process spends waiting for the model API (LLMClient.post, including the
+    rate limits and retries) and for SuMo (subprocess.run), so that the rest is the time of the orchestrator.
+    """
+    def __init__(self):
+        self.seconds = {"llm": 0.0, "sumo": 0.0}
+        self._lock = threading.Lock()
+
+    def wrap(self, owner, name: str, kind: str):
+        """
+        Replaces owner.name with a timed version.
+        """
+        function = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.seconds[kind] += time.monotonic() - start
+        setattr(owner, name, timed)
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident set size of the current process (in MB).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def run_size(args) -> dict:
+    """
+    Runs the benchmark of one size in the current process (see main): creates the dataset of a synthetic
+    mutations.json in a temporary SUT, and launches the experiment against the mock server and the fake SuMo.
+
+    :return: the measures of the run
+    """
+    work_dir = tempfile.mkdtemp(prefix=f"alchemist_bench_{args.size}_")
+    sut_path = os.path.join(work_dir, "sut")
+    results_path = os.path.join(work_dir, "results")
+    for folder in [os.path.join(sut_path, "test"), os.path.join(sut_path, "contracts"), results_path]:
+        os.makedirs(folder)
+    with open(os.path.join(sut_path, "package-lock.json"), "w") as file:
+        file.write("{}")
+
+    server = MockLLMServer(args.llm_latency, args.llm_sigma, args.llm_failure_rate)
+    server.start()
+    processed = args.size if args.process is None else min(args.size, args.process)
+    os.environ.update({
+        "PATH": os.path.join(work_dir, "bin") + os.pathsep + os.environ.get("PATH", ""),
+        "GPT_API_URL": server.url, "GPT_API_KEY": "benchmark",
+        "HYP_LOOP": str(args.hyp_loop), "FIX_LOOP": str(args.fix_loop), "MAX_MUTANTS": str(processed),
+        "LLM_BACKOFF_BASE": "0.01", "LLM_BACKOFF_MAX": "0.1",
+        "BENCH_SUMO_PRETEST_TIME": str(args.pretest_time), "BENCH_SUMO_TEST_TIME": str(args.test_time),
+        "BENCH_SUMO_SIGMA": str(args.sumo_sigma), "BENCH_PRETEST_PASS_RATE": str(args.pretest_pass_rate),
+        "BENCH_KILL_RATE": str(args.kill_rate),
+    })
+    install_fake_sumo(os.path.join(work_dir, "bin"))
+    # The experiment settings are read from the env when main is imported, and the prompt templates from the cwd
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+    import main as alchemist
+    from llmClient import LLMClient
+    timer = ExternalTimer()
+    timer.wrap(LLMClient, "post", "llm")
+    timer.wrap(subprocess, "run", "sumo")
+
+    mutations_path = os.path.join(work_dir, "mutations.json")
+    dataset_path = os.path.join(work_dir, "mutationsDataset.csv")
+    generate_mutations(mutations_path, args.size)
+    try:
+        start = time.monotonic()
+        alchemist.create_dataset(mutations_path, dataset_path)
+        dataset_time = time.monotonic() - start
+
+        start = time.monotonic()
+        alchemist.launchExperiment(args.model, sut_path, os.path.join(sut_path, "test"), results_path, dataset_path,
+                                   os.path.join(results_path, "executions.csv"), args.workers, args.async_pipeline,
+                                   kill_sweep=args.kill_sweep, dedup=args.dedup)
+        experiment_time = time.monotonic() - start
+    finally:
+        server.stop()
+
+    executions = alchemist.load_executions(os.path.join(results_path, "executions.jsonl"))
+    executions['Time'] = pd.to_numeric(executions['Time'], errors='coerce').fillna(0)
+    mutants = executions['Mutant_id'].nunique()
+    dataset = pd.read_csv(os.path.join(results_path, os.path.basename(dataset_path)))
+    measures = {
+        "Size": args.size, "Mutants": mutants, "Killed": int((dataset['KilledByLLM'].astype(str) == "True").sum()),
+        "Prompted": executions.loc[executions['Phase'] == "Generate-Hypothesis", 'Mutant_id'].nunique(),
+        "Dataset_time": round(dataset_time, 3), "Experiment_time": round(experiment_time, 3),
+        "Throughput": round(mutants / experiment_time, 3) if experiment_time > 0 else 0.0,
+        "LLM_requests": server.requests, "LLM_failures": server.failures, "Peak_RSS_MB": peak_rss_mb(),
+    }
+    if args.workers == 1 and not args.async_pipeline:
+        # Sequential runs: the time not spent waiting for the model or SuMo is spent by the orchestrator itself
+        measures["LLM_wait"] = round(timer.seconds["llm"], 3)
+        measures["SuMo_wait"] = round(timer.seconds["sumo"], 3)
+        measures["Overhead_per_mutant"] = round((experiment_time - timer.seconds["llm"] - timer.seconds["sumo"]) / max(mutants, 1), 4)
+    for phase, times in executions.groupby('Phase')['Time']:
+        for name, value in percentiles(times).items():
+            measures[f"{phase}_{name}"] = value
+    if not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return measures
+
+
+def compare_to_baseline(results: pd.DataFrame, baseline_path: str, tolerance: float) -> list:
+    """
+    Compares the throughput and peak RSS of each size with a previous benchmark.
+
+    :return: the regressions (more than tolerance slower or larger), as messages
+    """
+    baseline = pd.read_csv(baseline_path).set_index('Size')
+    regressions = []
+    for _, row in results.iterrows():
+        if row['Size'] not in baseline.index:
+            continue
+        previous = baseline.loc[row['Size']]
+        if row['Throughput'] < previous['Throughput'] * (1 - tolerance):
+            regressions.append(f"size {int(row['Size'])}: throughput {row['Throughput']} mutants/s (baseline {previous['Throughput']})")
+        if row['Peak_RSS_MB'] > previous['Peak_RSS_MB'] * (1 + tolerance):
+            regressions.append(f"size {int(row['Size'])}: peak RSS {row['Peak_RSS_MB']} MB (baseline {previous['Peak_RSS_MB']})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the experiment orchestrator against a mock model API and a fake SuMo.')
+    parser.add_argument('--sizes', type=str, default='100,10000,100000', help='comma-separated numbers of synthetic mutants')
+    parser.add_argument('--process', type=int, default=None, help='max mutants processed per size (default: all of them)')
+    parser.add_argument('--output', type=str, default='benchmark_results', help='folder of benchmark.csv and of the logs of each size')
+    parser.add_argument('--baseline', type=str, default=None, help='a previous benchmark.csv: exit with status 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative throughput loss or peak RSS growth reported as a regression')
+    parser.add_argument('--model', type=str, default='gpt-4o-mini', help='the model name sent to the mock server')
+    parser.add_argument('--hyp_loop', type=int, default=2, help='HYP_LOOP of the benchmarked runs')
+    parser.add_argument('--fix_loop', type=int, default=1, help='FIX_LOOP of the benchmarked runs')
+    parser.add_argument('--workers', type=int, default=1, help='workers of the benchmarked runs')
+    parser.add_argument('--async_pipeline', action='store_true', help='benchmark the async pipeline')
+    parser.add_argument('--kill_sweep', action='store_true', help='sweep each killer test across the live mutants of its contract')
+    parser.add_argument('--dedup', action='store_true', help='cluster the mutants applying the same edit (see --dedup of main.py)')
+    parser.add_argument('--llm_latency', type=float, default=0.0, help='median latency of the mock model (in seconds)')
+    parser.add_argument('--llm_sigma', type=float, default=0.0, help='sigma of the lognormal latency of the mock model')
+    parser.add_argument('--llm_failure_rate', type=float, default=0.0, help='share of mock model requests failing with HTTP 503')
+    parser.add_argument('--pretest_time', type=float, default=0.0, help='median duration of a fake SuMo pretest (in seconds)')
+    parser.add_argument('--test_time', type=float, default=0.0, help='median duration of a fake SuMo testDry (in seconds)')
+    parser.add_argument('--sumo_sigma', type=float, default=0.0, help='sigma of the lognormal durations of the fake SuMo')
+    parser.add_argument('--pretest_pass_rate', type=float, default=0.8, help='share of fake SuMo pretests passing')
+    parser.add_argument('--kill_rate', type=float, default=0.5, help='share of mutants killed by a passing test')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary SUT and results of each size')
+    parser.add_argument('--size', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--measures', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is not None:
+        # Child process: one size
+        with open(args.measures, "w") as file:
+            json.dump(run_size(args), file)
+        return
+
+    os.makedirs(args.output, exist_ok=True)
+    child_args = sys.argv[1:]
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        measures_path = os.path.abspath(os.path.join(args.output, f"measures_{size}.json"))
+        log_path = os.path.join(args.output, f"benchmark_{size}.log")
+        print(f"## Benchmark: {size} mutants (log: {log_path})")
+        with open(log_path, "w") as log:
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), *child_args, "--size", str(size), "--measures", measures_path],
+                                     stdout=log, stderr=subprocess.STDOUT)
+        if process.returncode != 0 or not os.path.isfile(measures_path):
+            print(f"## Benchmark of {size} mutants FAILED - see {log_path}")
+            continue
+        with open(measures_path) as file:
+            measures = json.load(file)
+        os.remove(measures_path)
+        print(f"##   {measures['Mutants']} mutants ({measures['Prompted']} prompted, {measures['Killed']} killed) in {measures['Experiment_time']:.1f}s ({measures['Throughput']:.2f} mutants/s), "
+              f"dataset created in {measures['Dataset_time']:.1f}s, peak RSS {measures['Peak_RSS_MB']} MB"
+              + (f", {measures['Overhead_per_mutant'] * 1000:.1f}ms orchestrator overhead per mutant" if 'Overhead_per_mutant' in measures else ""))
+        results.append(measures)
+
+    if not results:
+        sys.exit(1)
+    results = pd.DataFrame(results)
+    results_path = os.path.join(args.output, "benchmark.csv")
+    regressions = compare_to_baseline(results, args.baseline, args.tolerance) if args.baseline is not None else []
+    results.to_csv(results_path, index=False)
+    print(f"## Benchmark saved to {results_path}")
+    if regressions:
+        print("## REGRESSIONS:\n" + "\n".join(f"##   {regression}" for regression in regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import json
+import os
+import tempfile
+import threading
+
+# Outcomes of a processed mutant: error outcomes (e.g.: model quota exhausted) are retried on resume
+FINISHED_OUTCOMES = ["killed", "live"]
+
+
+def write_json_atomically(path: str, content):
+    """
+    Writes a JSON file atomically: readers see either the old or the new content, never a partial file.
+
+    :param path: the path to the file
+    :param content: the JSON content
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump(content, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class ExperimentCheckpoint:
+    """
+    Crash-safe checkpoint of an experiment, saved in its results folder:
+     - checkpoint.json: the experiment settings and the queue of mutants (written atomically)
+     - progress.jsonl: append-only, fsynced journal of the progress of each mutant; the last
+       entry of a mutant wins and a line truncated by a crash is ignored
+    """
+    def __init__(self, results_path: str):
+        """
+        :param results_path: the results folder of the experiment
+        """
+        self.checkpoint_path = os.path.join(results_path, "checkpoint.json")
+        self.progress_path = os.path.join(results_path, "progress.jsonl")
+        self.settings = {}
+        self.queue = []
+        self.mutants = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def exists(cls, results_path: str) -> bool:
+        return os.path.isfile(os.path.join(results_path, "checkpoint.json"))
+
+    def start(self, queue: list, **settings):
+        """
+        Starts a new checkpoint for the given queue of mutants.
+
+        :param queue: the ids of the mutants to be processed, in order
+        :param settings: the experiment settings (e.g.: model)
+        """
+        self.queue = list(queue)
+        self.settings = settings
+        self.mutants = {}
+        write_json_atomically(self.checkpoint_path, {"queue": self.queue, "settings": settings})
+        open(self.progress_path, 'w').close()
+
+    def load(self):
+        """
+        Loads the checkpoint and replays the progress journal.
+        """
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as file:
+            content = json.load(file)
+        self.queue = content["queue"]
+        self.settings = content.get("settings", {})
+        self.mutants = {}
+        if os.path.isfile(self.progress_path):
+            with open(self.progress_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    if not line.endswith("\n"):
+                        break
+                    entry = json.loads(line)
+                    self.mutants.setdefault(entry["Mutant_id"], {}).update(entry)
+        return self
+
+    def mismatched_settings(self, **settings) -> dict:
+        """
+        Compares the saved experiment settings with the given ones (settings missing from the checkpoint are ignored).
+
+        :param settings: the current experiment settings
+        :return: the saved and current value of each setting that differs
+        """
+        return {name: (self.settings[name], value) for name, value in settings.items()
+                if name in self.settings and self.settings[name] != value}
+
+    def _append(self, entry: dict):
+        with self._lock:
+            self.mutants.setdefault(entry["Mutant_id"], {}).update(entry)
+            with open(self.progress_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(entry, default=str) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+    def save_progress(self, mutant_id: str, hypothesis_attempt: int, history: list, last_hypothesis: str, test_file: str = None, fix_attempt: int = 0, generated_test: str = None):
+        """
+        Records the progress of a mutant.
+
+        :param mutant_id: the mutant
+        :param hypothesis_attempt: the current hypothesis attempt
+        :param history: the history of messages
+        :param last_hypothesis: the last generated hypothesis
+        :param test_file: the name of the test file waiting for pretest (None if the hypothesis attempt is over)
+        :param fix_attempt: the number of fixes applied to the test file
+        :param generated_test: the test code generated for the hypothesis
+        """
+        self._append({"Mutant_id": mutant_id, "outcome": None, "hypothesis_attempt": hypothesis_attempt, "history": history,
+                      "last_hypothesis": last_hypothesis, "test_file": test_file, "fix_attempt": fix_attempt, "generated_test": generated_test})
+
+    def mark_done(self, mutant_id: str, outcome: str):
+        """
+        Records that a mutant was processed.
+
+        :param mutant_id: the mutant
+        :param outcome: killed, live or error
+        """
+        self._append({"Mutant_id": mutant_id, "outcome": outcome})
+
+    def progress(self, mutant_id: str):
+        """
+        Returns the last recorded progress of an unfinished mutant, or None.
+        """
+        entry = self.mutants.get(mutant_id)
+        if entry is None or "hypothesis_attempt" not in entry:
+            return None
+        return entry
+
+    def is_finished(self, mutant_id: str) -> bool:
+        entry = self.mutants.get(mutant_id)
+        return entry is not None and entry.get("outcome") in FINISHED_OUTCOMES
+
+    def pending(self) -> list:
+        """
+        Returns the mutants of the queue that still have to be processed.
+        """
+        return [mutant_id for mutant_id in self.queue if not self.is_finished(mutant_id)]
+
+
+class DeferredCheckpoint:
+    """
+    Checkpoint view for a mutant processed concurrently: its dataset updates and executions stay in
+    memory until merged, so its intermediate progress is not recorded either (it would not match the
+    dataset after a crash). An interrupted mutant is resumed from its last recorded progress.
+    """
+    def __init__(self, checkpoint: ExperimentCheckpoint):
+        """
+        :param checkpoint: the experiment checkpoint
+        """
+        self.checkpoint = checkpoint
+
+    def progress(self, mutant_id: str):
+        return self.checkpoint.progress(mutant_id)
+
+    def save_progress(self, *args, **kwargs):
+        pass
@@ -0,0 +1,190 @@
+import re
+from utils import minify_code
+
+# Solidity keywords that can end the declaration of a state variable (e.g.: uint public constant X;)
+VARIABLE_MODIFIERS = {"public", "private", "internal", "external", "constant", "immutable", "override", "transient"}
+# Kinds of members included before functions when the token budget is tight
+DECLARATION_KINDS = {"modifier", "variable", "event", "error", "struct", "enum", "using"}
+
+UNIT_PATTERN = re.compile(r'\b(?:abstract\s+)?(?:contract|library|interface)\s+(\w+)[^{;]*\{')
+MEMBER_PATTERN = re.compile(r'^(function|modifier|event|error|struct|enum)\s+(\w+)|^(constructor|receive|fallback)\b|^(using)\b')
+IDENTIFIER_PATTERN = re.compile(r'\b[A-Za-z_$][\w$]*\b')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of a text (4 characters per token, as in the rate limiter of the LLM client).
+    """
+    return len(text) // 4
+
+
+def strip_comments(code: str) -> str:
+    """
+    Removes the comments of Solidity code, leaving string literals (e.g.: URLs) untouched.
+    """
+    return re.sub(r'("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')|/\*.*?\*/|//[^\n]*',
+                  lambda match: match.group(1) or "", code, flags=re.DOTALL)
+
+
+def _skip_string(code: str, start: int) -> int:
+    # Returns the position after the string literal starting at start
+    quote, position = code[start], start + 1
+    while position < len(code) and code[position] != quote:
+        position += 2 if code[position] == "\\" else 1
+    return position + 1
+
+
+def _block_end(code: str, start: int) -> int:
+    # Returns the position after the brace closing the block opened at start
+    depth, position = 0, start
+    while position < len(code):
+        char = code[position]
+        if char in "\"'":
+            position = _skip_string(code, position)
+            continue
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return position + 1
+        position += 1
+    return len(code)
+
+
+def _split_members(body: str) -> list:
+    # Splits the body of a contract (or the top level of a file) into its declarations
+    members, start, position, parentheses = [], 0, 0, 0
+    while position < len(body):
+        char = body[position]
+        if char in "\"'":
+            position = _skip_string(body, position)
+            continue
+        if char in "([":
+            parentheses += 1
+        elif char in ")]":
+            parentheses -= 1
+        elif char == ";" and parentheses <= 0:
+            members.append(body[start:position + 1])
+            start, parentheses = position + 1, 0
+        elif char == "{" and parentheses <= 0:
+            position = _block_end(body, position)
+            members.append(body[start:position])
+            start, parentheses = position, 0
+            continue
+        position += 1
+    members = [member.strip() for member in members]
+    return [member for member in members if member]
+
+
+def _describe_member(text: str) -> tuple[str, str]:
+    # Returns the kind and name of a declaration
+    match = MEMBER_PATTERN.match(text)
+    if match is None:
+        # The initializer starts at the first "=" that is not part of a mapping's "=>"
+        declaration = re.split(r'=(?!>)', text, maxsplit=1)[0].rstrip(";").split()
+        names = [word for word in declaration if word not in VARIABLE_MODIFIERS and re.fullmatch(r'\w+', word)]
+        return ("variable", names[-1]) if names else ("other", "")
+    if match.group(1):
+        return match.group(1), match.group(2)
+    if match.group(3):
+        return "function", match.group(3)
+    return "using", ""
+
+
+def parse_units(code: str) -> list:
+    """
+    Splits Solidity code into its contracts, libraries and interfaces, and each of them into its declarations.
+    Declarations outside any contract (e.g.: free functions, top-level structs) form a unit without header.
+
+    :param code: the Solidity code
+    :return: the units, as dicts with header (e.g.: "contract A is B {") and members,
+             where each member is a dict with kind, name and text
+    """
+    code = strip_comments(code)
+    units, top_level, position = [], [], 0
+    for match in UNIT_PATTERN.finditer(code):
+        if match.start() < position:
+            continue
+        top_level.append(code[position:match.start()])
+        end = _block_end(code, match.end() - 1)
+        units.append({"header": match.group(0), "body": code[match.end():end - 1]})
+        position = end
+    top_level.append(code[position:])
+
+    # Pragmas and imports are dropped: they never help explaining a mutant
+    units.insert(0, {"header": None, "body": " ".join(part for part in top_level if part.strip())})
+    for unit in units:
+        unit["members"] = []
+        for text in _split_members(unit.pop("body")):
+            if text.startswith(("pragma", "import")):
+                continue
+            kind, name = _describe_member(text)
+            unit["members"].append({"kind": kind, "name": name, "text": minify_code(text)})
+    return units
+
+
+def slice_context(code: str, function_name: str, token_budget: int) -> str:
+    """
+    Builds the reduced context of a mutant: the mutated function (all its overloads), then the modifiers,
+    state variables, events, errors and types it refers to, then its callees and their own dependencies,
+    breadth-first, as long as the token budget allows. The mutated function is always included.
+    Declarations are kept in source order, in their contract, and the omitted ones are counted in a comment.
+
+    :param code: the code of the contract (codeContext of the mutation)
+    :param function_name: the name of the mutated function
+    :param token_budget: the max number of tokens of the reduced context
+    :return: the minified reduced context, or the minified full context if the function cannot be found
+             or if the reduced context would not be smaller
+    """
+    full_context = minify_code(code)
+    units = parse_units(code)
+    members = [member for unit in units for member in unit["members"]]
+    by_name = {}
+    for member in members:
+        by_name.setdefault(member["name"], []).append(member)
+
+    targets = [member for member in members if member["kind"] == "function" and member["name"] == function_name]
+    if not targets:
+        return full_context
+
+    kept = {id(member) for member in targets}
+    tokens = sum(estimate_tokens(member["text"]) for member in targets)
+    frontier = targets
+    while frontier:
+        candidates = []
+        for member in frontier:
+            for name in dict.fromkeys(IDENTIFIER_PATTERN.findall(member["text"])):
+                candidates += [dependency for dependency in by_name.get(name, []) if id(dependency) not in kept]
+        # Declarations are cheap and explain the code that uses them: they go before the callees
+        candidates.sort(key=lambda dependency: dependency["kind"] not in DECLARATION_KINDS)
+        frontier = []
+        for dependency in candidates:
+            if id(dependency) in kept:
+                continue
+            dependency_tokens = estimate_tokens(dependency["text"])
+            if tokens + dependency_tokens > token_budget:
+                continue
+            kept.add(id(dependency))
+            tokens += dependency_tokens
+            frontier.append(dependency)
+
+    parts = []
+    for unit in units:
+        kept_members = [member["text"] for member in unit["members"] if id(member) in kept]
+        if kept_members:
+            # Using directives change the meaning of the calls in the kept code (e.g.: x.add(y))
+            kept_members = [member["text"] for member in unit["members"] if id(member) in kept or member["kind"] == "using"]
+        if not kept_members:
+            continue
+        omitted = len(unit["members"]) - len(kept_members)
+        if unit["header"] is not None:
+            parts.append(minify_code(unit["header"]))
+        parts += kept_members
+        if omitted > 0:
+            parts.append(f"/* {omitted} other declarations omitted */")
+        if unit["header"] is not None:
+            parts.append("}")
+    sliced_context = " ".join(parts)
+
+    return sliced_context if len(sliced_context) < len(full_context) else full_context
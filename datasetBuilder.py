@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+try:
+    # Optional: stream large mutations.json files one contract at a time instead of loading them at once
+    import ijson
+except ImportError:
+    ijson = None
+
+# Columns of the mutants dataset, in order
+DATASET_COLUMNS = ["Mutant_id", "Contract_id", "Test_id", "Function_name", "Status", "Original", "Replacement", "Diff", "Operator",
+                   "StartLine", "Details", "Contract_Context", "Sliced_Context", "Test_Context", "Test_Generated", "KilledByLLM"]
+# Columns derived from the code of a mutation (minified or sliced): reused from the previous dataset for unchanged mutations
+DERIVED_COLUMNS = ["Diff", "Details", "Contract_Context", "Sliced_Context", "Test_Context"]
+
+
+def hashes_path_for(dataset_path: str) -> str:
+    """
+    Returns the path to the content hashes of the mutations of a dataset (see mutation_hash).
+    """
+    return dataset_path + ".hashes.json"
+
+
+def mutation_hash(contract_name: str, mutation: dict, settings: str) -> str:
+    """
+    Returns the content hash of a mutation, including the settings its derived columns depend on
+    (e.g.: the token budget of the sliced context).
+    """
+    content = json.dumps([contract_name, mutation, settings], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def iter_contract_mutations(mutations_path: str):
+    """
+    Yields the contract names and mutations of a mutations.json, one contract at a time
+    (streamed with ijson when installed, so only one contract is in memory).
+    """
+    with open(mutations_path, 'rb') as file:
+        if ijson is not None:
+            yield from ijson.kvitems(file, '', use_float=True)
+        else:
+            yield from json.load(file).items()
+
+
+class PreviousDataset:
+    """
+    Streams the derived columns of a previous dataset, one contract at a time, with the content hashes of its
+    mutations. Contracts are expected in the same order as in the new mutations.json: the rows of the contracts
+    skipped to reach a requested one are dropped (their mutations are then processed again).
+    """
+    def __init__(self, dataset_path: str, chunk_size: int):
+        """
+        :param dataset_path: the path to the previous dataset (ignored if it or its hashes are missing)
+        :param chunk_size: the number of rows read at a time
+        """
+        self.mutant_hashes = {}
+        self._positions = {}
+        self._groups = iter(())
+        self._next = None
+        if not os.path.isfile(dataset_path) or not os.path.isfile(hashes_path_for(dataset_path)):
+            return
+        try:
+            with open(hashes_path_for(dataset_path), 'r', encoding='utf-8') as file:
+                hashes = json.load(file)
+            # Values are kept as written, so that reused rows are written back unchanged
+            chunks = pd.read_csv(dataset_path, usecols=["Mutant_id", "Contract_id"] + DERIVED_COLUMNS, dtype=str,
+                                 keep_default_na=False, chunksize=chunk_size)
+        except (OSError, ValueError):
+            return
+        self.mutant_hashes = hashes["mutants"]
+        self._positions = {contract: position for position, contract in enumerate(hashes["contracts"])}
+        self._groups = self._iter_groups(chunks)
+
+    @staticmethod
+    def _iter_groups(chunks):
+        # Yields the rows of each contract, as a dict by mutant id
+        contract, rows = None, {}
+        for chunk in chunks:
+            for row in chunk.to_dict('records'):
+                if row["Contract_id"] != contract:
+                    if rows:
+                        yield contract, rows
+                    contract, rows = row["Contract_id"], {}
+                rows[row["Mutant_id"]] = row
+        if rows:
+            yield contract, rows
+
+    def rows(self, contract_name: str) -> dict:
+        """
+        Returns the rows of a contract by mutant id (empty if the contract is new, or was skipped).
+        """
+        if contract_name not in self._positions:
+            return {}
+        while True:
+            if self._next is None:
+                self._next = next(self._groups, None)
+                if self._next is None:
+                    return {}
+            contract, rows = self._next
+            if contract == contract_name:
+                self._next = None
+                return rows
+            if self._positions.get(contract, -1) > self._positions[contract_name]:
+                # The requested contract comes before the next rows: it was already skipped
+                return {}
+            self._next = None
@@ -0,0 +1,63 @@
+from mutantStore import MutantStore
+
+
+class DispatchGate:
+    """
+    Decides when the mutants of a concurrent run are started and merged.
+    Without sweep scopes, mutants are started as workers free up and merged in queue order, so the outcome does
+    not depend on which worker finishes first.
+    With sweep scopes, each new killer test is swept across other live mutants once the killer is merged (see
+    sweepKillerTest in main.py): a mutant started while a mutant of its sweep scope is unfinished would be
+    prompted even if that killer test kills it. Such mutants are held back until the mutants queued before them
+    in the same scope are finished (merged, or killed by a sweep):
+     - cluster: the other members of a cluster wait for its representative (its first member in the queue), then
+       for each other, so that each killer test of the cluster is swept across the members not started yet
+     - contract: a mutant waits for the mutants of the same contract
+    Mutants are then merged as soon as they finish, since those they wait for are always merged first.
+    Mutants only wait for mutants queued before them, so the first unfinished mutant can always be started.
+    """
+    def __init__(self, dataset: MutantStore, queue: list, scopes: list):
+        """
+        :param dataset: the mutant dataset
+        :param queue: the ids of the mutants to be processed, in queue order
+        :param scopes: the sweep scopes of the experiment
+        """
+        self.scopes = scopes
+        self._position = {mutant_id: position for position, mutant_id in enumerate(queue)}
+        # Unfinished mutants, and those of each scope, in queue order (dicts as ordered sets)
+        self._unfinished = dict.fromkeys(queue)
+        self._groups = {}
+        self._groups_of = {}
+        columns = {"cluster": 'Cluster_id', "contract": 'Contract_id'}
+        for mutant_id in queue:
+            for scope in scopes:
+                value = dataset.get(mutant_id, columns[scope])
+                if value is not None:
+                    self._groups.setdefault((scope, value), {})[mutant_id] = None
+                    self._groups_of.setdefault(mutant_id, []).append((scope, value))
+
+    def __len__(self):
+        return len(self._unfinished)
+
+    def blocked(self, mutant_id: str) -> bool:
+        """
+        Returns True if the mutant must wait for an unfinished mutant queued before it.
+        """
+        return any(next(iter(self._groups[group])) != mutant_id for group in self._groups_of.get(mutant_id, []))
+
+    def mergeable(self, finished_ids) -> list:
+        """
+        Returns the mutants to be merged now, in order, among those whose processing is over.
+        """
+        if self.scopes:
+            return sorted(finished_ids, key=self._position.get)
+        first = next(iter(self._unfinished), None)
+        return [first] if first in finished_ids else []
+
+    def finish(self, mutant_id: str):
+        """
+        Releases the mutants waiting for a mutant, once it is merged (and its killer test swept) or killed by a sweep.
+        """
+        self._unfinished.pop(mutant_id, None)
+        for group in self._groups_of.get(mutant_id, []):
+            self._groups[group].pop(mutant_id, None)
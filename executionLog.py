@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from llmUsage import USAGE_COLUMNS
+
+# The usage columns are only set for the LLM phases
+EXECUTION_COLUMNS = ['Mutant_id', 'Contract_id', 'Test_id', 'Function_name', 'Phase', 'Attempt', 'Artefact', 'Time', 'Result'] + USAGE_COLUMNS
+
+
+class ExecutionLog:
+    """
+    Append-only log of the experiment executions (one JSON event per line).
+    Events are buffered and appended in batches, so logging costs O(1) per event; the file is
+    flushed every flush_interval seconds and fsynced every fsync_interval seconds.
+    A crash can at most truncate the last line, which load_executions ignores.
+    Without a path, events are only kept in memory (e.g.: per-mutant logs of concurrent workers).
+    """
+    def __init__(self, path: str = None, flush_interval: float = 1.0, fsync_interval: float = 5.0):
+        """
+        :param path: the path to the .jsonl log (None for an in-memory log)
+        :param flush_interval: max time (in seconds) an event stays in the buffer
+        :param fsync_interval: max time (in seconds) between two fsyncs of the log (0 to fsync on every flush)
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.events = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._last_fsync = time.monotonic()
+        self._file = open(path, 'a', encoding='utf-8') if path is not None else None
+
+    def log(self, event: dict):
+        """
+        Appends an event to the log.
+
+        :param event: the event (see EXECUTION_COLUMNS)
+        """
+        with self._lock:
+            self.events.append(event)
+            if self._file is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def extend(self, events: list):
+        """
+        Appends several events to the log.
+        """
+        for event in events:
+            self.log(event)
+
+    def _flush(self):
+        if self.events:
+            self._file.write("".join(json.dumps(event, default=str) + "\n" for event in self.events))
+            self.events = []
+        self._file.flush()
+        self._last_flush = time.monotonic()
+        if time.monotonic() - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = time.monotonic()
+
+    def flush(self):
+        """
+        Writes the buffered events to the log.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+
+    def close(self):
+        """
+        Flushes, fsyncs and closes the log.
+        """
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                self._flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_executions(path: str) -> pd.DataFrame:
+    """
+    Rebuilds the executions DataFrame from a log, skipping a trailing line truncated by a crash.
+
+    :param path: the path to the .jsonl log
+    :return: the executions, with the EXECUTION_COLUMNS columns
+    """
+    events = []
+    if os.path.isfile(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if not line.endswith("\n"):
+                    break
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    return pd.DataFrame(events, columns=EXECUTION_COLUMNS)
+
+
+def export_executions(log_path: str, csv_path: str):
+    """
+    Exports a log to the executions.csv layout used for the analysis.
+
+    :param log_path: the path to the .jsonl log
+    :param csv_path: the path to the csv file
+    """
+    load_executions(log_path).to_csv(csv_path, index=False)
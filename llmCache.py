@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of model responses.
+    Each entry is stored in <cache_dir>/<key[:2]>/<key>.json, where the key is the hash of
+    the request (model, messages, max_tokens, temperature, top_p).
+    Entries older than max_age are discarded, and the least recently used entries are
+    evicted when the cache grows beyond max_size.
+    """
+    def __init__(self, cache_dir: str, max_size: int, max_age: float):
+        """
+        :param cache_dir: the folder where the responses are saved
+        :param max_size: the max size of the cache (in bytes)
+        :param max_age: the max age of an entry (in seconds)
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.max_age = max_age
+        self._size = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(model: str, messages: list, max_tokens: int, temperature: float, top_p: float) -> str:
+        """
+        Computes the cache key of a request.
+        """
+        request = {"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature, "top_p": top_p}
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        """
+        Returns the cached response for a key, or None if missing or expired.
+        """
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                self._remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+            # Mark the entry as recently used
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+            return entry["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, response: str):
+        """
+        Saves a response to the cache, evicting old entries if needed.
+        The entry is written atomically, so concurrent readers never see partial files.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump({"key": key, "created": time.time(), "response": response}, file)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry[3] for entry in self._entries())
+            else:
+                self._size += os.path.getsize(path)
+            if self._size > self.max_size:
+                self.evict()
+
+    def _entries(self):
+        # (last access time, creation time, path, size) of every entry in the cache
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield max(stat.st_atime, stat.st_mtime), stat.st_mtime, path, stat.st_size
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Removes expired entries, then the least recently used ones until the cache fits in max_size.
+        """
+        now = time.time()
+        entries = []
+        for last_used, created, path, size in self._entries():
+            if now - created > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((last_used, path, size))
+
+        entries.sort()
+        total_size = sum(size for _, _, size in entries)
+        while entries and total_size > self.max_size:
+            _, path, size = entries.pop(0)
+            self._remove(path)
+            total_size -= size
+        self._size = total_size
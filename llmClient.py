@@ -0,0 +1,246 @@
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+# HTTP status codes worth retrying
+RETRY_STATUSES = [408, 409, 429, 500, 502, 503, 504]
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: holds up to capacity tokens, refilled continuously over a minute.
+    """
+    def __init__(self, capacity_per_minute: float):
+        self.capacity = capacity_per_minute
+        self.rate = capacity_per_minute / 60.0
+        self.tokens = capacity_per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float) -> float:
+        """
+        Blocks until the requested amount of tokens is available and consumes it.
+        Requests larger than the capacity are capped, so they can eventually be served.
+
+        :param amount: the number of tokens to be consumed
+        :return: the time spent waiting (in seconds)
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount: float):
+        """
+        Gives back (positive amount) or takes (negative amount) tokens, e.g.: once the actual usage is known.
+        """
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LLMClient:
+    """
+    Shared HTTP client for the model APIs.
+    Connections are pooled and kept alive across calls, failed calls (timeouts, 429, 5xx) are
+    retried with exponential backoff and jitter honouring Retry-After, and requests are
+    throttled client-side to the account's requests/tokens per minute.
+    """
+    def __init__(self, connect_timeout: float = 10, read_timeout: float = 300, max_retries: int = 5,
+                 backoff_base: float = 1, backoff_max: float = 60, rpm: float = 0, tpm: float = 0, pool_size: int = 10):
+        """
+        :param connect_timeout: the connection timeout (in seconds)
+        :param read_timeout: the read timeout (in seconds)
+        :param max_retries: the max number of retries of a request
+        :param backoff_base: the initial backoff delay (in seconds)
+        :param backoff_max: the max backoff delay (in seconds)
+        :param rpm: the max requests per minute (0 = unlimited)
+        :param tpm: the max tokens per minute (0 = unlimited)
+        :param pool_size: the max number of pooled connections per host
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.requests_bucket = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens_bucket = TokenBucket(tpm) if tpm > 0 else None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @staticmethod
+    def estimate_tokens(data: dict) -> int:
+        """
+        Rough estimate of the tokens consumed by a request (~4 characters per token, plus the completion budget).
+        """
+        prompt_tokens = len(json.dumps(data.get("messages", []))) // 4
+        return prompt_tokens + int(data.get("max_tokens", 0))
+
+    def backoff_delay(self, attempt: int, response: requests.Response = None) -> float:
+        """
+        Returns the delay before the next attempt: the server's Retry-After if any,
+        otherwise an exponential backoff with full jitter.
+        """
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def throttle(self, data: dict) -> tuple[int, float]:
+        """
+        Waits until the request fits in the rate limits.
+
+        :return: the estimated tokens of the request and the time spent waiting
+        """
+        estimated_tokens = self.estimate_tokens(data)
+        waited = 0.0
+        if self.requests_bucket is not None:
+            waited += self.requests_bucket.acquire(1)
+        if self.tokens_bucket is not None:
+            waited += self.tokens_bucket.acquire(estimated_tokens)
+        return estimated_tokens, waited
+
+    def post(self, url: str, headers: dict, data: dict, stats: dict = None, stream: bool = False) -> requests.Response:
+        """
+        Posts a JSON request, retrying on timeouts, connection errors and retryable status codes.
+
+        :param url: the endpoint
+        :param headers: the request headers
+        :param data: the JSON body
+        :param stats: if given, filled with the time spent in HTTP requests (http_latency), the time spent
+                      waiting for the rate limits and between retries (queue_wait) and the number of retries
+        :param stream: return as soon as the headers are received (e.g.: server-sent events, see iter_sse_events):
+                       the caller reads and closes the response, and settles the token estimate (see settle_tokens)
+        :return: the last response (raises the last exception if no response was received)
+        """
+        if stats is None:
+            stats = {}
+        stats.update(http_latency=0.0, queue_wait=0.0, retries=0, estimated_tokens=0)
+        attempt = 0
+        while True:
+            estimated_tokens, waited = self.throttle(data)
+            stats['queue_wait'] += waited
+            stats['estimated_tokens'] = estimated_tokens
+            request_start = time.monotonic()
+            try:
+                response = self.session.post(url, headers=headers, json=data, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                stats['http_latency'] += time.monotonic() - request_start
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                print(f"## <REQUEST> {type(e).__name__} - retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            else:
+                stats['http_latency'] += time.monotonic() - request_start
+                if response.status_code == 200 and not stream:
+                    self.refund_tokens(estimated_tokens, response)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = self.backoff_delay(attempt, response)
+                response.close()
+                print(f"## <REQUEST> HTTP {response.status_code} - retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
+            stats['queue_wait'] += delay
+            attempt += 1
+            stats['retries'] = attempt
+
+    def refund_tokens(self, estimated_tokens: int, response: requests.Response):
+        # Replace the estimate with the actual usage reported by the server
+        if self.tokens_bucket is None:
+            return
+        try:
+            used_tokens = response.json()["usage"]["total_tokens"]
+        except (ValueError, KeyError, TypeError):
+            return
+        self.settle_tokens(estimated_tokens, used_tokens)
+
+    def settle_tokens(self, estimated_tokens: int, used_tokens: int):
+        """
+        Replaces the estimated tokens of a request with its actual usage in the tokens per minute limit.
+        """
+        if self.tokens_bucket is not None:
+            self.tokens_bucket.adjust(estimated_tokens - used_tokens)
+
+
+def iter_sse_events(response: requests.Response):
+    """
+    Yields the JSON events of a server-sent events response (e.g.: a streamed chat completion),
+    until the [DONE] event or the end of the stream.
+    """
+    if response.encoding is None:
+        response.encoding = "utf-8"
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        payload = line[len("data:"):].strip()
+        if payload == "[DONE]":
+            return
+        try:
+            yield json.loads(payload)
+        except ValueError:
+            continue
+
+
+def parse_retry_after(value: str):
+    """
+    Parses a Retry-After header (delay in seconds or HTTP date).
+
+    :return: the delay in seconds, or None if missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """
+    Returns the shared client, configured from the env variables:
+    LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX,
+    LLM_RPM, LLM_TPM (0 = unlimited) and LLM_POOL_SIZE.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            load_dotenv()
+            _client = LLMClient(connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "10")),
+                                read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "300")),
+                                max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+                                backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "1")),
+                                backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "60")),
+                                rpm=float(os.getenv("LLM_RPM", "0")),
+                                tpm=float(os.getenv("LLM_TPM", "0")),
+                                pool_size=int(os.getenv("LLM_POOL_SIZE", "10")))
+        return _client
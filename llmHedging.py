@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, wait
+
+
+class HedgePolicy:
+    """
+    Hedged requests: if the primary model has not answered within a deadline, the same request is sent to a
+    secondary model, and the first usable answer wins (the other request is cancelled when possible).
+    The deadline is a percentile of the latencies of the primary model observed so far, per kind of request
+    (e.g.: with or without a code block), or initial_delay until min_samples latencies are known.
+    """
+    def __init__(self, secondary_model: str, percentile: float, min_samples: int, initial_delay: float, max_samples: int = 200):
+        """
+        :param secondary_model: the model the hedged requests are sent to
+        :param percentile: the percentile (0-100) of the primary latencies used as deadline
+        :param min_samples: the min number of latencies before the percentile is used
+        :param initial_delay: the deadline (in seconds) until min_samples latencies are known
+        :param max_samples: the number of most recent latencies kept per model and kind of request
+        """
+        self.secondary_model = secondary_model
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.max_samples = max_samples
+        self._latencies = {}
+        self._lock = threading.Lock()
+        # Requests run in the pool, so that the caller can stop waiting for the primary one
+        self._pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix="hedge")
+
+    def record_latency(self, model: str, kind: str, latency: float):
+        """
+        Records the latency of an answer of a model.
+        """
+        with self._lock:
+            self._latencies.setdefault((model, kind), deque(maxlen=self.max_samples)).append(latency)
+
+    def deadline(self, model: str, kind: str) -> float:
+        """
+        Returns the time to wait for the model before hedging a request of the given kind.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get((model, kind), []))
+        if len(latencies) < self.min_samples:
+            return self.initial_delay
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+        return latencies[index]
+
+    def complete(self, model: str, kind: str, request, usable) -> tuple[str, str]:
+        """
+        Sends a request to the primary model, hedging it with the secondary model after the deadline.
+
+        :param model: the primary model
+        :param kind: the kind of request (latencies and deadlines are tracked per kind)
+        :param request: function (model, cancel event) -> (response or None, error) sending the request to a model
+        :param usable: function (response) -> bool telling whether a response can be used
+        :return: the first usable response (or the first response, if none is usable) and its error
+        """
+        start = time.monotonic()
+        cancel = {model: threading.Event(), self.secondary_model: threading.Event()}
+
+        def attempt(attempt_model):
+            response, error = request(attempt_model, cancel[attempt_model])
+            return attempt_model, response, error, time.monotonic() - start
+
+        def record_primary(future):
+            # A cancelled request took at least its elapsed time: ignoring it would lower the deadline
+            _, response, _, elapsed = future.result()
+            if response is not None or cancel[model].is_set():
+                self.record_latency(model, kind, elapsed)
+
+        deadline = self.deadline(model, kind)
+        primary = self._pool.submit(attempt, model)
+        primary.add_done_callback(record_primary)
+        try:
+            _, response, error, _ = primary.result(timeout=deadline)
+            return response, error
+        except TimeoutError:
+            pass
+
+        print(f"## <HEDGE> {model} did not answer within {deadline:.1f}s - sending the request to {self.secondary_model}")
+        secondary = self._pool.submit(attempt, self.secondary_model)
+        pending = {primary, secondary}
+        fallback = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                winner, response, error, elapsed = future.result()
+                if response is None or not usable(response):
+                    if fallback is None:
+                        fallback = (response, error)
+                    continue
+                loser = self.secondary_model if winner == model else model
+                print(f"## <HEDGE> {winner} answered first after {elapsed:.1f}s" + (f" ({loser} still pending)" if pending else ""))
+                for other in pending:
+                    cancel[loser].set()
+                    if loser == model:
+                        other.add_done_callback(lambda future, won_after=elapsed: self._report_saving(future, won_after))
+                return response, error
+        return fallback
+
+    @staticmethod
+    def _report_saving(future, won_after: float):
+        # Reports how much later the primary request ended, if it was not cancelled before answering
+        primary_model, response, _, elapsed = future.result()
+        if response is not None:
+            print(f"## <HEDGE> {primary_model} answered after {elapsed:.1f}s: hedging saved {elapsed - won_after:.1f}s")
@@ -0,0 +1,146 @@
+import os
+import threading
+
+import pandas as pd
+
+# USD per million tokens: (prompt, cached prompt, completion), matched by model name prefix (longest first)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "llama": (0.0, 0.0, 0.0),
+}
+
+# Usage columns of the LLM phases in the executions log
+USAGE_COLUMNS = ['Model', 'Prompt_tokens', 'Completion_tokens', 'Cached_tokens', 'Cost', 'Http_latency', 'Queue_wait', 'Retries']
+# Phases that query the model
+LLM_PHASES = ['Generate-Hypothesis', 'Generate-Test', 'Generate-Fixed-Test']
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> float:
+    """
+    Returns the cost (in USD) of a call; cached prompt tokens are billed at the cached price.
+    Models without a known price cost 0.
+    """
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            prompt_price, cached_price, completion_price = MODEL_PRICES[name]
+            return ((prompt_tokens - cached_tokens) * prompt_price + cached_tokens * cached_price
+                    + completion_tokens * completion_price) / 1_000_000
+    return 0.0
+
+
+class UsageRecorder:
+    """
+    Collects the usage of the model calls made by each thread, until the phase that made them logs it.
+    Mutants are processed by one thread at a time (sequentially, or one per worker), so the calls
+    collected by a thread belong to the phase it is running.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._total_tokens = 0
+
+    def current_calls(self) -> list:
+        """
+        Returns the calls recorded by the current thread, to record the calls it delegates to other threads
+        (e.g.: hedged requests). Calls recorded after the phase was logged count in the next phase of the thread.
+        """
+        calls = getattr(self._local, 'calls', None)
+        if calls is None:
+            calls = self._local.calls = []
+        return calls
+
+    def record(self, model: str, usage: dict, stats: dict, calls: list = None):
+        """
+        Records a model call.
+
+        :param model: the model name
+        :param usage: the usage block of the response (empty if the call failed)
+        :param stats: the HTTP stats of the call (see LLMClient.post)
+        :param calls: the calls of the thread the call is made for (see current_calls), by default the current thread
+        """
+        prompt_tokens = int(usage.get('prompt_tokens') or 0)
+        completion_tokens = int(usage.get('completion_tokens') or 0)
+        cached_tokens = int((usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0)
+        if calls is None:
+            calls = self.current_calls()
+        call = {
+            'Model': model,
+            'Prompt_tokens': prompt_tokens,
+            'Completion_tokens': completion_tokens,
+            'Cached_tokens': cached_tokens,
+            'Cost': call_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+            'Http_latency': stats.get('http_latency', 0.0),
+            'Queue_wait': stats.get('queue_wait', 0.0),
+            'Retries': stats.get('retries', 0),
+        }
+        with self._lock:
+            calls.append(call)
+            self._total_tokens += prompt_tokens + completion_tokens
+
+    def total_tokens(self) -> int:
+        """
+        Returns the prompt and completion tokens of all the calls recorded so far, by any thread.
+        """
+        with self._lock:
+            return self._total_tokens
+
+    def pop(self) -> dict:
+        """
+        Returns the total usage of the calls recorded by the current thread since the last pop (None if no call
+        reached the model, e.g.: cached responses), and resets it.
+        """
+        recorded_calls = self.current_calls()
+        # Cleared in place: calls still running in other threads keep recording in the same list
+        with self._lock:
+            calls = list(recorded_calls)
+            recorded_calls.clear()
+        if not calls:
+            return None
+        total = {column: sum(call[column] for call in calls) for column in USAGE_COLUMNS if column != 'Model'}
+        total['Cost'] = round(total['Cost'], 6)
+        total['Http_latency'] = round(total['Http_latency'], 2)
+        total['Queue_wait'] = round(total['Queue_wait'], 2)
+        total['Model'] = calls[-1]['Model']
+        return total
+
+
+usage_recorder = UsageRecorder()
+
+
+def summarize_usage(executions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregates the usage of the LLM phases of an experiment per phase, per mutant and per contract.
+
+    :param executions: the executions (see load_executions)
+    :return: the totals, with a Level (Phase, Mutant or Contract) and a Key column
+    """
+    calls = executions[executions['Phase'].isin(LLM_PHASES)].copy()
+    totals = ['Prompt_tokens', 'Completion_tokens', 'Cached_tokens', 'Cost', 'Http_latency', 'Queue_wait', 'Retries']
+    calls[totals] = calls[totals].apply(pd.to_numeric, errors='coerce').fillna(0)
+
+    summary = []
+    for level, column in [("Phase", 'Phase'), ("Mutant", 'Mutant_id'), ("Contract", 'Contract_id')]:
+        grouped = calls.groupby(column, sort=False)
+        level_summary = grouped[totals].sum()
+        # Calls that reached the model (not answered by the response cache)
+        level_summary.insert(0, 'Calls', grouped['Model'].count())
+        level_summary.insert(0, 'Key', level_summary.index)
+        level_summary.insert(0, 'Level', level)
+        summary.append(level_summary.reset_index(drop=True))
+    return pd.concat(summary, ignore_index=True)
+
+
+def report_usage(executions: pd.DataFrame, summary_path: str):
+    """
+    Prints the usage per phase and per contract, and saves the full summary (including per mutant) to summary_path.
+    """
+    summary = summarize_usage(executions)
+    summary.to_csv(summary_path, index=False)
+    print("\n## LLM usage")
+    for level in ["Phase", "Contract"]:
+        for _, row in summary[summary['Level'] == level].iterrows():
+            print(f"##   {row['Key']}: {int(row['Calls'])} calls, {int(row['Prompt_tokens'])} prompt tokens "
+                  f"({int(row['Cached_tokens'])} cached), {int(row['Completion_tokens'])} completion tokens, "
+                  f"${row['Cost']:.4f}, {row['Http_latency']:.1f}s HTTP, {row['Queue_wait']:.1f}s waiting, {int(row['Retries'])} retries")
+    print(f"## Usage per phase, mutant and contract saved to {os.path.basename(summary_path)}")
@@ -8,36 +8,102 @@ from dotenv import load_dotenv
 import shutil
 import time
 from datetime import datetime
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 #Internal
 from testInterface import *
 from promptGenerator import *
 from utils import *
+from workerPool import WorkspacePool
+from sumoDaemon import shutdown_sumo_daemons
+from asyncPipeline import AsyncSuMoExecutor
+from executionLog import ExecutionLog, export_executions, load_executions
+from mutantStore import MutantStore, journal_path_for
+from checkpoint import ExperimentCheckpoint, DeferredCheckpoint
+from mutantClusters import cluster_mutants, representatives_first
+from dispatchGate import DispatchGate
+from contextSlicer import slice_context
+from datasetBuilder import DATASET_COLUMNS, DERIVED_COLUMNS, PreviousDataset, hashes_path_for, iter_contract_mutations, mutation_hash
+from llmUsage import usage_recorder, report_usage
+from mutantScheduler import ExperimentBudget, create_scheduler, SCHEDULERS
+from attemptPolicy import AttemptPolicy, create_attempt_policy, mutant_operator
+import testChecker
+import runTrace
+from runTrace import configure_run_trace
+from resultsArchive import configure_results_archive, open_results_archive, close_results_archive, store_test, load_test
+from testChecker import configure_static_check, check_test_file
 
 load_dotenv()
 hypothesis_loopSize = int(os.getenv("HYP_LOOP")) #Default is 2
 fix_loopSize = int(os.getenv("FIX_LOOP")) #Default is 1
 mutantNbre = int(os.getenv("MAX_MUTANTS"))
+executions_flush_interval = float(os.getenv("EXECUTIONS_FLUSH_INTERVAL", "1")) #Max seconds an execution stays buffered
+executions_fsync_interval = float(os.getenv("EXECUTIONS_FSYNC_INTERVAL", "5")) #Max seconds between two fsyncs of the executions log
+sweep_max_mutants = int(os.getenv("SWEEP_MAX_MUTANTS", "20")) #Max live mutants a killer test is swept across (0 for all)
+context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500")) #Max tokens of the sliced contract context of a mutant
+adaptive_max_hyp_loop = int(os.getenv("ADAPTIVE_MAX_HYP_LOOP", str(2 * hypothesis_loopSize))) #Max hypotheses per mutant with adaptive attempts
+adaptive_max_fix_loop = int(os.getenv("ADAPTIVE_MAX_FIX_LOOP", str(2 * fix_loopSize))) #Max fixes per test with adaptive attempts
+adaptive_min_samples = int(os.getenv("ADAPTIVE_MIN_SAMPLES", "20")) #Min previous attempts at a loop position to learn its budget
+dataset_chunk_size = int(os.getenv("DATASET_CHUNK_SIZE", "1000")) #Rows of the dataset built and written at a time
+
+# Columns set when a mutant is killed by the sweep of another mutant's killer test
+SWEEP_COLUMNS = ['Status', 'KilledByLLM', 'Killer_test', 'Swept_by']
 
 def create_dataset(mutations_path, dataset_path):
     """
     Generates a dataset starting from the ./<project_name>/mutations.json.
+    The mutations are read one contract at a time and the dataset is written in chunks of DATASET_CHUNK_SIZE rows,
+    so that large mutations.json files are processed in bounded memory. The minified and sliced columns of the
+    mutations unchanged since the previous dataset (same content hash) are reused instead of being computed again.
     :mutations_path: path to the ./<project_name>/llm_artifacts/mutations.json.
     :dataset_path: path where the dataset will be saved (./<project_name>/llm_artifacts/dataset_code.csv)    
     """
-    
-    # Load the mutations results from the JSON file in the ./<project_name>/llm_aritfacts folder
-    with open(mutations_path, 'r', encoding='utf-8') as file:
-        mutations_results_json = json.load(file)
 
-    # Create an empty list to store mutation details
-    data = [] 
-  
+    if not os.path.exists(os.path.join(os.getcwd(), "datasets")):
+        os.makedirs(os.path.join(os.getcwd(), "datasets"))
+
+    previous = PreviousDataset(dataset_path, dataset_chunk_size)
+    temp_path = dataset_path + ".tmp"
+    contracts, hashes = [], {}
+    data = []
+    header = True
+    reused = 0
+    context_length, sliced_length = 0, 0
+
+    def write_rows():
+        nonlocal data, header
+        pd.DataFrame(data, columns=DATASET_COLUMNS).to_csv(temp_path, mode='w' if header else 'a', header=header, index=False)
+        data, header = [], False
+
     # Iterate through the contracts in the JSON file
-    for contract_name, mutations in mutations_results_json.items():
-        for mutation in mutations:       
-            minified_original = minify_code(mutation['original'])
-            minified_replacement = minify_code(mutation['replace'])
-             
+    for contract_name, mutations in iter_contract_mutations(mutations_path):
+        contracts.append(contract_name)
+        previous_rows = previous.rows(contract_name)
+        # The mutations of a contract share their contexts: each is minified and sliced once
+        minified, sliced = {}, {}
+        for mutation in mutations:
+            mutation_id = str(mutation["id"])
+            hashes[mutation_id] = mutation_hash(contract_name, mutation, str(context_token_budget))
+            if mutation_id in previous_rows and previous.mutant_hashes.get(mutation_id) == hashes[mutation_id]:
+                derived = {column: previous_rows[mutation_id][column] for column in DERIVED_COLUMNS}
+                reused += 1
+            else:
+                for code in (mutation['original'], mutation['replace'], mutation["codeContext"], mutation["testSetup"]):
+                    if code not in minified:
+                        minified[code] = minify_code(code)
+                slice_key = (mutation["codeContext"], mutation["functionName"])
+                if slice_key not in sliced:
+                    sliced[slice_key] = slice_context(mutation["codeContext"], mutation["functionName"], context_token_budget)
+                derived = {
+                    "Diff": minify_code(mutation["diff"]),
+                    "Details": f'Mutant {mutation["id"]} of function {mutation["functionName"]} replaces {minified[mutation["original"]]} with {minified[mutation["replace"]]}',
+                    "Contract_Context": minified[mutation["codeContext"]],
+                    "Sliced_Context": sliced[slice_key],
+                    "Test_Context": minified[mutation["testSetup"]],
+                }
+            context_length += len(derived["Contract_Context"])
+            sliced_length += len(derived["Sliced_Context"])
+
             # Append the relevant information for each mutation to the data list
             data.append({
                 "Mutant_id": mutation["id"],
@@ -47,27 +113,34 @@ def create_dataset(mutations_path, dataset_path):
                 "Status": mutation["status"],
                 "Original": mutation["original"],
                 "Replacement": mutation["replace"],
-                "Diff": minify_code(mutation["diff"]),
+                "Operator": mutation.get("operator"),
                 "StartLine": mutation["startLine"],
-                "Details": f'Mutant {mutation["id"]} of function {mutation["functionName"]} replaces {minified_original} with {minified_replacement}',
-                "Contract_Context": minify_code(mutation["codeContext"]),
-                "Test_Context": minify_code(mutation["testSetup"]),
                 "Test_Generated": False,
-                "KilledByLLM": False
+                "KilledByLLM": False,
+                **derived
             })
+            if len(data) >= dataset_chunk_size:
+                write_rows()
+    write_rows()
 
-    mutants_code = pd.DataFrame(data)
+    if hashes:
+        print(f"## Contract context: {context_length / len(hashes) / 4:.0f} tokens on average, {sliced_length / len(hashes) / 4:.0f} when sliced")
+        print(f"## {len(hashes) - reused} mutants processed, {reused} unchanged since the previous dataset")
 
-    if not os.path.exists(os.path.join(os.getcwd(), "datasets")):
-        os.makedirs(os.path.join(os.getcwd(), "datasets"))
-
-    mutants_code.to_csv(dataset_path, index=False)
+    os.replace(temp_path, dataset_path)
+    with open(hashes_path_for(dataset_path) + ".tmp", 'w', encoding='utf-8') as file:
+        json.dump({"contracts": contracts, "mutants": hashes}, file)
+    os.replace(hashes_path_for(dataset_path) + ".tmp", hashes_path_for(dataset_path))
+    
+    # Updates journaled for a previous version of the dataset no longer apply
+    if os.path.isfile(journal_path_for(dataset_path)):
+        os.remove(journal_path_for(dataset_path))
 
     print("Mutants dataset saved to folder:", dataset_path)  
      
     
     
-def runPretestAndFix(model:str, test_file_path: str, mutant: dict, dataset: pd.DataFrame, executions_path:str, sut_path: str, project_test_dir: str, generated_tests_dir: str, error_tests_dir: str, correct_tests_dir: str, interactions_dir:str):
+def runPretestAndFix(model:str, test_file_path: str, mutant: dict, dataset: MutantStore, executions_log: ExecutionLog, sut_path: str, project_test_dir: str, generated_tests_dir: str, error_tests_dir: str, correct_tests_dir: str, interactions_dir:str, fix_counter: int = 0, on_fixed_test = None, attempt_policy: AttemptPolicy = None, swept_by = None):
     """
     Run sumo pretest on a given test file. If pretets fails, tries to fix the test case file (until max attempts is reached). 
 
@@ -75,24 +148,30 @@ def runPretestAndFix(model:str, test_file_path: str, mutant: dict, dataset: pd.D
     :model: the model name
     :mutant: mutant for which the test file was generated    
     :param dataset: the mutant dataset
-    :param executions_path: the path to the executions log    
+    :param executions_log: the executions log    
     :param sut_path: the directory of the SUT    
     :param project_test_dir: the test directory of the SUT        
     :param generated_tests_dir: path to folder containing the generated tests
     :param error_tests_dir: path to folder containing the erroneous tests    
     :param correct_tests_dir: path to folder containing the corrected tests        
     :param interactions_dir: the name of the dir where interactions are saved  
+    :param fix_counter: the number of fixes already applied to the test file (when resuming)
+    :param on_fixed_test: called with the path and fix counter of each fixed test, before its pretest
+    :param attempt_policy: decides how many times the test is fixed (by default, FIX_LOOP times)
+    :param swept_by: returns the mutant whose killer test killed this mutant in a sweep since it was started, if any
+                     (no fix is made then)
             
     :return: True if pretest passed, False otherwise   
              The path to the test file that was pretested          
     """   
-    fix_counter = 0
-    pretest_counter = 1
+    pretest_counter = fix_counter + 1
+    if attempt_policy is None:
+        attempt_policy = AttemptPolicy(hypothesis_loopSize, fix_loopSize)
     
     #Pretest original test file
-    pretest_successfull = runPretest(test_file_path, mutant, pretest_counter, dataset, executions_path, sut_path, error_tests_dir, correct_tests_dir)
+    pretest_successfull = runPretest(test_file_path, mutant, pretest_counter, dataset, executions_log, sut_path, error_tests_dir, correct_tests_dir)
       
-    while (fix_counter < fix_loopSize and not pretest_successfull):
+    while (not pretest_successfull and not wasSwept(swept_by, mutant['Mutant_id']) and attemptAllowed(attempt_policy, executions_log, mutant, "fix", fix_counter + 1)):
         #pretest has failed - try to fix test
         fix_counter +=1
         pretest_counter +=1      
@@ -101,19 +180,22 @@ def runPretestAndFix(model:str, test_file_path: str, mutant: dict, dataset: pd.D
         start_time = time.time()              
         test_file_path, test_code = fixTest(model, mutant, dataset, fix_counter, test_file_path, project_test_dir, generated_tests_dir, interactions_dir)          
         elapsed_time = round(time.time() - start_time, 2)                           
-        log_execution(executions_path, mutant['Mutant_id'],  mutant['Contract_id'], mutant['Test_id'], mutant['Function_name'], f"Generate-Fixed-Test", fix_counter, test_file_path, elapsed_time, (test_file_path is not None))      
+        log_execution(executions_log, mutant['Mutant_id'],  mutant['Contract_id'], mutant['Test_id'], mutant['Function_name'], f"Generate-Fixed-Test", fix_counter, test_file_path, elapsed_time, (test_file_path is not None), usage_recorder.pop())      
                 
         if test_file_path is None:
             print("## ERROR while generating fixed test case - pretest skipped.")  
             break              
         
-        pretest_successfull = runPretest(test_file_path, mutant, pretest_counter, dataset, executions_path, sut_path, error_tests_dir, correct_tests_dir)
+        if on_fixed_test is not None:
+            on_fixed_test(test_file_path, fix_counter)
+        
+        pretest_successfull = runPretest(test_file_path, mutant, pretest_counter, dataset, executions_log, sut_path, error_tests_dir, correct_tests_dir)
              
              
     return pretest_successfull, test_file_path
  
  
-def runPretest(test_file_path: str, mutant: dict, pretest_counter:int, dataset: pd.DataFrame, executions_path:str, sut_path: str, error_tests_dir: str, correct_tests_dir: str) -> bool: 
+def runPretest(test_file_path: str, mutant: dict, pretest_counter:int, dataset: MutantStore, executions_log: ExecutionLog, sut_path: str, error_tests_dir: str, correct_tests_dir: str) -> bool: 
     """
     Run sumo pretest on a given test file. 
 
@@ -121,7 +203,7 @@ def runPretest(test_file_path: str, mutant: dict, pretest_counter:int, dataset:
     :mutant: mutant for which the test file was generated  
     :pretest_counter: pretest attempt counter      
     :param dataset: the mutant dataset
-    :param executions_path: the path to the executions log    
+    :param executions_log: the executions log    
     :param sut_path: the directory of the SUT        
     :param error_tests_dir: path to folder containing the erroneous tests    
     :param correct_tests_dir: path to folder containing the correct tests        
@@ -129,27 +211,40 @@ def runPretest(test_file_path: str, mutant: dict, pretest_counter:int, dataset:
     :return: True if pretest passed, False otherwise         
     """   
     
+    if testChecker.static_check:
+        # Cheap static check first: the pretest is skipped until the test file passes it
+        start_time = time.time()
+        check_errors = check_test_file(test_file_path, sut_path)
+        elapsed_time = round(time.time() - start_time, 2)
+        log_execution(executions_log, mutant['Mutant_id'], mutant['Contract_id'], mutant['Test_id'], mutant['Function_name'], "Static-Check", pretest_counter, test_file_path, elapsed_time, (len(check_errors) == 0))
+        
+        if len(check_errors) > 0:
+            print("### Static check FAILED - pretest skipped.", check_errors)
+            dataset.update(mutant['Mutant_id'], Test_errors=json.dumps(str(check_errors).replace("\n", " ")))
+            store_test(test_file_path, error_tests_dir)
+            return False
+    
     #Pretest original test file
     print(f"## Running PRETEST for {test_file_path}")  
       
     start_time = time.time()      
     pretest_outcome = run_sumo_pretest(test_file_path, sut_path)
     elapsed_time = round(time.time() - start_time, 2)   
-    log_execution(executions_path, mutant['Mutant_id'], mutant['Contract_id'], mutant['Test_id'], mutant['Function_name'], f"SuMo-Pretest", pretest_counter, test_file_path, elapsed_time, (pretest_outcome == "True"))      
+    log_execution(executions_log, mutant['Mutant_id'], mutant['Contract_id'], mutant['Test_id'], mutant['Function_name'], f"SuMo-Pretest", pretest_counter, test_file_path, elapsed_time, (pretest_outcome == "True"))      
       
     if pretest_outcome == "True":  
             print("### Pretest PASSED. ")    
-            shutil.copy(test_file_path, correct_tests_dir)
-            dataset.loc[dataset['Mutant_id'] == mutant['Mutant_id'], 'Test_errors']= 'compiled correctly' 
+            store_test(test_file_path, correct_tests_dir)
+            dataset.update(mutant['Mutant_id'], Test_errors='compiled correctly')
             return True 
     else:     
             print("### Pretest FAILED.")                                                                          
-            dataset.loc[dataset['Mutant_id'] == mutant['Mutant_id'], 'Test_errors'] = json.dumps(str(pretest_outcome).replace("\n", " "))
-            shutil.copy(test_file_path, error_tests_dir)  
+            dataset.update(mutant['Mutant_id'], Test_errors=json.dumps(str(pretest_outcome).replace("\n", " ")))
+            store_test(test_file_path, error_tests_dir)  
             return False           
                 
  
-def launchExperiment(model:str, sut_path:str, project_test_dir:str, results_path:str, dataset_path:str, executions_path:str):
+def launchExperiment(model:str, sut_path:str, project_test_dir:str, results_path:str, dataset_path:str, executions_path:str, workers:int = 1, async_pipeline:bool = False, prefetch:int = 4, resume:bool = False, kill_sweep:bool = False, dedup:bool = False, group_by_contract:bool = False, scheduler:str = "order", budget: ExperimentBudget = None, adaptive_attempts:bool = False):
     """
     Launch the test generation experiment.
     :model: the model to be used (llama, gpt-4o or gpt-4o-mini)   
@@ -158,6 +253,21 @@ def launchExperiment(model:str, sut_path:str, project_test_dir:str, results_path
     :results_path: workspace results path
     :dataset_path: mutant dataset path    
     :executions_path: experiment executions dataset path            
+    :workers: number of mutants processed concurrently, each in its own clone of the SUT
+              (with async_pipeline, the number of SUT clones in which SuMo runs concurrently)
+    :async_pipeline: overlap the LLM stages of upcoming mutants with the SuMo stages of the current ones
+    :prefetch: number of mutants in flight in the async pipeline
+    :resume: resume the checkpointed experiment in results_path instead of starting a new one
+    :kill_sweep: run each new killer test against the other live mutants of the same contract
+    :dedup: cluster the mutants applying the same edit: the representative of each cluster is processed
+            first and its killer test is run against the other members before they are prompted
+    :group_by_contract: process the mutants sharing the same contract context and test setup consecutively,
+                        so that consecutive requests share the longest prompt prefix (see the prefix prompt layout)
+    :scheduler: the order of the live mutants (see mutantScheduler): dataset order or estimated kills per unit of cost
+    :budget: the token and wall-clock budget of the run: without one, the first MAX_MUTANTS mutants of the
+             schedule are processed; with one, all the live mutants are scheduled until the budget is exhausted
+    :adaptive_attempts: learn the number of hypotheses and fixes of each mutant from the previous runs (see attemptPolicy)
+                        instead of using HYP_LOOP and FIX_LOOP
     """
         
     # Define directories for results with the timestamped base directory
@@ -172,38 +282,381 @@ def launchExperiment(model:str, sut_path:str, project_test_dir:str, results_path
     for dir_path in results_dirs.values():
         os.makedirs(dir_path, exist_ok=True)
     
-    #delete previously generated test files    
-    delete_generated_tests_from_SUT(project_test_dir)
+    # The experiment works on its own copy of the dataset, checkpointed in the results folder
+    experiment_dataset_path = os.path.join(results_path, os.path.basename(dataset_path))
+    checkpoint = ExperimentCheckpoint(results_path)
+    
+    if resume:
+        checkpoint.load()
+        dataset = MutantStore.load(experiment_dataset_path)
+        print(f"## Resuming experiment: {len(checkpoint.queue) - len(checkpoint.pending())}/{len(checkpoint.queue)} mutants already processed")
+    else:
+        #delete previously generated test files    
+        delete_generated_tests_from_SUT(project_test_dir)
+        
+        shutil.copy(dataset_path, experiment_dataset_path)
+        if os.path.isfile(journal_path_for(experiment_dataset_path)):
+            os.remove(journal_path_for(experiment_dataset_path))
+        dataset = MutantStore.load(experiment_dataset_path)
+        
+        # Filter live mutants
+        mutants = dataset.to_dataframe()
+        live_mutants = mutants[(mutants["Status"] == "live") & (mutants['Test_Generated'] == False)]
+        cost_unit = budget.cost_unit() if budget is not None else "mutants"
+        mutant_scheduler = create_scheduler(scheduler, os.path.dirname(results_path), os.path.basename(dataset_path), results_path, cost_unit)
+        queue = mutant_scheduler.rank(live_mutants, os.path.join(results_path, "schedule.csv"))
+        if budget is None or not budget.limits_usage():
+            queue = queue[:mutantNbre]
+        if group_by_contract:
+            queue = group_by_prompt_prefix(queue, dataset)
+        if dedup:
+            cluster_mutants(dataset)
+            queue = representatives_first(queue, dataset)
+        checkpoint.start(queue, **experimentSettings(model, sut_path))
+    
+    # Mutants still to be processed, in queue order
+    mutants = dataset.to_dataframe()
+    queue_position = {mutant_id: position for position, mutant_id in enumerate(checkpoint.pending())}
+    live_mutants = mutants[mutants['Mutant_id'].isin(queue_position)]
+    live_mutants = live_mutants.iloc[live_mutants['Mutant_id'].map(queue_position).argsort()]
 
-    # Initialize the executions log
-    pd.DataFrame(columns=['Mutant_id', 'Contract_id', 'Test_id', 'Function_name',  'Phase', 'Attempt', 'Artefact', 'Time', 'Result']).to_csv(executions_path, index=False)
+    # Initialize the append-only executions log, exported to executions_path at the end of the experiment
+    executions_log_path = os.path.splitext(executions_path)[0] + ".jsonl"
+    executions_log = ExecutionLog(executions_log_path, executions_flush_interval, executions_fsync_interval)
+    
+    attempt_policy = create_attempt_policy(adaptive_attempts, os.path.dirname(results_path), os.path.basename(dataset_path), results_path,
+                                           hypothesis_loopSize, fix_loopSize, adaptive_max_hyp_loop, adaptive_max_fix_loop, adaptive_min_samples)
+    
+    open_results_archive(results_path)
+    if runTrace.run_trace is not None:
+        runTrace.run_trace.open(results_path, {"model": model, "hyp_loop": hypothesis_loopSize, "fix_loop": fix_loopSize, "max_mutants": mutantNbre})
+    
+    # Mutants against which each new killer test is run
+    sweep_scopes = (["cluster"] if dedup else []) + (["contract"] if kill_sweep else [])
+    
+    try:
+        if async_pipeline:
+            launchAsyncExperiment(model, sut_path, project_test_dir, live_mutants, dataset, results_path, results_dirs, executions_log, checkpoint, workers, prefetch, sweep_scopes, budget, attempt_policy)
+        elif workers > 1:
+            launchParallelExperiment(model, sut_path, project_test_dir, live_mutants, dataset, results_path, results_dirs, executions_log, checkpoint, workers, sweep_scopes, budget, attempt_policy)
+        else:
+            if budget is not None:
+                budget.start()
+            # Process each live mutant
+            for index, mutant in live_mutants.iterrows():
+                exhausted = budget.exhausted() if budget is not None else None
+                if exhausted is not None:
+                    print(f"## Budget exhausted: {exhausted} - the remaining mutants are left for a resumed run")
+                    break
+                
+                if dataset.get(mutant['Mutant_id'], 'Status') != "live":
+                    print(f"## {index}/{len(dataset)} - Mutant {mutant['Mutant_id']} already killed by the test of mutant {dataset.get(mutant['Mutant_id'], 'Swept_by')} - Skipping")
+                    continue
+                
+                print("\n************************************")                    
+                print(f"## {index}/{len(dataset)} - Processing mutant {mutant['Mutant_id']} for contract {mutant['Contract_id']} and test file {mutant['Test_id']}")      
+                print("************************************")                    
+                
+                outcome = processMutant(model, mutant, dataset, sut_path, project_test_dir, results_dirs, executions_log, checkpoint, attempt_policy)
+                dataset.commit()
+                checkpoint.mark_done(mutant['Mutant_id'], outcome)
+                
+                if sweep_scopes and outcome == "killed":
+                    sweepKillerTest(mutant['Mutant_id'], sweep_scopes, dataset, executions_log, checkpoint, sut_path, project_test_dir, results_dirs)
+    finally:
+        dataset.save(experiment_dataset_path)
+        shutil.copy(experiment_dataset_path, dataset_path)
+        executions_log.close()
+        export_executions(executions_log_path, executions_path)
+        report_usage(load_executions(executions_log_path), os.path.join(results_path, "usage_summary.csv"))
+        close_results_archive()
+        if runTrace.run_trace is not None:
+            runTrace.run_trace.close({mutant_id: dataset.get(mutant_id, 'Status') for mutant_id in checkpoint.queue})
 
-    # Load the dataset and filter live mutants
-    dataset = pd.read_csv(dataset_path)
-    live_mutants = dataset[(dataset["Status"] == "live") & (dataset['Test_Generated'] == False)].head(mutantNbre)
+
+def experimentSettings(model:str, sut_path:str) -> dict:
+    """
+    The settings saved in the checkpoint of an experiment: a resumed run must use the same ones.
+    :model: the model to be used (llama, gpt-4o or gpt-4o-mini)   
+    :sut_path: project folder path
+    """
+    return {"model": model, "sut_path": os.path.abspath(sut_path), "hyp_loop": hypothesis_loopSize, "fix_loop": fix_loopSize}
+
+
+def launchParallelExperiment(model:str, sut_path:str, project_test_dir:str, live_mutants: pd.DataFrame, dataset: MutantStore, results_path:str, results_dirs:dict, executions_log: ExecutionLog, checkpoint: ExperimentCheckpoint, workers:int, sweep_scopes:list = None, budget: ExperimentBudget = None, attempt_policy: AttemptPolicy = None):
+    """
+    Process the live mutants concurrently, each worker in its own clone of the SUT.
+    Results are merged back into the dataset and executions log in the order of the live mutants,
+    so the outcome does not depend on which worker finishes first. With sweep scopes, mutants are started
+    only once the mutants whose killer test may kill them are merged, and merged as soon as they finish (see DispatchGate).
+    :model: the model to be used (llama, gpt-4o or gpt-4o-mini)   
+    :sut_path: project folder path
+    :project_test_dir: test folder path    
+    :live_mutants: the mutants to be processed
+    :dataset: the mutant dataset
+    :results_path: workspace results path
+    :results_dirs: the directories where results are saved
+    :executions_log: the experiment executions log
+    :checkpoint: the experiment checkpoint
+    :workers: number of concurrent workers
+    :sweep_scopes: the mutants against which each new killer test is run (see sweepKillerTest), in the SUT as results are merged
+    :budget: the token and wall-clock budget of the run, started before the first mutant: mutants not started when it is exhausted are left pending
+    :attempt_policy: decides how many hypotheses and fixes are made for each mutant
+    """
+    workspaces_dir = os.path.join(os.path.dirname(results_path), "workers")
+    pool = WorkspacePool(sut_path, workspaces_dir, workers)
     
+    def processMutantInWorkspace(index, mutant):
+        workspace = pool.acquire()
+        try:
+            print(f"## [Worker {workspace.worker_id}] {index}/{len(dataset)} - Processing mutant {mutant['Mutant_id']} for contract {mutant['Contract_id']} and test file {mutant['Test_id']}")      
+            mutant_dataset, mutant_log, outcome = processMutantInIsolation(model, mutant, dataset, workspace.sut_path, workspace.test_dir, results_dirs, checkpoint, budget, attempt_policy)
+            return mutant_dataset, mutant_log, outcome, workspace.sut_path
+        finally:
+            pool.release(workspace)
     
-    # Process each live mutant
-    for index, mutant in live_mutants.iterrows():
-        mutant_id = mutant['Mutant_id']
-        contract_id = mutant['Contract_id']           
-        test_id = mutant['Test_id']
-        function_name = mutant['Function_name']
-      
-        print("\n************************************")                    
-        print(f"## {index}/{len(dataset)} - Processing mutant {mutant['Mutant_id']} for contract {contract_id} and test file {test_id}")      
-        print("************************************")                    
+    gate = DispatchGate(dataset, list(live_mutants['Mutant_id']), sweep_scopes or [])
+    pending = list(live_mutants.iterrows())
+    
+    # The workspaces are ready: the budget is spent from the first mutant
+    if budget is not None:
+        budget.start()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            
+            def dispatch():
+                # Start the pending mutants not held back by the gate, in queue order, while workers are free
+                nonlocal pending
+                running = sum(not future.done() for future in futures.values())
+                waiting = []
+                for position, (index, mutant) in enumerate(pending):
+                    if dataset.get(mutant['Mutant_id'], 'Status') != "live":
+                        # Killed by a sweep before being started
+                        gate.finish(mutant['Mutant_id'])
+                    elif running >= workers:
+                        waiting += pending[position:]
+                        break
+                    elif gate.blocked(mutant['Mutant_id']):
+                        waiting.append((index, mutant))
+                    else:
+                        futures[mutant['Mutant_id']] = executor.submit(processMutantInWorkspace, index, mutant.copy())
+                        running += 1
+                pending = waiting
+            
+            try:
+                while len(gate) > 0:
+                    dispatch()
+                    finished = gate.mergeable([mutant_id for mutant_id, future in futures.items() if future.done()])
+                    if not finished:
+                        wait([future for future in futures.values() if not future.done()], return_when=FIRST_COMPLETED)
+                        continue
+                    for mutant_id in finished:
+                        mutant_dataset, mutant_log, outcome, workspace_path = futures.pop(mutant_id).result()
+                        outcome = mergeMutantResults(mutant_id, outcome, mutant_dataset, mutant_log, workspace_path, dataset, executions_log, checkpoint, sut_path)
+                        
+                        if sweep_scopes and outcome == "killed" and dataset.get(mutant_id, 'Swept_by') is None:
+                            sweepKillerTest(mutant_id, sweep_scopes, dataset, executions_log, checkpoint, sut_path, project_test_dir, results_dirs)
+                        gate.finish(mutant_id)
+            except BaseException:
+                # Interrupted: do not start the queued mutants, they are processed on resume
+                for future in futures.values():
+                    future.cancel()
+                raise
+    finally:
+        shutdown_sumo_daemons()
+        pool.cleanup()
+
+
+def launchAsyncExperiment(model:str, sut_path:str, project_test_dir:str, live_mutants: pd.DataFrame, dataset: MutantStore, results_path:str, results_dirs:dict, executions_log: ExecutionLog, checkpoint: ExperimentCheckpoint, workers:int, prefetch:int, sweep_scopes:list = None, budget: ExperimentBudget = None, attempt_policy: AttemptPolicy = None):
+    """
+    Process the live mutants with an asyncio pipeline: up to prefetch mutants are in flight, so the
+    hypotheses and tests of the upcoming mutants are generated while the current ones are being tested.
+    LLM stages run in worker threads on the pooled HTTP client, SuMo stages run as asyncio subprocesses
+    on a pool of workers SUT workspaces (the SUT itself if workers is 1).
+    Results are merged back in the order of the live mutants. With sweep scopes, mutants are started
+    only once the mutants whose killer test may kill them are merged, and merged as soon as they finish (see DispatchGate).
+    :model: the model to be used (llama, gpt-4o or gpt-4o-mini)   
+    :sut_path: project folder path
+    :project_test_dir: test folder path    
+    :live_mutants: the mutants to be processed
+    :dataset: the mutant dataset
+    :results_path: workspace results path
+    :results_dirs: the directories where results are saved
+    :executions_log: the experiment executions log
+    :checkpoint: the experiment checkpoint
+    :workers: number of SUT workspaces in which SuMo runs concurrently
+    :prefetch: number of mutants in flight
+    :sweep_scopes: the mutants against which each new killer test is run (see sweepKillerTest), as results are merged
+    :budget: the token and wall-clock budget of the run, started before the first mutant: mutants not started when it is exhausted are left pending
+    :attempt_policy: decides how many hypotheses and fixes are made for each mutant
+    """
+    pool = WorkspacePool(sut_path, os.path.join(os.path.dirname(results_path), "workers"), workers) if workers > 1 else None
+    workspaces = [workspace.sut_path for workspace in pool.workspaces] if pool is not None else [sut_path]
+    
+    async def runPipeline():
+        loop = asyncio.get_running_loop()
+        configure_sumo_executor(AsyncSuMoExecutor(loop, workspaces))
+        in_flight = asyncio.Semaphore(prefetch)
         
-        # Initialize history and counter
-        hypothesis_counter = 0   
-        history = init_history()
-        mutant_status = "live"
+        # Mutant threads block on SuMo results, so they must not share the loop's default executor
+        mutant_threads = ThreadPoolExecutor(max_workers=prefetch)
+        try:
+            async def processMutantAsync(index, mutant):
+                async with in_flight:
+                    print(f"## [Pipeline] {index}/{len(dataset)} - Processing mutant {mutant['Mutant_id']} for contract {mutant['Contract_id']} and test file {mutant['Test_id']}")      
+                    return await loop.run_in_executor(mutant_threads, processMutantInIsolation, model, mutant, dataset, sut_path, project_test_dir, results_dirs, checkpoint, budget, attempt_policy)
+            
+            gate = DispatchGate(dataset, list(live_mutants['Mutant_id']), sweep_scopes or [])
+            pending = list(live_mutants.iterrows())
+            tasks = {}
             
-        last_hypothesis = ""
+            # The workspaces are ready: the budget is spent from the first mutant
+            if budget is not None:
+                budget.start()
+            
+            def dispatch():
+                # Start the pending mutants not held back by the gate, in queue order, while fewer than prefetch are in flight
+                nonlocal pending
+                running = sum(not task.done() for task in tasks.values())
+                waiting = []
+                for position, (index, mutant) in enumerate(pending):
+                    if dataset.get(mutant['Mutant_id'], 'Status') != "live":
+                        # Killed by a sweep before being started
+                        gate.finish(mutant['Mutant_id'])
+                    elif running >= prefetch:
+                        waiting += pending[position:]
+                        break
+                    elif gate.blocked(mutant['Mutant_id']):
+                        waiting.append((index, mutant))
+                    else:
+                        tasks[mutant['Mutant_id']] = asyncio.create_task(processMutantAsync(index, mutant.copy()))
+                        running += 1
+                pending = waiting
+            
+            while len(gate) > 0:
+                dispatch()
+                finished = gate.mergeable([mutant_id for mutant_id, task in tasks.items() if task.done()])
+                if not finished:
+                    await asyncio.wait([task for task in tasks.values() if not task.done()], return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                for mutant_id in finished:
+                    mutant_dataset, mutant_log, outcome = await tasks.pop(mutant_id)
+                    outcome = mergeMutantResults(mutant_id, outcome, mutant_dataset, mutant_log, sut_path, dataset, executions_log, checkpoint, sut_path)
+                    
+                    if sweep_scopes and outcome == "killed" and dataset.get(mutant_id, 'Swept_by') is None:
+                        # The sweep waits for SuMo stages run on this loop
+                        await asyncio.to_thread(sweepKillerTest, mutant_id, sweep_scopes, dataset, executions_log, checkpoint, sut_path, project_test_dir, results_dirs)
+                    gate.finish(mutant_id)
+        except BaseException:
+            # Interrupted: waiting for the mutant threads here would block the loop they wait on.
+            # Cancelling the pipeline tasks also cancels their pending SuMo stages.
+            mutant_threads.shutdown(wait=False, cancel_futures=True)
+            raise
+        mutant_threads.shutdown()
+    
+    try:
+        asyncio.run(runPipeline())
+    finally:
+        configure_sumo_executor(None)
+        shutdown_sumo_daemons()
+        if pool is not None:
+            pool.cleanup()
+
+
+def processMutantInIsolation(model:str, mutant: pd.Series, dataset: MutantStore, sut_path:str, project_test_dir:str, results_dirs:dict, checkpoint: ExperimentCheckpoint, budget: ExperimentBudget = None, attempt_policy: AttemptPolicy = None) -> tuple[MutantStore, ExecutionLog, str]:
+    """
+    Process a mutant on its own subset of the dataset and its own executions log, so that
+    concurrent mutants never write to shared state. The caller merges the results back.
+    A mutant killed by a sweep since it was queued is skipped, or stopped before its next stage if the sweep happens
+    while it is processed, and all mutants are skipped once the budget is exhausted (outcome "skipped": they stay
+    pending in the checkpoint).
+    :model: the model to be used (llama, gpt-4o or gpt-4o-mini)   
+    :mutant: the mutant to be processed
+    :dataset: the mutant dataset (only read)
+    :sut_path: project folder path
+    :project_test_dir: test folder path    
+    :results_dirs: the directories where results are saved
+    :checkpoint: the experiment checkpoint (the progress of the mutant is only read, since its
+                 updates stay in memory until merged)
+    :budget: the token and wall-clock budget of the run
+    :attempt_policy: decides how many hypotheses and fixes are made for the mutant
+    
+    :return: the updated dataset subset, the in-memory executions log and the outcome for the mutant
+    """
+    mutant_log = ExecutionLog()
+    if dataset.get(mutant['Mutant_id'], 'Status') != "live":
+        print(f"## Mutant {mutant['Mutant_id']} already killed by the test of mutant {dataset.get(mutant['Mutant_id'], 'Swept_by')} - Skipping")
+        return dataset.subset([]), mutant_log, "killed"
+    exhausted = budget.exhausted() if budget is not None else None
+    if exhausted is not None:
+        print(f"## Budget exhausted: {exhausted} - mutant {mutant['Mutant_id']} is left for a resumed run")
+        return dataset.subset([]), mutant_log, "skipped"
+    
+    mutant_dataset = dataset.subset([mutant['Mutant_id']])
+    # Sweeps of the killer tests merged meanwhile update the shared dataset
+    swept_by = lambda: dataset.get(mutant['Mutant_id'], 'Swept_by')
+    outcome = processMutant(model, mutant, mutant_dataset, sut_path, project_test_dir, results_dirs, mutant_log, DeferredCheckpoint(checkpoint), attempt_policy, swept_by)
+    return mutant_dataset, mutant_log, outcome
+
+
+def processMutant(model:str, mutant: pd.Series, dataset: MutantStore, sut_path:str, project_test_dir:str, results_dirs:dict, executions_log: ExecutionLog, checkpoint: ExperimentCheckpoint = None, attempt_policy: AttemptPolicy = None, swept_by = None) -> str:
+    """
+    Generate hypotheses and experiments for a single mutant until it is killed or max attempts are reached.
+    :model: the model to be used (llama, gpt-4o or gpt-4o-mini)   
+    :mutant: the mutant to be processed
+    :dataset: the mutant dataset
+    :sut_path: project folder path
+    :project_test_dir: test folder path    
+    :results_dirs: the directories where results are saved
+    :executions_log: the experiment executions log
+    :checkpoint: the experiment checkpoint, used to record the progress of the mutant and to resume it
+    :attempt_policy: decides how many hypotheses and fixes are made (by default, HYP_LOOP and FIX_LOOP)
+    :swept_by: returns the mutant whose killer test killed this mutant in a sweep since it was started, if any:
+               checked before each hypothesis, test generation and fix (the mutant is then killed)
+    
+    :return: the outcome for the mutant: killed, live or error
+    """
+    mutant_id = mutant['Mutant_id']
+    contract_id = mutant['Contract_id']           
+    test_id = mutant['Test_id']
+    function_name = mutant['Function_name']
+    
+    # Initialize history and counter
+    hypothesis_counter = 0   
+    if attempt_policy is None:
+        attempt_policy = AttemptPolicy(hypothesis_loopSize, fix_loopSize)
+    usage_recorder.pop()
+    history = init_history()
+    mutant_status = "live"
         
-        #Generate new hypotheses and experiment until mutant is killed or max attempts are reached
-        while (hypothesis_counter < hypothesis_loopSize and mutant_status == "live"):     
-                        
+    last_hypothesis = ""
+    
+    # Resume the mutant from its last checkpointed attempt
+    pending_test_file_path = None
+    progress = checkpoint.progress(mutant_id) if checkpoint is not None else None
+    if progress is not None:
+        hypothesis_counter = progress['hypothesis_attempt']
+        history = progress['history']
+        last_hypothesis = progress['last_hypothesis']
+        if progress['test_file'] is not None:
+            pending_test_file_path = restore_generated_test(progress['test_file'], results_dirs['generated_tests'], project_test_dir)
+            mutant['Generated_test'] = progress['generated_test']
+            dataset.update(mutant_id, Generated_test=progress['generated_test'])
+        print(f"## Resuming mutant {mutant_id} at hypothesis attempt {hypothesis_counter}" + (f", fix attempt {progress['fix_attempt']}" if pending_test_file_path else ""))
+    
+    #Generate new hypotheses and experiment until mutant is killed or max attempts are reached
+    while (mutant_status == "live" and (pending_test_file_path is not None or attemptAllowed(attempt_policy, executions_log, mutant, "hypothesis", hypothesis_counter + 1))):     
+        
+        if wasSwept(swept_by, mutant_id):
+            return "killed"
+        
+        if pending_test_file_path is not None:
+            # The test of the current hypothesis is waiting for pretest
+            test_file_path_in_SUT = pending_test_file_path
+            fix_counter = progress['fix_attempt']
+            pending_test_file_path = None
+        else:
             hypothesis_counter += 1
             
             # Generate the initial hypothesis
@@ -212,7 +665,7 @@ def launchExperiment(model:str, sut_path:str, project_test_dir:str, results_path
                 hypothesis_id, hypothesis, history = gen_hypothesis(model, mutant, hypothesis_counter, results_dirs['interactions'], [], "")
                 last_hypothesis = hypothesis
                 elapsed_time = round(time.time() - start_time, 2)
-                log_execution(executions_path, mutant_id, contract_id, test_id, function_name, "Generate-Hypothesis", hypothesis_counter, hypothesis_id, elapsed_time, (hypothesis is not None))
+                log_execution(executions_log, mutant_id, contract_id, test_id, function_name, "Generate-Hypothesis", hypothesis_counter, hypothesis_id, elapsed_time, (hypothesis is not None), usage_recorder.pop())
             else:
                 #break
                 #Trim history until previously rejected hypothesis
@@ -222,60 +675,248 @@ def launchExperiment(model:str, sut_path:str, project_test_dir:str, results_path
                 hypothesis_id, hypothesis, history = gen_hypothesis(model, mutant, hypothesis_counter, results_dirs['interactions'], history, last_hypothesis)
                 last_hypothesis = hypothesis                                                     
                 elapsed_time = round(time.time() - start_time, 2)                                    
-                log_execution(executions_path, mutant_id, contract_id, test_id, function_name, f"Generate-Hypothesis", hypothesis_counter, hypothesis_id, elapsed_time, (hypothesis is not None))                        
+                log_execution(executions_log, mutant_id, contract_id, test_id, function_name, f"Generate-Hypothesis", hypothesis_counter, hypothesis_id, elapsed_time, (hypothesis is not None), usage_recorder.pop())                        
 
             if hypothesis is None:
                 print("## ERROR while generating hypothesis - Skipping to next mutant")
-                break                          
+                return "error"
+            if wasSwept(swept_by, mutant_id):
+                return "killed"
             
             
             # Generate test code based on the hypothesis
             start_time = time.time()
             test_file_path_in_SUT, test_file_code, history = gen_experiment(model, mutant, hypothesis_counter, project_test_dir, results_dirs['generated_tests'], results_dirs['interactions'], history)
             elapsed_time = round(time.time() - start_time, 2)
-            dataset.loc[dataset['Mutant_id'] == mutant_id, 'Generated_test'] = test_file_code.replace("\n", " ")
-            mutant['Generated_test'] = test_file_code.replace("\n", " ")
-            log_execution(executions_path, mutant_id, contract_id, test_id, function_name, "Generate-Test", hypothesis_counter, test_file_path_in_SUT, elapsed_time, (test_file_path_in_SUT is not None))
+            log_execution(executions_log, mutant_id, contract_id, test_id, function_name, "Generate-Test", hypothesis_counter, test_file_path_in_SUT, elapsed_time, (test_file_path_in_SUT is not None), usage_recorder.pop())
 
             if test_file_path_in_SUT is None:
                 print("## ERROR while generating test for mutant - Skipping to next mutant")
-                break
-
+                return "error"
 
-            # Run pretest and fix the generated test
-            pretest_successful, test_file_path_in_SUT = runPretestAndFix(model, test_file_path_in_SUT, mutant, dataset, executions_path, sut_path, project_test_dir, results_dirs['generated_tests'], results_dirs['error_tests'], results_dirs['correct_tests'], results_dirs['interactions'])
+            dataset.update(mutant_id, Generated_test=test_file_code.replace("\n", " "))
+            mutant['Generated_test'] = test_file_code.replace("\n", " ")
+            fix_counter = 0
 
-            if pretest_successful:
-                # Run the actual test
-                start_time = time.time()
-                test_outcome = run_sumo_drytest(mutant_id, test_file_path_in_SUT, sut_path)
-                elapsed_time = round(time.time() - start_time, 2)
-                log_execution(executions_path, mutant_id, contract_id, test_id, function_name, "SuMo-Test", hypothesis_counter, test_file_path_in_SUT, elapsed_time, test_outcome)
-
-                if test_outcome == "killed":
-                    print("### Mutant was KILLED - Testing next mutant")
-                    mutant_status = "killed"
-                    dataset.loc[dataset['Mutant_id'] == mutant_id, 'KilledByLLM'] = True
-                    dataset.loc[dataset['Mutant_id'] == mutant_id, 'Status'] = "killed"
-                    copy_file(test_file_path_in_SUT, results_dirs['killer_tests'])
-            else:
-                print("### Test could not be fixed after MAX_ATTEMPTS - Skipping to next mutant")
-                break      
+        def checkpoint_test(test_file_path, n_fixes):
+            # Record the test file waiting for pretest, so a resumed run restarts from it
+            if checkpoint is not None:
+                checkpoint.save_progress(mutant_id, hypothesis_counter, history, last_hypothesis, os.path.basename(test_file_path), n_fixes, mutant['Generated_test'])
         
-        dataset.to_csv(dataset_path, index=False)
- 
-def log_execution(executions_path, mutant_id, contract_id, test_id, function_name, phase, attempt, artefact, time, result):
-       # Get executions log
-       executions = pd.read_csv(executions_path)  
+        checkpoint_test(test_file_path_in_SUT, fix_counter)
+
+        # Run pretest and fix the generated test
+        pretest_successful, test_file_path_in_SUT = runPretestAndFix(model, test_file_path_in_SUT, mutant, dataset, executions_log, sut_path, project_test_dir, results_dirs['generated_tests'], results_dirs['error_tests'], results_dirs['correct_tests'], results_dirs['interactions'], fix_counter, checkpoint_test, attempt_policy, swept_by)
+        if wasSwept(swept_by, mutant_id):
+            return "killed"
+
+        if pretest_successful:
+            # Run the actual test
+            start_time = time.time()
+            test_outcome = run_sumo_drytest(mutant_id, test_file_path_in_SUT, sut_path)
+            elapsed_time = round(time.time() - start_time, 2)
+            log_execution(executions_log, mutant_id, contract_id, test_id, function_name, "SuMo-Test", hypothesis_counter, test_file_path_in_SUT, elapsed_time, test_outcome)
+
+            if test_outcome == "killed":
+                print("### Mutant was KILLED - Testing next mutant")
+                mutant_status = "killed"
+                dataset.update(mutant_id, KilledByLLM=True, Status="killed", Killer_test=os.path.basename(test_file_path_in_SUT))
+                store_test(test_file_path_in_SUT, results_dirs['killer_tests'])
+            elif checkpoint is not None:
+                # Hypothesis attempt over: a resumed run starts from the next hypothesis
+                checkpoint.save_progress(mutant_id, hypothesis_counter, history, last_hypothesis)
+        else:
+            print("### Test could not be fixed after MAX_ATTEMPTS - Skipping to next mutant")
+            break      
+    
+    return mutant_status
+
+
+def mergeMutantResults(mutant_id:str, outcome:str, mutant_dataset: MutantStore, mutant_log: ExecutionLog, workspace_path:str, dataset: MutantStore, executions_log: ExecutionLog, checkpoint: ExperimentCheckpoint, sut_path:str) -> str:
+    """
+    Merge the results of a mutant processed concurrently into the dataset, executions log and checkpoint.
+    If a sweep killed the mutant while it was being processed, the sweep's kill is kept.
+    :mutant_id: the mutant
+    :outcome: the outcome for the mutant
+    :mutant_dataset: the updated dataset subset of the mutant
+    :mutant_log: the in-memory executions log of the mutant
+    :workspace_path: the SUT folder in which the mutant was processed
+    :dataset: the mutant dataset
+    :executions_log: the experiment executions log
+    :checkpoint: the experiment checkpoint
+    :sut_path: project folder path
+    
+    :return: the outcome for the mutant
+    """
+    if outcome == "skipped":
+        # Not started (budget exhausted): the mutant stays pending
+        return outcome
+    for row in mutant_dataset.rows.values():
+        if dataset.get(row['Mutant_id'], 'Swept_by') is not None:
+            row = {column: value for column, value in row.items() if column not in SWEEP_COLUMNS}
+            outcome = "killed"
+        dataset.update(row['Mutant_id'], **row)
+    merge_executions_log(executions_log, mutant_log, workspace_path, sut_path)
+    dataset.commit()
+    checkpoint.mark_done(mutant_id, outcome)
+    return outcome
+
+
+def group_by_prompt_prefix(mutant_ids: list, dataset: MutantStore) -> list:
+    """
+    Reorders a queue of mutants by contract, then by contract context and test setup (the leading context block
+    of the prefix prompt layout), keeping the queue order within each group and between groups.
+
+    :param mutant_ids: the queue of mutants
+    :param dataset: the mutant dataset
+    :return: the reordered queue
+    """
+    first_seen = {}
+    def group_key(mutant_id):
+        mutant = dataset.row(mutant_id)
+        keys = [(mutant['Contract_id'],),
+                (mutant['Contract_id'], str(contract_context(mutant))),
+                (mutant['Contract_id'], str(contract_context(mutant)), str(mutant['Test_Context']))]
+        return tuple(first_seen.setdefault(key, len(first_seen)) for key in keys)
+    group_keys = {mutant_id: group_key(mutant_id) for mutant_id in mutant_ids}
+    return sorted(mutant_ids, key=lambda mutant_id: group_keys[mutant_id])
+
+
+def sweep_candidates(dataset: MutantStore, killer_id:str, scopes:list) -> list:
+    """
+    Select the live mutants against which the test that killed a mutant is run:
+     - cluster: the other members of its cluster (same edit, see mutantClusters.py)
+     - contract: the other mutants of the same contract, those of the same function first, then the
+       closest ones to the killed mutant (at most SWEEP_MAX_MUTANTS)
+    :dataset: the mutant dataset
+    :killer_id: the mutant killed by the test
+    :scopes: the selected scopes, in order
+    
+    :return: the dataset rows of the selected mutants
+    """
+    killer = dataset.row(killer_id)
+    live_mutants = [row for row in dataset.rows.values() if row['Status'] == "live" and row['Mutant_id'] != killer_id]
+    
+    candidates = []
+    if "cluster" in scopes and dataset.get(killer_id, 'Cluster_id') is not None:
+        candidates += [row for row in live_mutants if row.get('Cluster_id') == killer['Cluster_id']]
+    if "contract" in scopes:
+        selected = {row['Mutant_id'] for row in candidates}
+        contract_mutants = [row for row in live_mutants if row['Contract_id'] == killer['Contract_id'] and row['Mutant_id'] not in selected]
+        contract_mutants.sort(key=lambda row: (row['Function_name'] != killer['Function_name'], abs(row['StartLine'] - killer['StartLine'])))
+        candidates += contract_mutants[:sweep_max_mutants] if sweep_max_mutants > 0 else contract_mutants
+    return candidates
+
+
+def sweepKillerTest(killer_id:str, scopes:list, dataset: MutantStore, executions_log: ExecutionLog, checkpoint: ExperimentCheckpoint, sut_path:str, project_test_dir:str, results_dirs:dict) -> list:
+    """
+    Run the test that killed a mutant against other live mutants (see sweep_candidates), before any of them is prompted.
+    Mutants killed by the sweep are marked in the dataset (Swept_by), so they are never prompted.
+    :killer_id: the mutant killed by the test
+    :scopes: the mutants against which the test is run: cluster and/or contract
+    :dataset: the mutant dataset
+    :executions_log: the experiment executions log
+    :checkpoint: the experiment checkpoint
+    :sut_path: project folder path
+    :project_test_dir: test folder path    
+    :results_dirs: the directories where results are saved
+    
+    :return: the ids of the mutants killed by the sweep
+    """
+    killer = dataset.row(killer_id)
+    candidates = sweep_candidates(dataset, killer_id, scopes)
+    if len(candidates) == 0:
+        return []
+    
+    # The killer test may have been generated in another SUT folder (e.g.: a worker clone)
+    test_file_path = restore_generated_test(killer['Killer_test'], results_dirs['killer_tests'], project_test_dir)
+    print(f"## Sweeping the killer test of mutant {killer_id} across {len(candidates)} live mutants ({', '.join(scopes)})")
+    
+    start_time = time.time()
+    outcomes = run_sumo_drytests([row['Mutant_id'] for row in candidates], test_file_path, sut_path)
+    elapsed_time = round((time.time() - start_time) / len(candidates), 2)
+    
+    swept = []
+    for row in candidates:
+        mutant_id = row['Mutant_id']
+        log_execution(executions_log, mutant_id, row['Contract_id'], row['Test_id'], row['Function_name'], "SuMo-Sweep", 0, test_file_path, elapsed_time, outcomes[mutant_id])
+        if outcomes[mutant_id] == "killed":
+            dataset.update(mutant_id, KilledByLLM=True, Status="killed", Killer_test=killer['Killer_test'], Swept_by=killer_id)
+            swept.append(mutant_id)
+    dataset.commit()
+    for mutant_id in swept:
+        checkpoint.mark_done(mutant_id, "killed")
+    
+    print(f"### The killer test of mutant {killer_id} killed {len(swept)} more mutants: {swept}")
+    return swept
+
+
+def restore_generated_test(test_file_name: str, generated_tests_dir: str, project_test_dir: str) -> str:
+    """
+    Copy a generated test back into the test folder of the SUT (e.g.: when resuming an experiment).
+    :test_file_name: the name of the test file
+    :generated_tests_dir: path to folder containing the generated tests (when they are not archived)
+    :project_test_dir: test folder path    
+    
+    :return: the path to the test file in the SUT
+    """
+    test_file_path = os.path.join(project_test_dir, test_file_name)
+    if not os.path.isfile(test_file_path):
+        save_test_to_file(test_file_path, load_test(test_file_name, generated_tests_dir))
+    return test_file_path
+
+
+def merge_executions_log(executions_log, mutant_log, workspace_path, sut_path):
+       # Append the executions logged by a worker to the executions log, pointing artefacts back to the SUT
+       for event in mutant_log.events:
+              if isinstance(event['Artefact'], str):
+                     event['Artefact'] = event['Artefact'].replace(workspace_path, sut_path)
+       executions_log.extend(mutant_log.events)
+
+def wasSwept(swept_by, mutant_id:str) -> bool:
+    """
+    Checks whether a mutant being processed was killed meanwhile by the sweep of another killer test.
+    :swept_by: returns the mutant whose killer test killed the mutant, if any (None if mutants are not swept)
+    :mutant_id: the mutant
+    
+    :return: True if the mutant was killed by a sweep
+    """
+    killer_id = swept_by() if swept_by is not None else None
+    if killer_id is not None:
+        print(f"## Mutant {mutant_id} was killed by the test of mutant {killer_id} - Stopping")
+    return killer_id is not None
+
+def attemptAllowed(attempt_policy: AttemptPolicy, executions_log: ExecutionLog, mutant: dict, loop: str, attempt: int) -> bool:
+    """
+    Asks the attempt policy whether to make the next hypothesis or fix attempt for a mutant.
+    The decisions of the adaptive policy are printed and logged (phase Attempt-Policy, result True to continue).
+    :attempt_policy: the attempt policy
+    :executions_log: the executions log
+    :mutant: the mutant
+    :loop: hypothesis or fix
+    :attempt: the attempt number (from 1)
+    
+    :return: True if the attempt is made
+    """
+    allowed, reason = attempt_policy.allows(loop, mutant_operator(mutant), attempt)
+    if reason is not None:
+        print(f"## <ATTEMPTS> {'Making' if allowed else 'Skipping'} {loop} attempt {attempt} for mutant {mutant['Mutant_id']}: {reason}")
+        log_execution(executions_log, mutant['Mutant_id'], mutant['Contract_id'], mutant['Test_id'], mutant['Function_name'], "Attempt-Policy", attempt, f"{loop}: {reason}", 0, allowed)
+    return allowed
+
+def log_execution(executions_log, mutant_id, contract_id, test_id, function_name, phase, attempt, artefact, time, result, usage=None):
+       # Append the execution to the log, with the token usage of the model calls of the LLM phases (see llmUsage)
        mutant_execution= {'Mutant_id': mutant_id,  'Contract_id': contract_id, 'Test_id': test_id, "Function_name": function_name,  'Phase': phase, 'Attempt': attempt, 'Artefact': artefact, 'Time': time, 'Result': result}  
-       executions.loc[len(executions)] = mutant_execution
-       executions.to_csv(executions_path, index=False)    
+       if usage is not None:
+           mutant_execution.update(usage)
+       executions_log.log(mutant_execution)
                        
-def getWorkspacePaths(sut_path:str, model:str) -> tuple[str, str, str, str]:
+def getWorkspacePaths(sut_path:str, model:str, results_path:str = None) -> tuple[str, str, str, str]:
     """
     Sets up the workspace for a given project folder. 
     :sut_path (str): The path to the project folder.
     :model (str): The used model.    
+    :results_path (str): An existing results folder to be reused (e.g.: when resuming), None to create a new one.
 
     :return: Tuple[str, str]: A tuple containing the workspace paths.
     """
@@ -285,7 +926,8 @@ def getWorkspacePaths(sut_path:str, model:str) -> tuple[str, str, str, str]:
     
     #workspace paths    
     workspace = os.path.join(os.getcwd(), project_name)
-    results_path = os.path.join(workspace, f"results_{model}_{timestamp}")
+    if results_path is None:
+        results_path = os.path.join(workspace, f"results_{model}_{timestamp}")
     sumo_artifacts_path = os.path.join(workspace, f"sumo_artifacts")    
 
     #SUT paths
@@ -336,6 +978,29 @@ def main():
     parser.add_argument('model', type=str, default=None, help='name of the model to be used (e.g.: llama, gpt-40-mini')    
     parser.add_argument('--create_dataset', action='store_true', help='create csv dataset from the mutations.json')
     parser.add_argument('--launch_experiment', action='store_true', help='launch experiment for generating test cases to kill mutants') 
+    parser.add_argument('--sumo_runner', choices=['cli', 'daemon'], default='cli', help='run SuMo through a new npx process per call (cli) or a persistent runner per SUT (daemon), which runs pretests and drytests with a warm Hardhat runtime (drytests of mutants missing from the SuMo mutations report fall back to the SuMo CLI)')
+    parser.add_argument('--cache', choices=['read', 'write', 'off'], default='off', help='on-disk cache of model responses: replay cached responses (read), always query the model and refresh the cache (write) or disable it (off)')
+    parser.add_argument('--mutant_cache', action='store_true', help='cache the compiled artifacts of mutants on disk, so drytests of an already compiled mutant skip its compilation')
+    parser.add_argument('--context', choices=['full', 'sliced'], default='full', help='contract context in the prompts: the whole contract (full) or the mutated function and its dependencies, within CONTEXT_TOKEN_BUDGET tokens (sliced)')
+    parser.add_argument('--prompt_layout', choices=['default', 'prefix'], default='default', help='put the contract code and test setup in a leading block shared by the mutants of a contract, and process these mutants consecutively, so that provider-side prefix caching applies (prefix)')
+    parser.add_argument('--stream', action='store_true', help='stream the completions of generated and fixed tests, and stop them as soon as the code block is closed')
+    parser.add_argument('--hedge', choices=['gpt-4o-mini', 'gpt-4o', 'llama'], default=None, metavar='MODEL', help='send the requests the model has not answered within HEDGE_PERCENTILE of its latencies to this secondary model too, and use the first usable answer')
+    parser.add_argument('--scheduler', choices=SCHEDULERS, default='order', help='order of the live mutants: dataset order (order), or estimated kills per mutant, token or second from the previous runs of the SUT (kill_rate)')
+    parser.add_argument('--budget_tokens', type=int, default=None, help='stop starting new mutants once the run used this many prompt and completion tokens (all the live mutants are scheduled instead of MAX_MUTANTS)')
+    parser.add_argument('--budget_minutes', type=float, default=None, help='stop starting new mutants after this many minutes (all the live mutants are scheduled instead of MAX_MUTANTS)')
+    parser.add_argument('--adaptive_attempts', action='store_true', help='learn the number of hypotheses per mutant and fixes per test from the previous runs of the SUT (kills per token of each attempt, per mutation operator) instead of HYP_LOOP and FIX_LOOP')
+    parser.add_argument('--record', action='store_true', help='record every model exchange and SuMo outcome of the run to trace.jsonl in its results folder')
+    parser.add_argument('--replay', type=str, default=None, metavar='TRACE', help='re-run the experiment against a recorded trace.jsonl: no model requests, and no SuMo runs unless --replay_live_sumo')
+    parser.add_argument('--replay_live_sumo', action='store_true', help='with --replay, run SuMo instead of replaying its recorded outcomes')
+    parser.add_argument('--archive', action='store_true', help='store the interactions and test files of the run in archive.sqlite (compressed, test files stored once per content) instead of separate files; see resultsArchive.py to export them')
+    parser.add_argument('--static_check', action='store_true', help='check the syntax and imports of generated tests and their contract calls against the ABI before the SuMo pretest (requires typescript in the SUT; other type errors are only logged)')
+    parser.add_argument('--async_pipeline', action='store_true', help='overlap the LLM stages of upcoming mutants with the SuMo stages of the current ones (with --sumo_runner daemon, the pretests waiting for a workspace are run as one batch)')
+    parser.add_argument('--prefetch', type=int, default=4, help='number of mutants in flight in the async pipeline (default: 4)')
+    parser.add_argument('--resume', type=str, default=None, metavar='RESULTS_DIR', help='resume the checkpointed experiment saved in the given results folder (with the model, SUT, HYP_LOOP and FIX_LOOP it was started with)')
+    parser.add_argument('--force_resume', action='store_true', help='resume the experiment even if its model, SUT, HYP_LOOP or FIX_LOOP differ from the current ones')
+    parser.add_argument('--kill_sweep', action='store_true', help='run each new killer test against the other live mutants of the same contract, so the mutants it kills are never prompted')
+    parser.add_argument('--dedup', action='store_true', help='cluster the mutants applying the same edit, prompt a representative first and run its killer test against the other members')
+    parser.add_argument('--workers', type=int, default=1, help='number of mutants processed concurrently, each in its own clone of the SUT (default: 1)')
     
     argcomplete.autocomplete(parser)
 
@@ -350,10 +1015,46 @@ def main():
         print(f"The selected model '{args.model}' is not valid.")
         return   
     
+    if args.workers < 1 or args.prefetch < 1:
+        print(f"The number of workers and prefetched mutants must be at least 1.")
+        return
+
+    configure_sumo_runner(args.sumo_runner)
+    configure_llm_cache(args.cache)
+    configure_mutant_artifact_cache(args.mutant_cache)
+    configure_static_check(args.static_check)
+    configure_context(args.context)
+    configure_prompt_layout(args.prompt_layout)
+    configure_streaming(args.stream)
+    configure_hedging(args.hedge)
+    configure_results_archive(args.archive)
+    configure_run_trace(args.record, args.replay, not args.replay_live_sumo)
+
+    budget = None
+    if args.budget_tokens is not None or args.budget_minutes is not None:
+        budget = ExperimentBudget(args.budget_tokens, args.budget_minutes * 60 if args.budget_minutes is not None else None)
+
+    if args.resume is not None and not ExperimentCheckpoint.exists(args.resume):
+        print(f"No experiment checkpoint found in '{args.resume}'.")
+        return
+    if args.resume is not None and not args.force_resume:
+        # Results of two configurations must not be mixed in the same results folder
+        mismatched = ExperimentCheckpoint(args.resume).load().mismatched_settings(**experimentSettings(args.model, args.sut_path))
+        if mismatched:
+            for name, (saved, current) in mismatched.items():
+                print(f"The experiment in '{args.resume}' was started with {name} '{saved}', not '{current}'.")
+            print("Resume it with the same settings, or pass --force_resume to resume it anyway.")
+            return
+
     # get relevant paths
-    results_path, executions_path, dataset_path, mutations_path, sut_test_dir_path = getWorkspacePaths(args.sut_path, args.model) 
+    results_path, executions_path, dataset_path, mutations_path, sut_test_dir_path = getWorkspacePaths(args.sut_path, args.model, args.resume) 
     
-    if args.create_dataset:
+    if args.resume is not None:
+        print(f'Resuming experiment with {args.model} in {results_path}\n')
+        launchExperiment(args.model, args.sut_path, sut_test_dir_path, results_path, dataset_path, executions_path, args.workers, args.async_pipeline, args.prefetch, resume=True, kill_sweep=args.kill_sweep, dedup=args.dedup, group_by_contract=(args.prompt_layout == "prefix"), scheduler=args.scheduler, budget=budget, adaptive_attempts=args.adaptive_attempts)
+        copySuMoArtifactsToResults(args.sut_path, results_path)
+        
+    elif args.create_dataset:
         create_dataset(mutations_path, dataset_path)
         
     elif args.launch_experiment:
@@ -362,7 +1063,7 @@ def main():
         create_dataset(mutations_path, dataset_path)    
             
         print(f'Running experiment with {args.model} to generate test cases for {mutantNbre} mutants\n')
-        launchExperiment(args.model, args.sut_path, sut_test_dir_path, results_path, dataset_path, executions_path)
+        launchExperiment(args.model, args.sut_path, sut_test_dir_path, results_path, dataset_path, executions_path, args.workers, args.async_pipeline, args.prefetch, kill_sweep=args.kill_sweep, dedup=args.dedup, group_by_contract=(args.prompt_layout == "prefix"), scheduler=args.scheduler, budget=budget, adaptive_attempts=args.adaptive_attempts)
         copySuMoArtifactsToResults(args.sut_path, results_path)
         
 if __name__ == '__main__':
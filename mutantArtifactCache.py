@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+# Folders of the SUT whose content determines the compiled artifacts
+SOURCE_DIRS = ["contracts"]
+# Hardhat outputs: the compiled artifacts, and the compilation cache (the content hash each source was compiled from)
+ARTIFACTS_DIR = "artifacts"
+SOLIDITY_FILES_CACHE = os.path.join("cache", "solidity-files-cache.json")
+
+
+class MutantArtifactCache:
+    """
+    On-disk cache of the compiled artifacts of mutants.
+    SuMo drytests apply the mutant and let Hardhat compile it. The compilation only rewrites the artifacts of the
+    sources compiled with the mutated contract (its compilation job), and their entries in Hardhat's compilation
+    cache. Only those artifact files are saved in <cache_dir>/<key>/, with the compilation cache entries of their
+    sources (by source name, since Hardhat's compilation cache refers to absolute paths).
+    Restoring them before the next drytest of the mutant (in a later attempt or run, or in another clone of the SUT)
+    lets Hardhat skip the compilation, since the content hashes of the restored entries match the mutated sources.
+    The key is the hash of the mutant id, the original sources and the compiler config, which determine the
+    mutated sources, and does not depend on the SUT folder.
+    The least recently used entries are evicted when the cache grows beyond max_size.
+    """
+    def __init__(self, cache_dir: str, max_size: int):
+        """
+        :param cache_dir: the folder where the artifacts are saved
+        :param max_size: the max size of the cache (in bytes)
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._size = None
+        self._lock = threading.Lock()
+        # Artifacts of the SUT folders before the drytests of the mutants missing from the cache, by key and folder
+        self._snapshots = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(mutant_id: str, project_dir: str) -> str:
+        """
+        Computes the cache key of a mutant. Must be called while the SUT holds the original sources.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{mutant_id}\0".encode('utf-8'))
+        config_files = sorted(name for name in os.listdir(project_dir) if name.startswith("hardhat.config."))
+        source_files = []
+        for source_dir in SOURCE_DIRS:
+            for root, _, files in os.walk(os.path.join(project_dir, source_dir)):
+                source_files += [os.path.relpath(os.path.join(root, name), project_dir) for name in files]
+        for path in config_files + sorted(source_files):
+            digest.update(path.encode('utf-8') + b"\0")
+            with open(os.path.join(project_dir, path), 'rb') as file:
+                digest.update(hashlib.sha256(file.read()).digest())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    @staticmethod
+    def _snapshot(project_dir: str) -> dict:
+        # Size and modification time of each artifact file: the files a compilation writes are those that change
+        snapshot = {}
+        artifacts_dir = os.path.join(project_dir, ARTIFACTS_DIR)
+        for root, _, files in os.walk(artifacts_dir):
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                snapshot[os.path.relpath(os.path.join(root, name), artifacts_dir)] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    @staticmethod
+    def _load_files_cache(project_dir: str) -> dict:
+        try:
+            with open(os.path.join(project_dir, SOLIDITY_FILES_CACHE), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {"_format": "hh-sol-cache-2", "files": {}}
+
+    def restore(self, key: str, project_dir: str) -> bool:
+        """
+        Copies the cached artifacts of a mutant into the SUT and merges their entries into its compilation cache.
+        If the mutant is not cached, the artifacts of the SUT are recorded, so that store saves those its drytest writes.
+
+        :return: True if the artifacts were cached, False otherwise
+        """
+        path = self._path(key)
+        if not os.path.isfile(os.path.join(path, "sources.json")):
+            with self._lock:
+                self._snapshots[(key, os.path.abspath(project_dir))] = self._snapshot(project_dir)
+            return False
+        try:
+            with open(os.path.join(path, "sources.json"), 'r', encoding='utf-8') as file:
+                sources = json.load(file)
+            # Copies, not links: Hardhat rewrites its outputs in place
+            shutil.copytree(os.path.join(path, ARTIFACTS_DIR), os.path.join(project_dir, ARTIFACTS_DIR), dirs_exist_ok=True)
+            files_cache = self._load_files_cache(project_dir)
+            files_cache["files"] = {absolute_path: entry for absolute_path, entry in files_cache["files"].items() if entry.get("sourceName") not in sources}
+            for source_name, entry in sources.items():
+                files_cache["files"][os.path.join(os.path.abspath(project_dir), source_name)] = entry
+            os.makedirs(os.path.dirname(os.path.join(project_dir, SOLIDITY_FILES_CACHE)), exist_ok=True)
+            with open(os.path.join(project_dir, SOLIDITY_FILES_CACHE), 'w', encoding='utf-8') as file:
+                json.dump(files_cache, file, indent=2)
+            # Mark the entry as recently used
+            os.utime(path)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def store(self, key: str, project_dir: str):
+        """
+        Saves the artifacts written by the drytest of a mutant missing from the cache (see restore), with the
+        compilation cache entries of their sources, evicting old entries if needed.
+        The entry is renamed into place once complete, so concurrent readers never see partial entries.
+        """
+        with self._lock:
+            snapshot = self._snapshots.pop((key, os.path.abspath(project_dir)), None)
+        path = self._path(key)
+        if snapshot is None or os.path.isdir(path):
+            return
+        written = [name for name, signature in self._snapshot(project_dir).items() if snapshot.get(name) != signature]
+        if not written:
+            return
+        # The artifacts of a source are in artifacts/<source name>/
+        sources = {entry["sourceName"]: entry for entry in self._load_files_cache(project_dir)["files"].values()
+                   if any(name.startswith(entry.get("sourceName", "") + os.sep) for name in written)}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            for name in written:
+                os.makedirs(os.path.dirname(os.path.join(tmp_path, ARTIFACTS_DIR, name)), exist_ok=True)
+                shutil.copy2(os.path.join(project_dir, ARTIFACTS_DIR, name), os.path.join(tmp_path, ARTIFACTS_DIR, name))
+            with open(os.path.join(tmp_path, "sources.json"), 'w', encoding='utf-8') as file:
+                json.dump(sources, file)
+            os.replace(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry[2] for entry in self._entries())
+            else:
+                self._size += self._entry_size(path)
+            if self._size > self.max_size:
+                self.evict()
+
+    def discard(self, key: str, project_dir: str):
+        """
+        Forgets the artifacts recorded for a drytest whose artifacts are not saved (see restore).
+        """
+        with self._lock:
+            self._snapshots.pop((key, os.path.abspath(project_dir)), None)
+
+    @staticmethod
+    def _entry_size(path: str) -> int:
+        size = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return size
+
+    def _entries(self):
+        # (last use time, path, size) of every entry in the cache
+        for prefix in os.listdir(self.cache_dir):
+            prefix_path = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_path):
+                continue
+            for name in os.listdir(prefix_path):
+                path = os.path.join(prefix_path, name)
+                if name.endswith(".tmp") or not os.path.isdir(path):
+                    continue
+                try:
+                    last_used = os.path.getmtime(path)
+                except OSError:
+                    continue
+                yield last_used, path, self._entry_size(path)
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_size.
+        """
+        entries = sorted(self._entries())
+        total_size = sum(size for _, _, size in entries)
+        while entries and total_size > self.max_size:
+            _, path, size = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+        self._size = total_size
@@ -0,0 +1,74 @@
+import hashlib
+import re
+
+from mutantStore import MutantStore
+
+
+def normalize_edit(code) -> str:
+    """
+    Normalizes a snippet of a mutation, so that edits differing only in layout or comments match.
+    """
+    if not isinstance(code, str):
+        return ""
+    code = re.sub(r'/\*.*?\*/', '', code, flags=re.DOTALL)
+    code = re.sub(r'//[^\n]*', '', code)
+    return re.sub(r'\s+', '', code)
+
+
+def cluster_key(mutant: dict) -> str:
+    """
+    Returns the key of the cluster of a mutant: mutants applying the same operator with the same
+    Original -> Replacement edit in a function with the same name (e.g.: overloaded functions, or
+    functions copy-pasted across contracts) share the same key.
+
+    :param mutant: the mutant (a dataset row)
+    :return: the cluster id
+    """
+    edit = "|".join([str(mutant.get('Operator', "")),
+                     str(mutant.get('Function_name', "")),
+                     normalize_edit(mutant.get('Original')),
+                     normalize_edit(mutant.get('Replacement'))])
+    return hashlib.sha1(edit.encode('utf-8')).hexdigest()[:12]
+
+
+def cluster_mutants(dataset: MutantStore) -> dict:
+    """
+    Groups the live mutants of the dataset by cluster key and records it in their Cluster_id column.
+    The first mutant of each cluster (in dataset order) is its representative.
+
+    :param dataset: the mutant dataset
+    :return: the ids of the mutants of each cluster, by cluster id
+    """
+    clusters = {}
+    for mutant_id, row in dataset.rows.items():
+        if row['Status'] != "live":
+            continue
+        key = cluster_key(row)
+        clusters.setdefault(key, []).append(mutant_id)
+        dataset.update(mutant_id, Cluster_id=key)
+    dataset.commit()
+
+    duplicates = sum(len(members) - 1 for members in clusters.values())
+    print(f"## {duplicates} live mutants are duplicates of another mutant ({len(clusters)} clusters)")
+    return clusters
+
+
+def representatives_first(mutant_ids: list, dataset: MutantStore) -> list:
+    """
+    Reorders a queue of mutants so that the first mutant of each cluster is processed before the
+    other members of any cluster, which may then be killed by its test without being prompted.
+
+    :param mutant_ids: the queue of mutants
+    :param dataset: the mutant dataset (with the Cluster_id column)
+    :return: the reordered queue
+    """
+    seen = set()
+    representatives, members = [], []
+    for mutant_id in mutant_ids:
+        key = dataset.get(mutant_id, 'Cluster_id')
+        if key is None or key not in seen:
+            representatives.append(mutant_id)
+            seen.add(key)
+        else:
+            members.append(mutant_id)
+    return representatives + members
@@ -0,0 +1,282 @@
+import glob
+import os
+import re
+import time
+
+import pandas as pd
+
+from executionLog import load_executions
+from llmUsage import usage_recorder
+
+# Weight (in mutants) of the overall kill rate in the kill rate of a feature value seen in few mutants
+PRIOR_STRENGTH = 5
+# Bounds of the estimated kill probabilities
+MIN_KILL_PROBABILITY = 0.01
+MAX_KILL_PROBABILITY = 0.99
+
+
+class ExperimentBudget:
+    """
+    Token and wall-clock budget of a run: once it is exhausted, the mutants not started yet are left pending
+    in the checkpoint (a resumed run processes them with a new budget).
+    The budget is spent from start, called right before the first mutant is dispatched (so that building the dataset,
+    setting up the SUT and cloning the worker workspaces are not counted).
+    """
+    def __init__(self, max_tokens: int = None, max_seconds: float = None):
+        """
+        :param max_tokens: the max prompt and completion tokens of the run (None for unlimited)
+        :param max_seconds: the max duration of the run (None for unlimited)
+        """
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.start_tokens = None
+        self.start_time = None
+
+    def start(self):
+        """
+        Starts spending the budget.
+        """
+        self.start_tokens = usage_recorder.total_tokens()
+        self.start_time = time.monotonic()
+
+    def limits_usage(self) -> bool:
+        """
+        Returns True if the run is limited in tokens or time (rather than in number of mutants).
+        """
+        return self.max_tokens is not None or self.max_seconds is not None
+
+    def cost_unit(self) -> str:
+        """
+        Returns the resource the scheduler should spend best: time, tokens or mutants.
+        """
+        if self.max_seconds is not None:
+            return "time"
+        if self.max_tokens is not None:
+            return "tokens"
+        return "mutants"
+
+    def exhausted(self) -> str:
+        """
+        Returns the reason why the budget is exhausted, or None if it is not (or not started).
+        """
+        if self.start_time is None:
+            return None
+        used_tokens = usage_recorder.total_tokens() - self.start_tokens
+        if self.max_tokens is not None and used_tokens >= self.max_tokens:
+            return f"{used_tokens} tokens used (budget: {self.max_tokens})"
+        elapsed = time.monotonic() - self.start_time
+        if self.max_seconds is not None and elapsed >= self.max_seconds:
+            return f"{elapsed / 60:.1f} minutes elapsed (budget: {self.max_seconds / 60:.1f})"
+        return None
+
+
+def function_visibility(contract_code, function_name) -> str:
+    """
+    Returns the visibility of a function (public, external, internal or private), or unknown if it cannot be found.
+    """
+    if not isinstance(contract_code, str) or not isinstance(function_name, str):
+        return "unknown"
+    if function_name in ["constructor", "receive", "fallback"]:
+        return "public"
+    match = re.search(r'\bfunction\s+' + re.escape(function_name) + r'\s*\([^)]*\)([^{;]*)', contract_code)
+    if match is None:
+        return "unknown"
+    visibility = re.search(r'\b(public|external|internal|private)\b', match.group(1))
+    # Functions without visibility are public in old Solidity versions
+    return visibility.group(1) if visibility else "public"
+
+
+def edit_size(mutant) -> str:
+    """
+    Returns the size class of the edit of a mutant: small, medium or large.
+    """
+    size = sum(len(value) for value in [mutant.get('Original'), mutant.get('Replacement')] if isinstance(value, str))
+    if size <= 20:
+        return "small"
+    return "medium" if size <= 80 else "large"
+
+
+def mutant_features(mutants: pd.DataFrame) -> pd.DataFrame:
+    """
+    Computes the scheduling features of mutants: operator, visibility of the mutated function,
+    size of the edit and size of the contract context (in tokens).
+    """
+    operators = mutants['Operator'] if 'Operator' in mutants.columns else pd.Series(None, index=mutants.index)
+    return pd.DataFrame({
+        'Mutant_id': mutants['Mutant_id'],
+        'Operator': operators.fillna("unknown").astype(str),
+        'Visibility': [function_visibility(row['Contract_Context'], row['Function_name']) for _, row in mutants.iterrows()],
+        'Edit_size': [edit_size(row) for _, row in mutants.iterrows()],
+        'Context_tokens': mutants['Contract_Context'].fillna("").astype(str).str.len() // 4,
+    }, index=mutants.index)
+
+
+def iter_previous_runs(workspace: str, dataset_name: str, exclude: str = None):
+    """
+    Yields the executions and the dataset copy of each previous run in a workspace (one results_* folder per run),
+    skipping the runs without executions or whose files cannot be read.
+
+    :param workspace: the workspace folder of the SUT
+    :param dataset_name: the file name of the dataset copy saved in each results folder
+    :param exclude: a results folder to be ignored (e.g.: the current run)
+    """
+    for results_path in sorted(glob.glob(os.path.join(workspace, "results_*"))):
+        if exclude is not None and os.path.abspath(results_path) == os.path.abspath(exclude):
+            continue
+        executions_path = os.path.join(results_path, "executions.jsonl")
+        dataset_path = os.path.join(results_path, dataset_name)
+        if not os.path.isfile(executions_path) or not os.path.isfile(dataset_path):
+            continue
+        try:
+            executions = load_executions(executions_path)
+            dataset = pd.read_csv(dataset_path)
+        except (OSError, ValueError):
+            continue
+        if executions.empty or 'KilledByLLM' not in dataset.columns:
+            continue
+        yield executions, dataset
+
+
+def execution_tokens(executions: pd.DataFrame) -> pd.Series:
+    """
+    Returns the prompt and completion tokens of each execution (0 for the phases that do not query the model).
+    """
+    return executions[['Prompt_tokens', 'Completion_tokens']].apply(pd.to_numeric, errors='coerce').fillna(0).sum(axis=1)
+
+
+def load_history(workspace: str, dataset_name: str, exclude: str = None) -> pd.DataFrame:
+    """
+    Loads the mutants processed by the previous runs in a workspace (see iter_previous_runs),
+    with their features, whether the model killed them, and the tokens and time spent on them.
+
+    :param workspace: the workspace folder of the SUT
+    :param dataset_name: the file name of the dataset copy saved in each results folder
+    :param exclude: a results folder to be ignored (e.g.: the current run)
+    :return: one row per processed mutant and run (empty if there is no previous run)
+    """
+    runs = []
+    for executions, dataset in iter_previous_runs(workspace, dataset_name, exclude):
+        # Mutants the model was prompted for, and what they cost
+        prompted = executions[executions['Phase'] == "Generate-Hypothesis"]['Mutant_id'].unique()
+        executions = executions[executions['Mutant_id'].isin(prompted)]
+        costs = pd.DataFrame({'Mutant_id': executions['Mutant_id'], 'Tokens': execution_tokens(executions),
+                              'Time': pd.to_numeric(executions['Time'], errors='coerce').fillna(0)}).groupby('Mutant_id').sum()
+
+        mutants = dataset[dataset['Mutant_id'].isin(prompted)]
+        run = mutant_features(mutants)
+        run['Killed'] = mutants['KilledByLLM'].astype(str).str.lower() == "true"
+        run = run.join(costs, on='Mutant_id')
+        runs.append(run)
+    if not runs:
+        return pd.DataFrame(columns=['Mutant_id', 'Operator', 'Visibility', 'Edit_size', 'Context_tokens', 'Killed', 'Tokens', 'Time'])
+    return pd.concat(runs, ignore_index=True)
+
+
+class DatasetOrderScheduler:
+    """
+    Processes the mutants in dataset order (the order of mutations.json).
+    """
+    def rank(self, mutants: pd.DataFrame, schedule_path: str = None) -> list:
+        """
+        Returns the ids of the mutants in the order they should be processed.
+
+        :param mutants: the live mutants
+        :param schedule_path: ignored (the dataset order needs no explanation)
+        """
+        return list(mutants['Mutant_id'])
+
+
+class KillRateScheduler:
+    """
+    Ranks the mutants by estimated kills per unit of cost (mutant, token or second).
+    The kill probability of a mutant is the kill rate of its operator in previous runs, corrected by the
+    kill rates of the visibility of its function and of the size of its edit (naive Bayes), each smoothed
+    towards the overall kill rate. Its cost is the mean cost of the mutants of its operator in previous runs,
+    scaled by the size of its contract context (prompts grow with it).
+    Without history, all mutants are equally likely to be killed and the cheapest go first.
+    """
+    def __init__(self, history: pd.DataFrame, cost_unit: str):
+        """
+        :param history: the mutants processed by previous runs (see load_history)
+        :param cost_unit: mutants, tokens or time
+        """
+        self.history = history
+        self.cost_unit = cost_unit
+
+    def _rates(self, feature: str, overall_rate: float) -> dict:
+        # Smoothed kill rate of each value of a feature
+        grouped = self.history.groupby(feature)['Killed'].agg(['sum', 'count'])
+        return {value: (row['sum'] + PRIOR_STRENGTH * overall_rate) / (row['count'] + PRIOR_STRENGTH)
+                for value, row in grouped.iterrows()}
+
+    def kill_probabilities(self, features: pd.DataFrame) -> pd.Series:
+        """
+        Estimates the probability that the model kills each mutant.
+        """
+        overall_rate = (self.history['Killed'].sum() + 1) / (len(self.history) + 2)
+        probabilities = pd.Series(overall_rate, index=features.index)
+        if self.history.empty:
+            return probabilities
+        operator_rates = self._rates('Operator', overall_rate)
+        probabilities = features['Operator'].map(operator_rates).fillna(overall_rate)
+        for feature in ['Visibility', 'Edit_size']:
+            rates = self._rates(feature, overall_rate)
+            probabilities *= features[feature].map(rates).fillna(overall_rate) / overall_rate
+        return probabilities.clip(MIN_KILL_PROBABILITY, MAX_KILL_PROBABILITY)
+
+    def expected_costs(self, features: pd.DataFrame) -> pd.Series:
+        """
+        Estimates the tokens or seconds spent on each mutant (1 per mutant if the budget is in mutants).
+        """
+        if self.cost_unit == "mutants":
+            return pd.Series(1.0, index=features.index)
+        context_scale = features['Context_tokens'].clip(lower=1)
+        column = 'Tokens' if self.cost_unit == "tokens" else 'Time'
+        history = self.history[self.history[column] > 0]
+        if history.empty:
+            # Prompts (and their latency) grow with the contract context
+            return context_scale.astype(float)
+        overall_cost = history[column].mean()
+        operator_costs = history.groupby('Operator')[column].mean()
+        costs = features['Operator'].map(operator_costs).fillna(overall_cost)
+        return costs * context_scale / max(history['Context_tokens'].mean(), 1)
+
+    def rank(self, mutants: pd.DataFrame, schedule_path: str = None) -> list:
+        """
+        Returns the ids of the mutants by decreasing estimated kills per unit of cost.
+
+        :param mutants: the live mutants
+        :param schedule_path: if given, where to save the ranking and its features
+        """
+        features = mutant_features(mutants)
+        features['Kill_probability'] = self.kill_probabilities(features)
+        features['Expected_cost'] = self.expected_costs(features)
+        features['Score'] = features['Kill_probability'] / features['Expected_cost']
+        # Stable sort: ties keep dataset order
+        schedule = features.sort_values('Score', ascending=False, kind='stable')
+        print(f"## Scheduler: ranked {len(schedule)} live mutants by kills per {self.cost_unit.rstrip('s') if self.cost_unit != 'time' else 'second'} "
+              f"using {len(self.history)} mutants from previous runs (mean kill probability {schedule['Kill_probability'].mean():.2f})")
+        if schedule_path is not None:
+            schedule.to_csv(schedule_path, index=False)
+        return list(schedule['Mutant_id'])
+
+
+# Available schedulers (see create_scheduler)
+SCHEDULERS = ["order", "kill_rate"]
+
+
+def create_scheduler(name: str, workspace: str, dataset_name: str, results_path: str, cost_unit: str) -> DatasetOrderScheduler | KillRateScheduler:
+    """
+    Creates a scheduler.
+
+    :param name: order (dataset order) or kill_rate (see KillRateScheduler)
+    :param workspace: the workspace folder of the SUT, holding the results of the previous runs
+    :param dataset_name: the file name of the dataset copy saved in each results folder
+    :param results_path: the results folder of the current run
+    :param cost_unit: mutants, tokens or time
+    """
+    if name == "order":
+        return DatasetOrderScheduler()
+    if name == "kill_rate":
+        return KillRateScheduler(load_history(workspace, dataset_name, exclude=results_path), cost_unit)
+    raise ValueError(f"Unsupported scheduler: {name}")
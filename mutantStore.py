@@ -0,0 +1,154 @@
+import json
+import os
+import tempfile
+import threading
+
+import pandas as pd
+
+
+def to_python(value):
+    """
+    Converts numpy scalars (as read by pandas) to plain Python values.
+    """
+    return value.item() if hasattr(value, "item") else value
+
+
+def journal_path_for(dataset_path: str) -> str:
+    """
+    Returns the path of the write-ahead journal of a dataset.
+    """
+    return dataset_path + ".journal"
+
+
+class MutantStore:
+    """
+    Mutant dataset keyed by Mutant_id.
+    Rows are kept in memory in dataset order, so reading or updating a mutant is O(1).
+    Updates are appended to a write-ahead journal (<dataset>.journal) when committed, and folded
+    into the csv dataset (same layout as mutationsDataset.csv) on save.
+    Loading a dataset replays its journal, so no committed update is lost after a crash.
+    """
+    def __init__(self, rows: list, columns: list, journal_path: str = None):
+        """
+        :param rows: the mutants (dicts with a Mutant_id key)
+        :param columns: the dataset columns, in order
+        :param journal_path: the path to the journal (None for an in-memory store)
+        """
+        self.columns = list(columns)
+        self.rows = {row['Mutant_id']: row for row in rows}
+        self.journal_path = journal_path
+        self._pending = []
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, dataset_path: str) -> "MutantStore":
+        """
+        Loads a csv dataset and replays the committed updates of its journal.
+
+        :param dataset_path: the path to the csv dataset
+        """
+        dataset = pd.read_csv(dataset_path)
+        rows = [{column: to_python(value) for column, value in row.items()} for row in dataset.to_dict('records')]
+        store = cls(rows, dataset.columns, journal_path_for(dataset_path))
+
+        if os.path.isfile(store.journal_path):
+            with open(store.journal_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    if not line.endswith("\n"):
+                        # Last update truncated by a crash
+                        break
+                    update = json.loads(line)
+                    store._apply(update["Mutant_id"], update["values"])
+        return store
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, mutant_id):
+        return mutant_id in self.rows
+
+    def get(self, mutant_id: str, column: str, default=None):
+        """
+        Returns the value of a column for a mutant.
+        """
+        value = self.rows[mutant_id].get(column, default)
+        return default if isinstance(value, float) and pd.isna(value) else value
+
+    def row(self, mutant_id: str) -> dict:
+        """
+        Returns a copy of the row of a mutant.
+        """
+        with self._lock:
+            return dict(self.rows[mutant_id])
+
+    def _apply(self, mutant_id: str, values: dict):
+        row = self.rows[mutant_id]
+        for column, value in values.items():
+            if column not in self.columns:
+                self.columns.append(column)
+            row[column] = value
+
+    def update(self, mutant_id: str, **values):
+        """
+        Updates some columns of a mutant. The update is journaled on the next commit.
+
+        :param mutant_id: the mutant to be updated
+        :param values: the new values, by column
+        """
+        values = {column: to_python(value) for column, value in values.items()}
+        with self._lock:
+            self._apply(mutant_id, values)
+            if self.journal_path is not None:
+                self._pending.append({"Mutant_id": mutant_id, "values": values})
+
+    def commit(self):
+        """
+        Appends the pending updates to the journal and syncs it to disk.
+        """
+        with self._lock:
+            if self.journal_path is None or not self._pending:
+                return
+            with open(self.journal_path, 'a', encoding='utf-8') as file:
+                file.write("".join(json.dumps(update) + "\n" for update in self._pending))
+                file.flush()
+                os.fsync(file.fileno())
+            self._pending = []
+
+    def subset(self, mutant_ids: list) -> "MutantStore":
+        """
+        Returns an in-memory copy of some mutants (e.g.: for a worker processing them).
+        """
+        with self._lock:
+            return MutantStore([self.row(mutant_id) for mutant_id in mutant_ids], self.columns)
+
+    def merge(self, other: "MutantStore"):
+        """
+        Copies the rows of another store (e.g.: a processed subset) into this store.
+        """
+        for mutant_id, row in other.rows.items():
+            self.update(mutant_id, **row)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the mutants as a DataFrame, with the dataset columns.
+        """
+        with self._lock:
+            return pd.DataFrame(list(self.rows.values()), columns=self.columns)
+
+    def save(self, dataset_path: str):
+        """
+        Writes the dataset atomically to a csv file (mutationsDataset.csv layout) and, if it is
+        the journaled dataset, truncates the journal since its updates are now in the csv.
+
+        :param dataset_path: the path to the csv dataset
+        """
+        with self._lock:
+            self.commit()
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dataset_path)), suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as file:
+                self.to_dataframe().to_csv(file, index=False)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, dataset_path)
+            if self.journal_path == journal_path_for(dataset_path) and os.path.isfile(self.journal_path):
+                os.remove(self.journal_path)
@@ -1,13 +1,138 @@
 import os
-import requests
+import json
+import time
+import threading
 from utils import *
 from dotenv import load_dotenv
 import pandas as pd
+from llmCache import ResponseCache
+from llmClient import get_llm_client, iter_sse_events
+from mutantStore import MutantStore
+from llmUsage import usage_recorder
+from llmHedging import HedgePolicy
+import runTrace
+from resultsArchive import store_test
 
 template_gen_hypothesis=os.path.join(os.getcwd(),"prompt_templates","gen_hypothesis.txt")
 template_gen_new_hypothesis=os.path.join(os.getcwd(),"prompt_templates","gen_new_hypothesis.txt")
 template_gen_experiment=os.path.join(os.getcwd(),"prompt_templates","gen_experiment.txt")
 template_fix_test_for_mutant=os.path.join(os.getcwd(),"prompt_templates","fix_test_template.txt")
+# Templates of the prefix layout: the contract and test setup are in a leading context block (context_prefix.txt)
+template_context_prefix=os.path.join(os.getcwd(),"prompt_templates","context_prefix.txt")
+template_gen_hypothesis_prefix=os.path.join(os.getcwd(),"prompt_templates","gen_hypothesis_prefix.txt")
+template_gen_experiment_prefix=os.path.join(os.getcwd(),"prompt_templates","gen_experiment_prefix.txt")
+template_fix_test_prefix=os.path.join(os.getcwd(),"prompt_templates","fix_test_prefix.txt")
+
+# Response cache: "off", "read" (replay cached responses, query the model on a miss) or "write" (always query the model and refresh the cache)
+llm_cache_mode = "off"
+llm_cache = None
+
+def configure_llm_cache(mode: str):
+    """
+    Configure the on-disk cache of model responses.
+    The cache folder, max size and max age are read from the LLM_CACHE_DIR, LLM_CACHE_MAX_MB and LLM_CACHE_MAX_AGE_DAYS env variables.
+
+    :mode (str): off, read or write
+    """
+    global llm_cache_mode, llm_cache
+    if mode not in ["off", "read", "write"]:
+        raise ValueError(f"Unsupported cache mode: {mode}")
+    llm_cache_mode = mode
+    if mode != "off":
+        load_dotenv()
+        cache_dir = os.getenv("LLM_CACHE_DIR", os.path.join(os.getcwd(), "llm_cache"))
+        max_size = int(float(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        max_age = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600
+        llm_cache = ResponseCache(cache_dir, max_size, max_age)
+
+# Contract context in the prompts: "full" (Contract_Context) or "sliced" (Sliced_Context)
+context_mode = "full"
+
+def configure_context(mode: str):
+    """
+    Configure the contract context embedded in the prompts.
+
+    :mode (str): full (the whole contract) or sliced (the mutated function and its dependencies)
+    """
+    global context_mode
+    if mode not in ["full", "sliced"]:
+        raise ValueError(f"Unsupported context mode: {mode}")
+    context_mode = mode
+
+def contract_context(mutant: dict) -> str:
+    """
+    Returns the contract context of a mutant for the selected context mode.
+    Datasets created before context slicing have no Sliced_Context: the full context is used.
+    """
+    sliced_context = mutant.get('Sliced_Context')
+    if context_mode == "sliced" and isinstance(sliced_context, str) and sliced_context:
+        return sliced_context
+    return mutant['Contract_Context']
+
+# Prompt layout: "default" or "prefix" (the invariant context of the contract leads every request, see context_prefix)
+prompt_layout = "default"
+
+def configure_prompt_layout(layout: str):
+    """
+    Configure the layout of the prompts.
+
+    :layout (str): default, or prefix to put the contract code and test setup in a leading system message,
+                   identical for the mutants of a contract, so that provider-side prefix caching can reuse it
+    """
+    global prompt_layout
+    if layout not in ["default", "prefix"]:
+        raise ValueError(f"Unsupported prompt layout: {layout}")
+    prompt_layout = layout
+
+def context_prefix(mutant: dict) -> list:
+    """
+    Returns the messages sent before the history of a mutant: with the prefix layout, a system message holding
+    the contract code and test setup (the same for every request about the mutants of the contract and test file).
+    The prefix is not part of the history, so trimming and checkpointing the history are unaffected.
+    """
+    if prompt_layout != "prefix":
+        return []
+    context = promptGenerator("context_prefix", template_context_prefix,
+                              [mutant['Contract_id'],
+                               minify_code(contract_context(mutant)),
+                               mutant['Test_Context']
+                               ])
+    return [{"role": "system", "content": context}]
+
+# Stream the completions that end with a code block, and stop them once the block is closed
+stream_completions = False
+
+def configure_streaming(enabled: bool):
+    """
+    Configure the streaming of the completions requesting a code block (generated and fixed tests):
+    the code fence is parsed while the response is received, and the request is cancelled at the closing marker.
+
+    :enabled (bool): True to stream the completions
+    """
+    global stream_completions
+    stream_completions = enabled
+
+# Hedging of the requests with a secondary model (see configure_hedging), None if disabled
+hedge_policy = None
+
+def configure_hedging(secondary_model: str):
+    """
+    Configure the hedging of the requests: if the model has not answered within a percentile of its latencies,
+    the request is also sent to the secondary model, and the first usable answer wins.
+    The percentile, the number of latencies needed before using it and the deadline until then are read from the
+    HEDGE_PERCENTILE (default 95), HEDGE_MIN_SAMPLES (default 10) and HEDGE_DELAY (default 60s) env variables.
+
+    :secondary_model (str): the secondary model, or None to disable hedging
+    """
+    global hedge_policy
+    if secondary_model is None:
+        hedge_policy = None
+        return
+    load_dotenv()
+    hedge_policy = HedgePolicy(secondary_model,
+                               float(os.getenv("HEDGE_PERCENTILE", "95")),
+                               int(os.getenv("HEDGE_MIN_SAMPLES", "10")),
+                               float(os.getenv("HEDGE_DELAY", "60")))
 
 def promptGenerator(prompt_id, prompt_file_path, elements):
     """
@@ -24,12 +149,19 @@ def promptGenerator(prompt_id, prompt_file_path, elements):
         - "gen_new_hypothesis": Generates a prompt for requesting a new hypothesis for a mutant's survival.      
         - "gen_experiment": Generates a prompt for requesting a test for a mutant.
         - "fix_test": Generates a prompt for requesting a test fix based on error logs.
+        - "context_prefix": Generates the leading context block of the prefix layout (contract code and test setup).
+        - "gen_hypothesis_prefix", "gen_experiment_prefix", "fix_test_prefix": the prompts of the prefix layout,
+          without the context already in the leading block.
     """
     prompt_key_map = {
             "gen_hypothesis": ["contract_id", "contract_code", "mutant_id", "mutant_details", "mutant_diff"],
             "gen_new_hypothesis": ["contract_id", "mutant_id", "last_hypothesis"],
             "gen_experiment": ["contract_id", "mutant_id", "initial_test_setup"],
             "fix_test": ["contract_code", "test_code", "error_log"],
+            "context_prefix": ["contract_id", "contract_code", "initial_test_setup"],
+            "gen_hypothesis_prefix": ["contract_id", "mutant_details", "mutant_diff"],
+            "gen_experiment_prefix": ["contract_id", "mutant_id"],
+            "fix_test_prefix": ["test_code", "error_log"],
     }
         
     # Check if the prompt_id is valid
@@ -67,10 +199,16 @@ def gen_hypothesis(model:str, mutant:dict, n_attempt: int, interactions_dir:str,
     interaction_file_name = f"gen_{hypothesis_id}"                 
         
     #First time generating hypothesis for the mutant
-    if n_attempt == 1:
+    if n_attempt == 1 and prompt_layout == "prefix":
+        prompt = promptGenerator("gen_hypothesis_prefix", template_gen_hypothesis_prefix,
+                                [mutant['Contract_id'],
+                                mutant["Details"],
+                                mutant["Diff"]
+                                ])
+    elif n_attempt == 1:
         prompt = promptGenerator("gen_hypothesis", template_gen_hypothesis,
                                 [mutant['Contract_id'],
-                                minify_code(mutant['Contract_Context']),
+                                minify_code(contract_context(mutant)),
                                 mutant["Mutant_id"],
                                 mutant["Details"],
                                 mutant["Diff"]
@@ -81,7 +219,7 @@ def gen_hypothesis(model:str, mutant:dict, n_attempt: int, interactions_dir:str,
                                  mutant["Mutant_id"],
                                  last_hypothesis
                                 ])             
-    response, history, error = send_chat_completion(model, "user", prompt, 500, messages)
+    response, history, error = send_chat_completion(model, "user", prompt, 500, messages, context_prefix(mutant))
     minified_response = minify_code(response) 
     
     #Add generated hypothesis to the history as an assistant message  
@@ -115,12 +253,18 @@ def gen_experiment(model:str, mutant:dict, n_attempt:int, project_test_dir:str,
     test_file_id = f"test_{mutant['Mutant_id']}_{n_attempt}.ts"     
     interaction_file_name = f"gen_{test_file_id}".split(".ts")[0]
         
-    prompt = promptGenerator("gen_experiment", template_gen_experiment,
-                             [mutant["Contract_id"], 
-                              mutant["Mutant_id"],
-                              mutant["Test_Context"]
-                              ])    
-    response, history, error = send_chat_completion(model, "user", prompt, 3000, messages)        
+    if prompt_layout == "prefix":
+        prompt = promptGenerator("gen_experiment_prefix", template_gen_experiment_prefix,
+                                 [mutant["Contract_id"],
+                                  mutant["Mutant_id"]
+                                  ])
+    else:
+        prompt = promptGenerator("gen_experiment", template_gen_experiment,
+                                 [mutant["Contract_id"], 
+                                  mutant["Mutant_id"],
+                                  mutant["Test_Context"]
+                                  ])    
+    response, history, error = send_chat_completion(model, "user", prompt, 3000, messages, context_prefix(mutant), "typescript")        
 
     if (response is None):
         test_file_sut_path = None
@@ -128,7 +272,6 @@ def gen_experiment(model:str, mutant:dict, n_attempt:int, project_test_dir:str,
         saveInteraction(interactions_dir, interaction_file_name, prompt, error)
     else: 
         test_file_sut_path=os.path.join(project_test_dir, test_file_id)   
-        test_file_generated_path=os.path.join(generated_tests_dir, test_file_id)                            
         
         test_file_code = extractTestCode("typescript", response)
         if test_file_code is None:
@@ -146,14 +289,14 @@ def gen_experiment(model:str, mutant:dict, n_attempt:int, project_test_dir:str,
        
         #Save fixed test to SUT and generated_test_dir
         save_test_to_file(test_file_sut_path, test_file_code)
-        save_test_to_file(test_file_generated_path, test_file_code)
+        store_test(test_file_sut_path, generated_tests_dir)
         
         saveInteraction(interactions_dir, interaction_file_name, prompt, response)   
            
     return test_file_sut_path, test_file_code, history                                        
 
 
-def fixTest(model:str, mutant:dict, dataset:pd.DataFrame, n_attempt:int, test_file_path:str, project_test_dir:str, generated_tests_dir:str, interactions_dir:str) -> tuple[str,str]:    
+def fixTest(model:str, mutant:dict, dataset:MutantStore, n_attempt:int, test_file_path:str, project_test_dir:str, generated_tests_dir:str, interactions_dir:str) -> tuple[str,str]:    
     """
     Fix a test case that is not correct -  (fails pretest)
 
@@ -177,16 +320,21 @@ def fixTest(model:str, mutant:dict, dataset:pd.DataFrame, n_attempt:int, test_fi
     print(f"\n## [Prompt] - mutant {mutant['Mutant_id']} :  fixing test - attempt {n_attempt}") 
     interaction_file_name = "fix_"+ fixed_test_file_name
     
-    test_errors = dataset.loc[dataset['Mutant_id'] == mutant['Mutant_id'], 'Test_errors'].iloc[0]
+    test_errors = dataset.get(mutant['Mutant_id'], 'Test_errors')
     
-    #Reset the history
-    messages = init_history()
-        
     #Error log is retrieved from the dataset        
-    prompt = promptGenerator("fix_test", template_fix_test_for_mutant, [mutant["Contract_Context"],
-                                                                        mutant["Generated_test"],
-                                                                        test_errors])                      
-    response, history, error = send_chat_completion(model, "user", prompt, 3000, messages)        
+    if prompt_layout == "prefix":
+        #Reset the history: the system message is in the context prefix
+        messages = []
+        prompt = promptGenerator("fix_test_prefix", template_fix_test_prefix, [mutant["Generated_test"],
+                                                                               test_errors])
+    else:
+        #Reset the history
+        messages = init_history()
+        prompt = promptGenerator("fix_test", template_fix_test_for_mutant, [contract_context(mutant),
+                                                                            mutant["Generated_test"],
+                                                                            test_errors])                      
+    response, history, error = send_chat_completion(model, "user", prompt, 3000, messages, context_prefix(mutant), "typescript")        
           
     if (response is None):
         test_file_sut_path=None
@@ -194,7 +342,6 @@ def fixTest(model:str, mutant:dict, dataset:pd.DataFrame, n_attempt:int, test_fi
         saveInteraction(interactions_dir, interaction_file_name, prompt, error)
     else:                   
         fixed_test_file_name = f"{fixed_test_file_name}.ts"          
-        test_file_generated_path=os.path.join(generated_tests_dir, fixed_test_file_name)
         test_file_sut_path=os.path.join(project_test_dir, fixed_test_file_name)
         
         test_file_code = extractTestCode("typescript",response)
@@ -203,14 +350,70 @@ def fixTest(model:str, mutant:dict, dataset:pd.DataFrame, n_attempt:int, test_fi
         
         #Save fixed test to SUT and generated_test_dir
         save_test_to_file(test_file_sut_path, test_file_code)
-        save_test_to_file(test_file_generated_path, test_file_code)    
+        store_test(test_file_sut_path, generated_tests_dir)    
             
         saveInteraction(interactions_dir, interaction_file_name, prompt, response)   
     
     return test_file_sut_path, test_file_code  
 
 
-def send_chat_completion(model:str, role:str, prompt:str, max_tokens:int, history: list)->tuple[str, list, str]:
+def read_streamed_completion(response, code_block: str, data: dict, stats: dict, cancel: threading.Event = None) -> tuple[str, dict, bool]:
+    """
+    Reads a streamed completion, stopping as soon as the requested code block is closed.
+
+    :response: the streamed response (closed on return)
+    :code_block: the language of the expected code block (e.g.: typescript)
+    :data: the request
+    :stats: the HTTP stats of the request (the time spent reading the stream is added to http_latency)
+    :cancel: if set, the request is cancelled at the next event
+
+    :returns:
+        - the text received (ending with the closing marker of the code block if it was closed)
+        - the usage of the request (estimated if the request was cancelled before the server sent it)
+        - True if the request was cancelled at the closing marker
+    """
+    start_marker = "```" + code_block
+    end_marker = "```"
+    text = ""
+    usage = None
+    block_start = -1
+    stopped = False
+    read_start = time.monotonic()
+    try:
+        for event in iter_sse_events(response):
+            if cancel is not None and cancel.is_set():
+                break
+            if event.get('usage'):
+                usage = event['usage']
+            for choice in event.get('choices') or []:
+                content = (choice.get('delta') or {}).get('content')
+                if not content:
+                    continue
+                # Only the new content (and a marker split across chunks) needs to be searched
+                search_from = max(0, len(text) - len(start_marker))
+                text += content
+                if block_start == -1:
+                    block_start = text.find(start_marker, search_from)
+                    if block_start == -1:
+                        continue
+                block_end = text.find(end_marker, max(search_from, block_start + len(start_marker)))
+                if block_end != -1:
+                    text = text[:block_end + len(end_marker)]
+                    stopped = True
+                    break
+            if stopped:
+                break
+    finally:
+        response.close()
+        stats['http_latency'] += time.monotonic() - read_start
+
+    if usage is None:
+        # Cancelled requests get no usage event: estimate it (~4 characters per token)
+        usage = {'prompt_tokens': len(json.dumps(data["messages"])) // 4, 'completion_tokens': len(text) // 4}
+    get_llm_client().settle_tokens(stats.get('estimated_tokens', 0), usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0))
+    return text, usage, stopped
+
+def send_chat_completion(model:str, role:str, prompt:str, max_tokens:int, history: list, prefix: list = None, code_block: str = None, usable = None)->tuple[str, list, str]:
     """_summary_
     Send a chat completion to a specific model
 
@@ -220,6 +423,11 @@ def send_chat_completion(model:str, role:str, prompt:str, max_tokens:int, histor
         prompt (str): the message prompt
         max_tokens(int): the max amount of tokens
         history (list): the history of messages
+        prefix (list): messages sent before the history, but not added to it (see context_prefix)
+        code_block (str): the language of the code block ending the expected response (e.g.: typescript):
+                          with streaming enabled, the request is cancelled once the block is closed
+        usable (function): with hedging enabled, tells whether a response can be used (by default, responses
+                           with an extractable code block if code_block is given, any response otherwise)
 
     Returns:
         str: the response to the prompt (or None if error)
@@ -230,16 +438,60 @@ def send_chat_completion(model:str, role:str, prompt:str, max_tokens:int, histor
     new_message = {"role": role, "content": prompt}
     history.append(new_message) 
     
+    messages = (prefix or []) + history
+    _, _, data = build_request(model, messages, max_tokens)
+
+    trace = runTrace.run_trace
+    if trace is not None and trace.replay_path is not None:
+        # No network when replaying a trace
+        generated_text, error = trace.replay_completion(data)
+        return generated_text, history, error
+
+    cache_key = None
+    if llm_cache_mode != "off":
+        cache_key = ResponseCache.key(data["model"], data["messages"], data["max_tokens"], data["temperature"], data["top_p"])
+        if llm_cache_mode == "read":
+            cached_response = llm_cache.get(cache_key)
+            if cached_response is not None:
+                print("## <RESPONSE> OK (cached)")
+                if trace is not None:
+                    trace.record_completion(data, code_block, cached_response, "")
+                return cached_response, history, ""
+
+    if hedge_policy is not None and hedge_policy.secondary_model != model:
+        # Requests run in the threads of the hedge policy: their usage is recorded for the current thread
+        calls = usage_recorder.current_calls()
+        request = lambda request_model, cancel: request_completion(request_model, messages, max_tokens, code_block, cancel, calls)
+        if usable is None:
+            usable = (lambda response: extractTestCode(code_block, response) is not None) if code_block is not None else (lambda response: True)
+        generated_text, error = hedge_policy.complete(model, "code" if code_block is not None else "text", request, usable)
+    else:
+        generated_text, error = request_completion(model, messages, max_tokens, code_block)
+
+    if generated_text is not None and cache_key is not None:
+        llm_cache.put(cache_key, generated_text)
+    if trace is not None:
+        trace.record_completion(data, code_block, generated_text, error)
+    return generated_text, history, error
+
+
+def build_request(model: str, messages: list, max_tokens: int) -> tuple[str, dict, dict]:
+    """
+    Builds the request of a chat completion for a specific model.
+
+    :returns: the url, headers and JSON body of the request
+    """
     load_dotenv()
 
     GPT_API_KEY = os.getenv("GPT_API_KEY")      
    
     if(model.startswith("gpt")):      
-        url = "https://api.openai.com/v1/chat/completions"
+        # GPT_API_URL points to another OpenAI-compatible endpoint (e.g.: the mock server of benchmark.py)
+        url = os.getenv("GPT_API_URL", "https://api.openai.com/v1/chat/completions")
         headers = {"Content-Type": "application/json", "Authorization" : f"Bearer {GPT_API_KEY}"}
         data = {
             "model": model,
-            "messages": history,
+            "messages": messages,
             "max_tokens": max_tokens,
             "temperature": 0.1,
             "top_p": 0.9
@@ -249,30 +501,73 @@ def send_chat_completion(model:str, role:str, prompt:str, max_tokens:int, histor
         headers = {"Content-Type": "application/json", "Authorization" : "Bearer demo"}           
         data = {
             "model": "llama3.1:8b",
-            "messages": history,
+            "messages": messages,
             "max_tokens": max_tokens,
             "temperature": 0.1,
             "top_p": 0.9
         }
+    return url, headers, data
+
+
+def request_completion(model: str, messages: list, max_tokens: int, code_block: str = None, cancel: threading.Event = None, calls: list = None) -> tuple[str, str]:
+    """
+    Requests a chat completion to a specific model, recording the usage of the call (see llmUsage).
+
+    :model: the model name
+    :messages: the messages of the request
+    :max_tokens: the max amount of tokens
+    :code_block: the language of the code block ending the expected response (see send_chat_completion)
+    :cancel: if set while a streamed response is read, the request is cancelled (e.g.: it lost a hedged race)
+    :calls: the calls the usage is recorded in (see UsageRecorder.current_calls), by default the current thread's
+
+    :returns:
+        - the response (None if error)
+        - the error message (or an empty string if none)
+    """
+    url, headers, data = build_request(model, messages, max_tokens)
+    stream = stream_completions and code_block is not None
+    if stream:
+        data["stream"] = True
+        if model.startswith("gpt"):
+            data["stream_options"] = {"include_usage": True}
+
+    stats = {}
     try:             
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-                print("## <RESPONSE> OK (200)")
+        response = get_llm_client().post(url, headers, data, stats, stream=stream)
+        if response.status_code == 200 and stream:
+                generated_text, usage, stopped = read_streamed_completion(response, code_block, data, stats, cancel)
+                usage_recorder.record(data["model"], usage, stats, calls)
+                if cancel is not None and cancel.is_set():
+                    return None, "## <RESPONSE> CANCELLED"
+                cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+                print(f"## <RESPONSE> OK (200, streamed{', stopped after the code block' if stopped else ''}) - {cached_tokens}/{usage.get('prompt_tokens', '?')} prompt tokens cached")
+                if generated_text:
+                    return generated_text, ""
+                else:
+                    error_msg = "## <RESPONSE> ERROR: (No content found in the streamed response.)"
+                    print(error_msg)
+                    return None, error_msg
+        elif response.status_code == 200:
                 response_json = response.json()
+                # Prompt tokens served from the provider's prefix cache
+                usage = response_json.get('usage') or {}
+                usage_recorder.record(data["model"], usage, stats, calls)
+                cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+                print(f"## <RESPONSE> OK (200) - {cached_tokens}/{usage.get('prompt_tokens', '?')} prompt tokens cached")
                 # Extract the generated text from the response
                 if 'choices' in response_json and len(response_json['choices']) > 0:
                     generated_text = response_json['choices'][0]['message']['content'] 
                     #print("Response", response_json)
-                    return generated_text, history, ""
+                    return generated_text, ""
                 else:
                     error_msg = "## <RESPONSE> ERROR: (No choices found in the response.)"
                     print(error_msg)                     
-                    return None, history, error_msg
+                    return None, error_msg
         else:
+            usage_recorder.record(data["model"], {}, stats, calls)
             print(f"## <RESPONSE> ERROR: {response.text}")                                 
-            return None, history, response.text
+            return None, response.text
     except Exception as e:
+        usage_recorder.record(data["model"], {}, stats, calls)
         print(f"## <RESPONSE> ERROR: An error occurred: {e}")
-        return None, history, e  
-
-  
\ No newline at end of file
+        return None, e  
@@ -0,0 +1,189 @@
+import argparse
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+
+# Folder of each category of test files in the results folder (see export)
+TEST_CATEGORIES = {
+    "generated_tests": "generated_tests",
+    "error_tests": os.path.join("generated_tests", "error_tests"),
+    "correct_tests": os.path.join("generated_tests", "correct_tests"),
+    "killer_tests": os.path.join("generated_tests", "killer_tests"),
+}
+
+
+class ResultsArchive:
+    """
+    Single-file archive of the results of a run (SQLite, append-only), replacing the interaction_<id>.txt
+    files and the copies of the test files in the generated_tests folders.
+    Interactions are stored compressed. Test files are stored once per content (content-addressed, compressed)
+    and tagged with their name and categories (generated_tests, error_tests, correct_tests, killer_tests).
+    The folders of the file layout can be recreated with export.
+    """
+    def __init__(self, path: str):
+        """
+        :param path: the path to the archive (created if missing, appended to otherwise)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS interactions (id INTEGER PRIMARY KEY, name TEXT, created REAL, prompt BLOB, response BLOB)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, content BLOB)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS tests (name TEXT, category TEXT, hash TEXT, created REAL, PRIMARY KEY (name, category))")
+        self._connection.commit()
+
+    @staticmethod
+    def _compress(text: str) -> bytes:
+        return zlib.compress((text or "").encode('utf-8'))
+
+    @staticmethod
+    def _decompress(data: bytes) -> str:
+        return zlib.decompress(data).decode('utf-8')
+
+    def put_interaction(self, name: str, prompt: str, response: str):
+        """
+        Appends an interaction (a prompt and the response or error of the model).
+        """
+        with self._lock:
+            self._connection.execute("INSERT INTO interactions (name, created, prompt, response) VALUES (?, ?, ?, ?)",
+                                     (name, time.time(), self._compress(prompt), self._compress(response)))
+            self._connection.commit()
+
+    def put_test(self, name: str, category: str, content: str):
+        """
+        Stores a test file under a category (its content is stored once, whatever its names and categories).
+        """
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        with self._lock:
+            self._connection.execute("INSERT OR IGNORE INTO blobs (hash, content) VALUES (?, ?)", (content_hash, self._compress(content)))
+            self._connection.execute("INSERT OR REPLACE INTO tests (name, category, hash, created) VALUES (?, ?, ?, ?)",
+                                     (name, category, content_hash, time.time()))
+            self._connection.commit()
+
+    def get_test(self, name: str, category: str = None) -> str:
+        """
+        Returns the content of a test file (in any category if none is given), or None if it is not archived.
+        """
+        query = "SELECT content FROM tests JOIN blobs ON tests.hash = blobs.hash WHERE name = ?"
+        parameters = [name]
+        if category is not None:
+            query += " AND category = ?"
+            parameters.append(category)
+        with self._lock:
+            row = self._connection.execute(query + " LIMIT 1", parameters).fetchone()
+        return self._decompress(row[0]) if row is not None else None
+
+    def export(self, output_dir: str) -> tuple[int, int]:
+        """
+        Recreates the file layout of a results folder: interactions/interaction_<id>.txt and the test files of
+        each category in generated_tests and its subfolders.
+
+        :param output_dir: the results folder in which the files are written
+        :return: the number of interactions and test files written
+        """
+        interactions_dir = os.path.join(output_dir, "interactions")
+        os.makedirs(interactions_dir, exist_ok=True)
+        for folder in TEST_CATEGORIES.values():
+            os.makedirs(os.path.join(output_dir, folder), exist_ok=True)
+        with self._lock:
+            interactions = self._connection.execute("SELECT name, prompt, response FROM interactions ORDER BY id").fetchall()
+            tests = self._connection.execute("SELECT name, category, content FROM tests JOIN blobs ON tests.hash = blobs.hash").fetchall()
+        # A repeated interaction (e.g.: in a resumed run) overwrites the previous one, as files did
+        for name, prompt, response in interactions:
+            with open(os.path.join(interactions_dir, f"interaction_{name}.txt"), 'w') as file:
+                file.write(self._decompress(prompt) + "\n\n" + self._decompress(response))
+        for name, category, content in tests:
+            with open(os.path.join(output_dir, TEST_CATEGORIES.get(category, category), name), 'w') as file:
+                file.write(self._decompress(content))
+        return len(interactions), len(tests)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+# Archive of the current run, None to write the results as separate files
+results_archive = None
+# Whether runs archive their results (see open_results_archive)
+archive_results = False
+
+
+def configure_results_archive(enabled: bool):
+    """
+    Store the interactions and test files of the runs in archive.sqlite in their results folder (see ResultsArchive)
+    instead of one file per interaction and test copy.
+
+    :param enabled: True to archive the results
+    """
+    global archive_results
+    archive_results = enabled
+
+
+def open_results_archive(results_path: str):
+    """
+    Opens the archive of a run, if results are archived.
+    """
+    global results_archive
+    if archive_results:
+        results_archive = ResultsArchive(os.path.join(results_path, "archive.sqlite"))
+
+
+def close_results_archive():
+    global results_archive
+    if results_archive is not None:
+        results_archive.close()
+        results_archive = None
+
+
+def store_test(test_file_path: str, destination_dir: str):
+    """
+    Copies a test file to a folder of the results (generated_tests or one of its category subfolders),
+    or tags it with the category of the folder in the archive.
+    """
+    if results_archive is not None:
+        with open(test_file_path, 'r') as file:
+            results_archive.put_test(os.path.basename(test_file_path), os.path.basename(os.path.normpath(destination_dir)), file.read())
+        return
+    os.makedirs(destination_dir, exist_ok=True)
+    shutil.copy2(test_file_path, destination_dir)
+
+
+def load_test(test_file_name: str, results_dir: str) -> str:
+    """
+    Returns the content of a test file of the results, from the archive or from a results folder.
+    """
+    if results_archive is not None:
+        content = results_archive.get_test(test_file_name)
+        if content is not None:
+            return content
+    # Runs started with the file layout keep their test files in the folders
+    with open(os.path.join(results_dir, test_file_name), 'r') as file:
+        return file.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='export the archive of a run to the file layout of its results folder.')
+    parser.add_argument('results_path', type=str, help='the results folder holding archive.sqlite')
+    parser.add_argument('--output', type=str, default=None, help='the folder where the files are written (default: the results folder)')
+    args = parser.parse_args()
+
+    archive_path = os.path.join(args.results_path, "archive.sqlite")
+    if not os.path.isfile(archive_path):
+        print(f"No archive found in '{args.results_path}'.")
+        return
+    archive = ResultsArchive(archive_path)
+    try:
+        interactions, tests = archive.export(args.output or args.results_path)
+    finally:
+        archive.close()
+    print(f"## Exported {interactions} interactions and {tests} test files to {args.output or args.results_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from llmCache import ResponseCache
+
+
+def _test_key(kind: str, test_file_path: str, mutant_id: str = None) -> str:
+    # SuMo outcomes depend on the mutant and on the content of the test file, not on where it was copied
+    try:
+        with open(test_file_path, 'rb') as file:
+            content_hash = hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        content_hash = None
+    return json.dumps([kind, mutant_id, os.path.basename(test_file_path), content_hash])
+
+
+class RunTrace:
+    """
+    Structured trace of an experiment run: every model exchange (request parameters, messages and response)
+    and every SuMo outcome, in a .jsonl file (one event per line).
+    A recorded trace can be replayed: model responses (and, optionally, SuMo outcomes) are then read from the
+    trace instead of the network and Hardhat, so that a run can be repeated at full speed and its results
+    compared with the recorded ones. Requests missing from the trace (e.g.: prompts changed by a refactor)
+    are counted and fail like a model or SuMo error.
+    """
+    def __init__(self, record: bool = False, replay_path: str = None, replay_sumo: bool = True):
+        """
+        :param record: record the runs to trace.jsonl in their results folder (see open)
+        :param replay_path: the trace to be replayed
+        :param replay_sumo: with replay_path, also replay the SuMo outcomes (otherwise SuMo is run)
+        """
+        self.record = record
+        self.replay_path = replay_path
+        self.replay_sumo = replay_sumo and replay_path is not None
+        self.completions = {}
+        self.sumo_outcomes = {}
+        self.recorded_run = None
+        self.recorded_outcomes = {}
+        self.misses = {"llm": 0, "sumo": 0}
+        self.hits = {"llm": 0, "sumo": 0}
+        self._file = None
+        self._lock = threading.Lock()
+        if replay_path is not None:
+            self._load(replay_path)
+
+    def _load(self, path: str):
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # Truncated by a crash of the recorded run
+                    continue
+                if event['kind'] == "run":
+                    self.recorded_run = event
+                elif event['kind'] == "llm":
+                    # Identical requests may have been answered differently: they are replayed in order
+                    self.completions.setdefault(event['key'], deque()).append((event['response'], event['error']))
+                elif event['kind'] == "sumo":
+                    self.sumo_outcomes[event['key']] = event['outcome']
+                elif event['kind'] == "outcome":
+                    self.recorded_outcomes[event['mutant_id']] = event['outcome']
+        print(f"## Replaying {path}: {sum(len(responses) for responses in self.completions.values())} model exchanges, "
+              f"{len(self.sumo_outcomes)} SuMo outcomes" + ("" if self.replay_sumo else " (SuMo is run)"))
+
+    def _write(self, event: dict):
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(event, default=str) + "\n")
+                self._file.flush()
+
+    def open(self, results_path: str, settings: dict):
+        """
+        Starts recording a run to trace.jsonl in its results folder (appending to it when the run is resumed),
+        and checks the settings of a replayed run against the recorded ones.
+
+        :param results_path: the results folder of the run
+        :param settings: the settings the results depend on (e.g.: model, HYP_LOOP)
+        """
+        if self.replay_path is not None and self.recorded_run is not None:
+            different = {name: (self.recorded_run.get(name), value) for name, value in settings.items() if self.recorded_run.get(name) != value}
+            for name, (recorded, value) in different.items():
+                print(f"## WARNING: {name} is {value} but was {recorded} in the recorded run - the replay will diverge")
+        if self.record:
+            with self._lock:
+                self._file = open(os.path.join(results_path, "trace.jsonl"), 'a', encoding='utf-8')
+            self._write({"kind": "run", "time": time.time(), **settings})
+
+    def close(self, outcomes: dict):
+        """
+        Ends the run: records the outcome of each mutant, or compares them with the recorded ones when replaying.
+
+        :param outcomes: the final status of each mutant processed by the run
+        """
+        for mutant_id, outcome in outcomes.items():
+            self._write({"kind": "outcome", "mutant_id": mutant_id, "outcome": outcome})
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if self.replay_path is None:
+            return
+        different = [mutant_id for mutant_id, outcome in outcomes.items()
+                     if mutant_id in self.recorded_outcomes and self.recorded_outcomes[mutant_id] != outcome]
+        print(f"## Replay: {self.hits['llm']} model exchanges and {self.hits['sumo']} SuMo outcomes replayed, "
+              f"{self.misses['llm']} and {self.misses['sumo']} missing from the trace")
+        if different:
+            print(f"## Replay: {len(different)} mutants with a different outcome than in the recorded run: {', '.join(different[:20])}")
+        elif self.recorded_outcomes:
+            print(f"## Replay: the outcomes of the {len(outcomes)} mutants match the recorded run")
+
+    @staticmethod
+    def completion_key(data: dict) -> str:
+        """
+        Returns the key of a chat completion request (see ResponseCache.key).
+        """
+        return ResponseCache.key(data["model"], data["messages"], data["max_tokens"], data["temperature"], data["top_p"])
+
+    def replay_completion(self, data: dict) -> tuple[str, str]:
+        """
+        Returns the recorded response and error of a chat completion request.
+        """
+        with self._lock:
+            responses = self.completions.get(self.completion_key(data))
+            if not responses:
+                self.misses["llm"] += 1
+                print("## <REPLAY> model exchange missing from the trace")
+                return None, "Request missing from the replayed trace"
+            self.hits["llm"] += 1
+            # The last response answers any further identical request
+            return responses.popleft() if len(responses) > 1 else responses[0]
+
+    def record_completion(self, data: dict, code_block: str, response: str, error: str):
+        """
+        Records a chat completion.
+        """
+        self._write({"kind": "llm", "key": self.completion_key(data), "model": data["model"], "max_tokens": data["max_tokens"],
+                     "temperature": data["temperature"], "top_p": data["top_p"], "code_block": code_block,
+                     "messages": data["messages"], "response": response, "error": error})
+
+    def replay_outcome(self, key: str):
+        with self._lock:
+            if key not in self.sumo_outcomes:
+                self.misses["sumo"] += 1
+                print("## <REPLAY> SuMo outcome missing from the trace")
+                return "Error: SuMo outcome missing from the replayed trace"
+            self.hits["sumo"] += 1
+            return self.sumo_outcomes[key]
+
+    def record_outcome(self, key: str, outcome):
+        self._write({"kind": "sumo", "key": key, "outcome": outcome})
+
+
+# Trace of the current run, None if runs are neither recorded nor replayed
+run_trace = None
+
+
+def configure_run_trace(record: bool, replay_path: str = None, replay_sumo: bool = True):
+    """
+    Configure the recording or replay of experiment runs (see RunTrace).
+
+    :param record: record the runs to trace.jsonl in their results folder
+    :param replay_path: the trace to be replayed, None to query the model
+    :param replay_sumo: with replay_path, also replay the SuMo outcomes instead of running SuMo
+    """
+    global run_trace
+    run_trace = RunTrace(record, replay_path, replay_sumo) if record or replay_path is not None else None
+
+
+def traced_sumo(kind: str):
+    """
+    Decorates a SuMo function (kind pretest: f(test_file_path, project_dir), kind drytest:
+    f(mutant_id, test_file_path, project_dir)) to record its outcomes or replay them from the trace.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def traced(*args):
+            if run_trace is None or (not run_trace.record and not run_trace.replay_sumo):
+                return function(*args)
+            mutant_id, test_file_path = (None, args[0]) if kind == "pretest" else (args[0], args[1])
+            key = _test_key(kind, test_file_path, mutant_id)
+            if run_trace.replay_sumo:
+                return run_trace.replay_outcome(key)
+            outcome = function(*args)
+            run_trace.record_outcome(key, outcome)
+            return outcome
+        return traced
+    return decorator
+
+
+def traced_sumo_batch(kind: str):
+    """
+    Decorates a batched SuMo function (kind pretest: f(test_file_paths, project_dir) -> {path: outcome},
+    kind drytest: f(mutant_ids, test_file_path, project_dir) -> {mutant_id: outcome}), see traced_sumo.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def traced(items, *args):
+            if run_trace is None or (not run_trace.record and not run_trace.replay_sumo):
+                return function(items, *args)
+            keys = {item: _test_key(kind, item) if kind == "pretest" else _test_key(kind, args[0], item) for item in items}
+            if run_trace.replay_sumo:
+                return {item: run_trace.replay_outcome(key) for item, key in keys.items()}
+            outcomes = function(items, *args)
+            for item, outcome in outcomes.items():
+                run_trace.record_outcome(keys[item], outcome)
+            return outcomes
+        return traced
+    return decorator
@@ -0,0 +1,260 @@
+import atexit
+import json
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from utils import get_relative_test_file_path
+
+RUNNER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sumo_runner", "runner.js")
+
+# Max time (in seconds) to wait for the runner to load Hardhat and compile the SUT
+STARTUP_TIMEOUT = 300
+
+# Journal of the contract mutated by the running drytest of a runner (see restore_mutated_contract)
+MUTATION_JOURNAL = ".alchemist_drytest.json"
+
+
+def restore_mutated_contract(project_dir: str):
+    """
+    Restores the original source of the contract mutated by a drytest the runner could not finish
+    (e.g.: the runner was killed mid-job).
+
+    :param project_dir: the SUT folder
+    """
+    journal_path = os.path.join(project_dir, MUTATION_JOURNAL)
+    if not os.path.exists(journal_path):
+        return
+    with open(journal_path, 'r', encoding='utf-8') as journal_file:
+        journal = json.load(journal_file)
+    contract_path = os.path.join(project_dir, journal["file"])
+    with open(contract_path, 'w', encoding='utf-8', newline='') as contract_file:
+        contract_file.write(journal["original"])
+    os.remove(journal_path)
+    print(f"### <SuMo daemon>: restored {contract_path} after an interrupted drytest")
+
+
+class SuMoDaemonClient:
+    """
+    Client of a persistent SuMo/Hardhat runner (sumo_runner/runner.js) serving a single SUT.
+    The runner keeps Hardhat and the compiled artifacts warm and executes pretest/drytest
+    jobs sent as newline-delimited JSON over a local unix socket. Drytests apply the mutant from the
+    SuMo mutations report in-process, and fall back to the SuMo CLI for mutants missing from it.
+    """
+    def __init__(self, project_dir: str):
+        """
+        Starts the runner for the given SUT and waits until it accepts jobs.
+
+        :param project_dir: the SUT folder
+        """
+        self.project_dir = os.path.abspath(project_dir)
+        self.socket_path = os.path.join(tempfile.mkdtemp(prefix="alchemist_sumo_"), "runner.sock")
+        self.log_path = os.path.join(os.path.dirname(self.socket_path), "runner.log")
+        self._lock = threading.Lock()
+        # Whether the first pretest was repeated to check that outcomes do not depend on previous jobs
+        self._repeat_checked = False
+
+        print(f"### <SuMo daemon>: starting runner for {self.project_dir}")
+        self._log_file = open(self.log_path, 'w')
+        self.process = subprocess.Popen(['node', RUNNER_SCRIPT, self.socket_path],
+                                        stdout=self._log_file,
+                                        stderr=subprocess.STDOUT,
+                                        cwd=self.project_dir
+                                        )
+        self._wait_until_ready()
+
+    def _wait_until_ready(self):
+        deadline = time.time() + STARTUP_TIMEOUT
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"The SuMo runner exited with code {self.process.returncode}, see {self.log_path}")
+            if os.path.exists(self.socket_path):
+                try:
+                    self.request({"type": "ping"})
+                    print("### <SuMo daemon>: runner ready")
+                    return
+                except OSError:
+                    pass
+            time.sleep(0.2)
+        self.close()
+        raise TimeoutError(f"The SuMo runner did not start within {STARTUP_TIMEOUT}s, see {self.log_path}")
+
+    def request(self, job: dict) -> dict:
+        """
+        Sends a job to the runner and waits for its response.
+
+        :param job: the job to be executed
+        :return: the decoded response of the runner
+        """
+        with self._lock:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.connect(self.socket_path)
+                connection.sendall((json.dumps(job) + "\n").encode('utf-8'))
+                buffer = b""
+                while not buffer.endswith(b"\n"):
+                    chunk = connection.recv(65536)
+                    if not chunk:
+                        break
+                    buffer += chunk
+        if not buffer:
+            raise ConnectionError("The SuMo runner closed the connection without a response")
+        return json.loads(buffer)
+
+    def _check_repeatable(self, job: dict, response: dict):
+        # Runs the first pretest job of the runner a second time: since the runner resets the Hardhat network
+        # before each job, both runs must have the same outcome (as two runs of npx sumo pretest)
+        if self._repeat_checked:
+            return
+        self._repeat_checked = True
+
+        def outcome(result: dict):
+            return result.get("ok"), [error.get("test title") if isinstance(error, dict) else error for error in result.get("errors") or []]
+
+        if "error" in response:
+            return
+        repeated = self.request(job)
+        if "error" in repeated:
+            return
+        results, repeated_results = response.get("results", [response]), repeated.get("results", [repeated])
+        if [outcome(result) for result in results] != [outcome(result) for result in repeated_results]:
+            print(f"### <SuMo daemon>: WARNING: two runs of the same pretest had different outcomes in {self.project_dir} "
+                  f"(see {self.log_path}): outcomes may depend on previous jobs, consider --sumo_runner cli")
+
+    def run_sumo_pretest(self, test_file_path: str):
+        """
+        Run a pretest on a given test file. Drop-in for testInterface.run_sumo_pretest.
+
+        :param test_file_path: the absolute path to the test file to be run
+        :return: True - If the pretest is successfull
+                 The list of test errors - if the pretest failed
+        """
+        relative_test_file_path = get_relative_test_file_path(test_file_path)
+        print(f"### <SuMo daemon>: pretest {self.project_dir}/{relative_test_file_path}")
+        job = {"type": "pretest", "test_file": relative_test_file_path}
+        response = self.request(job)
+        self._check_repeatable(job, response)
+
+        if response.get("ok"):
+            return "True"
+        failed_tests = response.get("errors") or [f"Error: {response.get('error', 'syntax error')}"]
+        print("#### Failed tests error info: ", failed_tests)
+        return failed_tests
+
+    def run_sumo_pretests(self, test_file_paths: list) -> dict:
+        """
+        Run a pretest on several test files with a single compilation and Mocha run of the runner
+        (the pretests batched by the async pipeline, see AsyncSuMoExecutor).
+
+        :param test_file_paths: the absolute paths to the test files to be run
+        :return: the outcome of each test file: True - if its pretest is successfull,
+                 the list of its test errors - if its pretest failed
+        """
+        relative_test_file_paths = [get_relative_test_file_path(test_file_path) for test_file_path in test_file_paths]
+        print(f"### <SuMo daemon>: pretest {len(test_file_paths)} test files in {self.project_dir}")
+        job = {"type": "pretests", "test_files": relative_test_file_paths}
+        response = self.request(job)
+        self._check_repeatable(job, response)
+
+        if "error" in response:
+            return {test_file_path: [f"Error: {response['error']}"] for test_file_path in test_file_paths}
+        outcomes = {}
+        for test_file_path, result in zip(test_file_paths, response["results"]):
+            outcomes[test_file_path] = "True" if result.get("ok") else (result.get("errors") or ["Error: syntax error"])
+        return outcomes
+
+    def run_sumo_drytest(self, mutant_id: str, test_file_path: str, package_manager: str = 'npx') -> str:
+        """
+        Run a drytest on a given mutant and test file. Drop-in for testInterface.run_sumo_drytest.
+
+        :param mutant_id: the hash of the mutant to be tested
+        :param test_file_path: the absolute path to the test file to be run
+        :param package_manager: the package manager used to launch SuMo
+        :return: live, killed or an error message
+        """
+        from testInterface import parse_sumo_drytest, restore_mutant_artifacts, store_mutant_artifacts
+
+        relative_test_file_path = get_relative_test_file_path(test_file_path)
+        print(f"### <SuMo daemon>: testDry {mutant_id} {relative_test_file_path}")
+        artifacts_key = restore_mutant_artifacts(mutant_id, self.project_dir)
+        response = self.request({"type": "drytest", "mutant_id": mutant_id, "test_file": relative_test_file_path, "package_manager": package_manager})
+
+        if "error" in response:
+            store_mutant_artifacts(artifacts_key, self.project_dir, "Error: " + response["error"])
+            return "Error: " + response["error"]
+        outcome = parse_sumo_drytest(response["stdout"] if response["returncode"] == 0 else response["stderr"])
+        store_mutant_artifacts(artifacts_key, self.project_dir, outcome)
+        return outcome
+
+    def run_sumo_drytests(self, mutant_ids: list, test_file_path: str, package_manager: str = 'npx') -> dict:
+        """
+        Run drytests on several mutants with the same test file, as a single job of the runner.
+        Drop-in for testInterface.run_sumo_drytests.
+
+        :param mutant_ids: the hashes of the mutants to be tested
+        :param test_file_path: the absolute path to the test file to be run
+        :param package_manager: the package manager used to launch SuMo
+        :return: live, killed or an error message, by mutant
+        """
+        from testInterface import parse_sumo_drytest
+
+        relative_test_file_path = get_relative_test_file_path(test_file_path)
+        print(f"### <SuMo daemon>: testDry {len(mutant_ids)} mutants {relative_test_file_path}")
+        response = self.request({"type": "drytests", "mutant_ids": list(mutant_ids), "test_file": relative_test_file_path, "package_manager": package_manager})
+
+        if "error" in response:
+            return {mutant_id: "Error: " + response["error"] for mutant_id in mutant_ids}
+        outcomes = {}
+        for mutant_id, result in zip(mutant_ids, response["results"]):
+            outcomes[mutant_id] = parse_sumo_drytest(result["stdout"] if result["returncode"] == 0 else result["stderr"])
+        return outcomes
+
+    def close(self):
+        """
+        Stops the runner.
+        """
+        if self.process.poll() is None:
+            try:
+                self.request({"type": "shutdown"})
+            except (OSError, ValueError):
+                pass
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        # A runner killed mid-drytest (here or by a signal) leaves its contract mutated
+        restore_mutated_contract(self.project_dir)
+        self._log_file.close()
+
+
+# One runner per SUT (each worker workspace has its own)
+_daemons = {}
+_daemons_lock = threading.Lock()
+
+
+def get_sumo_daemon(project_dir: str) -> SuMoDaemonClient:
+    """
+    Returns the runner of a SUT, starting it on first use.
+
+    :param project_dir: the SUT folder
+    """
+    key = os.path.abspath(project_dir)
+    with _daemons_lock:
+        if key not in _daemons:
+            _daemons[key] = SuMoDaemonClient(key)
+        return _daemons[key]
+
+
+def shutdown_sumo_daemons():
+    """
+    Stops all the running runners.
+    """
+    with _daemons_lock:
+        for daemon in _daemons.values():
+            daemon.close()
+        _daemons.clear()
+
+
+atexit.register(shutdown_sumo_daemons)
@@ -0,0 +1,239 @@
+/**
+ * Persistent static checker of the tests generated by Alchemist.
+ *
+ * Started once per SUT (cwd = SUT folder) by testChecker.py. It keeps a TypeScript
+ * language service on the SUT's tsconfig (including its typechain types), so each
+ * check only re-analyzes the test file. Jobs and responses are newline-delimited JSON
+ * over stdin/stdout:
+ *
+ *   {"test_file": "test/test_m1_1.ts"}  ->  {"diagnostics": ["Error: ...", ...], "warnings": ["Error: ...", ...]}
+ *
+ * Only syntax errors, unresolved imports and calls on contracts deployed by name (deployContract,
+ * getContractFactory(...).deploy, getContractAt) missing from the compiled ABI are diagnostics.
+ * The other type errors are only warnings: Hardhat runs tests through ts-node with transpileOnly,
+ * so they do not fail the pretest.
+ *
+ * Usage: node checker.js
+ */
+const fs = require("fs");
+const path = require("path");
+const readline = require("readline");
+
+const projectDir = process.cwd();
+
+// Max diagnostics reported per test file
+const MAX_DIAGNOSTICS = 10;
+
+// Type errors that also fail a transpile-only run: unresolved modules and imports
+const BLOCKING_DIAGNOSTICS = new Set([2305, 2307, 2613, 2614, 2724]);
+
+// Members of ethers contracts that are not ABI functions
+const CONTRACT_MEMBERS = new Set([
+  "connect", "attach", "getAddress", "waitForDeployment", "deploymentTransaction", "deployed",
+  "target", "address", "interface", "runner", "signer", "provider", "filters", "queryFilter",
+  "on", "once", "off", "emit", "listenerCount", "listeners", "removeAllListeners", "removeListener",
+  "getFunction", "getEvent", "estimateGas", "callStatic", "populateTransaction", "functions",
+  "staticCall", "fallback", "deployTransaction", "resolvedAddress",
+]);
+
+let ts;
+try {
+  // Resolve typescript from the SUT, not from Alchemist
+  ts = require(require.resolve("typescript", { paths: [projectDir] }));
+} catch (err) {
+  process.stdout.write(JSON.stringify({ error: "typescript is not installed in the SUT" }) + "\n");
+  process.exit(1);
+}
+
+/**
+ * Function names of each compiled contract, from the Hardhat artifacts.
+ */
+function loadAbis() {
+  const abis = new Map();
+  const visit = (dir) => {
+    if (!fs.existsSync(dir)) {
+      return;
+    }
+    for (const entry of fs.readdirSync(dir, { withFileTypes: true })) {
+      const entryPath = path.join(dir, entry.name);
+      if (entry.isDirectory()) {
+        visit(entryPath);
+      } else if (entry.name.endsWith(".json") && !entry.name.endsWith(".dbg.json")) {
+        try {
+          const artifact = JSON.parse(fs.readFileSync(entryPath, "utf-8"));
+          if (artifact.contractName && Array.isArray(artifact.abi)) {
+            const names = abis.get(artifact.contractName) || new Set();
+            artifact.abi.filter((item) => item.type === "function").forEach((item) => names.add(item.name));
+            abis.set(artifact.contractName, names);
+          }
+        } catch (err) {
+          // Not an artifact
+        }
+      }
+    }
+  };
+  visit(path.join(projectDir, "artifacts", "contracts"));
+  return abis;
+}
+
+// Language service on the SUT's tsconfig, with the test file being checked as an extra root
+const configPath = ts.findConfigFile(projectDir, ts.sys.fileExists, "tsconfig.json");
+const parsedConfig = configPath
+  ? ts.parseJsonConfigFileContent(ts.readConfigFile(configPath, ts.sys.readFile).config, ts.sys, path.dirname(configPath))
+  : { options: { target: ts.ScriptTarget.ES2020, module: ts.ModuleKind.CommonJS, esModuleInterop: true, resolveJsonModule: true }, fileNames: [] };
+const compilerOptions = { ...parsedConfig.options, noEmit: true, skipLibCheck: true };
+
+const rootFiles = new Set(parsedConfig.fileNames);
+const versions = new Map();
+
+const service = ts.createLanguageService({
+  getScriptFileNames: () => Array.from(rootFiles),
+  getScriptVersion: (fileName) => String(versions.get(fileName) || 0),
+  getScriptSnapshot: (fileName) => {
+    if (!fs.existsSync(fileName)) {
+      return undefined;
+    }
+    return ts.ScriptSnapshot.fromString(fs.readFileSync(fileName, "utf-8"));
+  },
+  getCurrentDirectory: () => projectDir,
+  getCompilationSettings: () => compilerOptions,
+  getDefaultLibFileName: (options) => ts.getDefaultLibFilePath(options),
+  fileExists: ts.sys.fileExists,
+  readFile: ts.sys.readFile,
+  readDirectory: ts.sys.readDirectory,
+  directoryExists: ts.sys.directoryExists,
+  getDirectories: ts.sys.getDirectories,
+}, ts.createDocumentRegistry());
+
+function formatDiagnostic(diagnostic) {
+  const message = ts.flattenDiagnosticMessageText(diagnostic.messageText, " ");
+  if (diagnostic.file && diagnostic.start !== undefined) {
+    const { line, character } = diagnostic.file.getLineAndCharacterOfPosition(diagnostic.start);
+    return `Error: line ${line + 1}, col ${character + 1}: TS${diagnostic.code}: ${message}`;
+  }
+  return `Error: TS${diagnostic.code}: ${message}`;
+}
+
+/**
+ * Returns the name of the contract deployed or attached by an expression, or undefined.
+ */
+function contractOf(node, bindings) {
+  while (ts.isAwaitExpression(node) || ts.isParenthesizedExpression(node) || ts.isAsExpression(node) || ts.isNonNullExpression(node)) {
+    node = node.expression;
+  }
+  if (ts.isIdentifier(node)) {
+    return bindings.contracts.get(node.text);
+  }
+  if (!ts.isCallExpression(node) || !ts.isPropertyAccessExpression(node.expression)) {
+    return undefined;
+  }
+  const method = node.expression.name.text;
+  const receiver = node.expression.expression;
+  const firstArgument = node.arguments[0];
+  if ((method === "deployContract" || method === "getContractAt") && firstArgument && ts.isStringLiteralLike(firstArgument)) {
+    return firstArgument.text;
+  }
+  if (method === "deploy" && ts.isIdentifier(receiver)) {
+    return bindings.factories.get(receiver.text);
+  }
+  if (method === "connect" || method === "waitForDeployment" || method === "deployed" || method === "attach") {
+    return contractOf(receiver, bindings) || (method === "attach" && ts.isIdentifier(receiver) ? bindings.factories.get(receiver.text) : undefined);
+  }
+  return undefined;
+}
+
+function factoryOf(node) {
+  while (ts.isAwaitExpression(node) || ts.isParenthesizedExpression(node)) {
+    node = node.expression;
+  }
+  if (ts.isCallExpression(node) && ts.isPropertyAccessExpression(node.expression)
+      && node.expression.name.text === "getContractFactory" && node.arguments[0] && ts.isStringLiteralLike(node.arguments[0])) {
+    return node.arguments[0].text;
+  }
+  return undefined;
+}
+
+/**
+ * Checks the calls on contracts deployed by name against their ABI.
+ */
+function checkAbiCalls(sourceFile, abis) {
+  const bindings = { contracts: new Map(), factories: new Map() };
+  const diagnostics = [];
+
+  const bind = (name, value) => {
+    const factory = factoryOf(value);
+    if (factory !== undefined) {
+      bindings.factories.set(name, factory);
+      return;
+    }
+    const contract = contractOf(value, bindings);
+    if (contract !== undefined) {
+      bindings.contracts.set(name, contract);
+    }
+  };
+
+  const visit = (node) => {
+    if (ts.isVariableDeclaration(node) && ts.isIdentifier(node.name) && node.initializer) {
+      bind(node.name.text, node.initializer);
+    } else if (ts.isBinaryExpression(node) && node.operatorToken.kind === ts.SyntaxKind.EqualsToken && ts.isIdentifier(node.left)) {
+      bind(node.left.text, node.right);
+    } else if (ts.isCallExpression(node) && ts.isPropertyAccessExpression(node.expression)) {
+      const method = node.expression.name.text;
+      const contract = contractOf(node.expression.expression, bindings);
+      if (contract !== undefined && abis.has(contract) && !CONTRACT_MEMBERS.has(method) && !abis.get(contract).has(method)) {
+        const { line, character } = sourceFile.getLineAndCharacterOfPosition(node.expression.name.getStart(sourceFile));
+        diagnostics.push(`Error: line ${line + 1}, col ${character + 1}: ${contract} has no function '${method}' in its ABI`);
+      }
+    }
+    ts.forEachChild(node, visit);
+  };
+  visit(sourceFile);
+  return diagnostics;
+}
+
+// ABIs of the compiled contracts, loaded on first use
+let abis = null;
+
+function check(job) {
+  const testFile = path.resolve(projectDir, job.test_file);
+  // The checked file is a root only during its check: tests of previous attempts must neither grow
+  // the program nor clash with it (same top-level names), and may be moved out of the SUT afterwards
+  const added = !rootFiles.has(testFile);
+  rootFiles.add(testFile);
+  versions.set(testFile, (versions.get(testFile) || 0) + 1);
+  try {
+    const syntactic = service.getSyntacticDiagnostics(testFile);
+    if (syntactic.length > 0) {
+      // Type errors of a file that does not parse are noise
+      return { diagnostics: syntactic.slice(0, MAX_DIAGNOSTICS).map(formatDiagnostic), warnings: [] };
+    }
+    const semantic = service.getSemanticDiagnostics(testFile)
+      .filter((diagnostic) => diagnostic.category === ts.DiagnosticCategory.Error);
+    if (abis === null || abis.size === 0) {
+      abis = loadAbis();
+    }
+    const abiCalls = checkAbiCalls(service.getProgram().getSourceFile(testFile), abis);
+    return {
+      diagnostics: semantic.filter((diagnostic) => BLOCKING_DIAGNOSTICS.has(diagnostic.code)).map(formatDiagnostic)
+        .concat(abiCalls).slice(0, MAX_DIAGNOSTICS),
+      warnings: semantic.filter((diagnostic) => !BLOCKING_DIAGNOSTICS.has(diagnostic.code)).map(formatDiagnostic)
+        .slice(0, MAX_DIAGNOSTICS),
+    };
+  } finally {
+    if (added) {
+      rootFiles.delete(testFile);
+    }
+  }
+}
+
+const input = readline.createInterface({ input: process.stdin });
+input.on("line", (line) => {
+  let response;
+  try {
+    response = check(JSON.parse(line));
+  } catch (err) {
+    response = { error: String(err && err.message ? err.message : err) };
+  }
+  process.stdout.write(JSON.stringify(response) + "\n");
+});
+process.stdout.write(JSON.stringify({ ready: true }) + "\n");
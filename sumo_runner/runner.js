@@ -0,0 +1,328 @@
+/**
+ * Persistent SuMo/Hardhat test runner for Alchemist.
+ *
+ * Started once per SUT (cwd = SUT folder) by sumoDaemon.py. It loads the Hardhat
+ * runtime and the compiled artifacts once, then serves pretest/drytest jobs sent
+ * as newline-delimited JSON over a local unix socket. Drytests apply the mutant from
+ * the SuMo mutations report and run with the warm runtime too (see drytest):
+ *
+ *   {"type": "pretest", "test_file": "test/test_m1_1.ts"}
+ *   {"type": "pretests", "test_files": ["test/test_m1_1.ts", "test/test_m2_1.ts"]}
+ *   {"type": "drytest", "mutant_id": "m1", "test_file": "test/test_m1_1.ts", "package_manager": "npx"}
+ *   {"type": "drytests", "mutant_ids": ["m2", "m3"], "test_file": "test/test_m1_1.ts", "package_manager": "npx"}
+ *   {"type": "shutdown"}
+ *
+ * Usage: node runner.js <socket_path>
+ */
+const fs = require("fs");
+const net = require("net");
+const path = require("path");
+const { spawnSync } = require("child_process");
+
+const socketPath = process.argv[2];
+const projectDir = process.cwd();
+
+// Resolve hardhat and mocha from the SUT, not from Alchemist
+const hre = require(require.resolve("hardhat", { paths: [projectDir] }));
+const Mocha = require(require.resolve("mocha", { paths: [projectDir] }));
+
+// Network helpers of the SUT, if installed: their reset also drops the loadFixture snapshots of previous jobs
+let networkHelpers = null;
+try {
+  networkHelpers = require(require.resolve("@nomicfoundation/hardhat-network-helpers", { paths: [projectDir] }));
+} catch (err) {
+  // Tests without network helpers have no fixture snapshots to drop
+}
+
+/**
+ * Compiles the original contracts (incremental: only recompiles if sources changed, e.g.: after a drytest).
+ * Returns an error message, or null.
+ */
+async function compile() {
+  try {
+    await hre.run("compile", { quiet: true });
+    if (hre.artifacts.clearCache !== undefined) {
+      hre.artifacts.clearCache();
+    }
+    return null;
+  } catch (err) {
+    return "Error: " + err.message;
+  }
+}
+
+/**
+ * Resets the in-process Hardhat network to its initial state, as in a new npx process: blocks, nonces,
+ * balances and deployed contracts of previous jobs must not leak into the next one.
+ */
+async function resetNetwork() {
+  if (hre.network.name !== "hardhat") {
+    return;
+  }
+  if (networkHelpers !== null && networkHelpers.reset !== undefined) {
+    await networkHelpers.reset();
+  } else {
+    await hre.network.provider.request({ method: "hardhat_reset", params: [] });
+  }
+}
+
+/**
+ * Runs test files in a single in-process Mocha run on a fresh network and demultiplexes
+ * passes and failures by test file. Throws if a file cannot be loaded (syntax errors, missing imports, ...).
+ * Failures are reported with the same fields Alchemist extracts from the mochawesome report.
+ */
+async function runMocha(testFiles) {
+  const stats = new Map(testFiles.map((testFile) => [testFile, { failures: [], passes: 0 }]));
+  const statsOf = (runnable) => stats.get(runnable.file || (runnable.parent && runnable.parent.file));
+
+  const mocha = new Mocha({ ...hre.config.mocha, reporter: Mocha.reporters.Base });
+  testFiles.forEach((testFile) => mocha.addFile(testFile));
+
+  await resetNetwork();
+  try {
+    await new Promise((resolve, reject) => {
+      try {
+        const runner = mocha.run(() => resolve());
+        runner.on("pass", (test) => {
+          const fileStats = statsOf(test);
+          if (fileStats !== undefined) {
+            fileStats.passes += 1;
+          }
+        });
+        runner.on("fail", (test, err) => {
+          const fileStats = statsOf(test);
+          if (fileStats !== undefined) {
+            fileStats.failures.push({ "test title": test.title, "error": err && err.message });
+          }
+        });
+      } catch (err) {
+        reject(err);
+      }
+    });
+  } finally {
+    mocha.unloadFiles();
+    mocha.dispose();
+  }
+
+  return testFiles.map((testFile) => {
+    const { failures, passes } = stats.get(testFile);
+    if (failures.length > 0) {
+      return { ok: false, errors: failures };
+    }
+    if (passes === 0) {
+      return { ok: false, errors: ["empty-test-file"] };
+    }
+    return { ok: true, errors: [] };
+  });
+}
+
+function loadError(err) {
+  const message = (err && err.message) ? err.message : "syntax error";
+  return { ok: false, errors: ["Error: " + message.split("\n")[0]] };
+}
+
+/**
+ * Runs a single test file in-process on the original contracts.
+ */
+async function pretest(job) {
+  const compileError = await compile();
+  if (compileError !== null) {
+    return { ok: false, errors: [compileError] };
+  }
+  try {
+    return (await runMocha([path.resolve(projectDir, job.test_file)]))[0];
+  } catch (err) {
+    return loadError(err);
+  }
+}
+
+/**
+ * Runs several test files with a single compilation and Mocha run.
+ * If a file cannot be loaded, the files are run one at a time so its error is only reported for it.
+ */
+async function pretests(job) {
+  const compileError = await compile();
+  if (compileError !== null) {
+    return { results: job.test_files.map(() => ({ ok: false, errors: [compileError] })) };
+  }
+  try {
+    return { results: await runMocha(job.test_files.map((testFile) => path.resolve(projectDir, testFile))) };
+  } catch (err) {
+    const results = [];
+    for (const testFile of job.test_files) {
+      results.push(await pretest({ test_file: testFile }));
+    }
+    return { results };
+  }
+}
+
+// Reports where SuMo saves the mutants it generated (file, start, end, replace of each mutant)
+const MUTATIONS_REPORTS = ["sumo/results/mutations.json", ".sumo/results/mutations.json"];
+let mutationsById = null;
+
+/**
+ * Returns the mutant generated by SuMo with the given id (hash), or null if it is not in its report.
+ */
+function findMutant(mutantId) {
+  if (mutationsById === null) {
+    mutationsById = new Map();
+    const reportPath = MUTATIONS_REPORTS.map((report) => path.join(projectDir, report)).find((report) => fs.existsSync(report));
+    if (reportPath !== undefined) {
+      for (const mutations of Object.values(JSON.parse(fs.readFileSync(reportPath, "utf-8")))) {
+        for (const mutation of mutations) {
+          mutationsById.set(mutation.id || mutation.hash, mutation);
+        }
+      }
+    }
+  }
+  const mutation = mutationsById.get(mutantId);
+  if (mutation === undefined || mutation.file === undefined || mutation.start === undefined || mutation.end === undefined) {
+    return null;
+  }
+  return mutation;
+}
+
+// Journal of the contract mutated by the running drytest (its path in the SUT and original source), so that the
+// original is restored even if the runner is killed mid-job (on its next start, or by sumoDaemon.py)
+const MUTATION_JOURNAL = path.join(projectDir, ".alchemist_drytest.json");
+
+/**
+ * Restores the contract mutated by an interrupted drytest, if any.
+ */
+function restoreMutatedContract() {
+  if (!fs.existsSync(MUTATION_JOURNAL)) {
+    return;
+  }
+  const { file, original } = JSON.parse(fs.readFileSync(MUTATION_JOURNAL, "utf-8"));
+  fs.writeFileSync(path.resolve(projectDir, file), original);
+  fs.unlinkSync(MUTATION_JOURNAL);
+}
+
+/**
+ * Runs the SuMo CLI (a cold Hardhat process) for mutants the runner cannot apply itself.
+ */
+function cliDrytest(job) {
+  const result = spawnSync(job.package_manager || "npx", ["sumo", "testDry", job.mutant_id, job.test_file], {
+    cwd: projectDir,
+    encoding: "utf-8",
+    maxBuffer: 256 * 1024 * 1024,
+  });
+  return { returncode: result.status, stdout: result.stdout || "", stderr: result.stderr || "" };
+}
+
+/**
+ * Applies a mutant to its contract as SuMo does (the replacement between its start and end offsets),
+ * compiles it and runs the test file with the warm Hardhat runtime, then restores the original contract.
+ * The outcome is reported with the messages of the SuMo CLI. Mutants missing from the SuMo report
+ * (e.g.: no report in the SUT) are delegated to the SuMo CLI.
+ */
+async function drytest(job) {
+  const mutation = findMutant(job.mutant_id);
+  if (mutation === null) {
+    return cliDrytest(job);
+  }
+  const contractPath = path.resolve(projectDir, mutation.file);
+  const original = fs.readFileSync(contractPath, "utf-8");
+  fs.writeFileSync(MUTATION_JOURNAL, JSON.stringify({ file: mutation.file, original }));
+  try {
+    fs.writeFileSync(contractPath, original.slice(0, mutation.start) + mutation.replace + original.slice(mutation.end));
+    const compileError = await compile();
+    if (compileError !== null) {
+      return { returncode: 1, stdout: "", stderr: `Mutant ${job.mutant_id} could not be compiled: ${compileError}` };
+    }
+    let result;
+    try {
+      result = (await runMocha([path.resolve(projectDir, job.test_file)]))[0];
+    } catch (err) {
+      return { returncode: 1, stdout: "", stderr: loadError(err).errors[0] };
+    }
+    const killed = !result.ok && result.errors[0] !== "empty-test-file";
+    return { returncode: 0, stdout: `Mutant ${job.mutant_id} ` + (killed ? "was killed by the tests" : "survived testing"), stderr: "" };
+  } finally {
+    // The original contract is recompiled incrementally by the next job
+    restoreMutatedContract();
+  }
+}
+
+/**
+ * Drytests of several mutants with the same test file (e.g.: sweep of a killer test).
+ */
+async function drytests(job) {
+  const results = [];
+  for (const mutantId of job.mutant_ids) {
+    results.push(await drytest({ ...job, mutant_id: mutantId }));
+  }
+  return { results };
+}
+
+async function handle(job) {
+  if (job.type === "pretest") {
+    return pretest(job);
+  } else if (job.type === "pretests") {
+    return pretests(job);
+  } else if (job.type === "drytest") {
+    return drytest(job);
+  } else if (job.type === "drytests") {
+    return drytests(job);
+  } else if (job.type === "ping") {
+    return { ok: true };
+  }
+  return { error: `Unsupported job type: ${job.type}` };
+}
+
+// Jobs share the SUT, so they are executed one at a time
+let queue = Promise.resolve();
+
+const server = net.createServer((connection) => {
+  let buffer = "";
+  connection.setEncoding("utf-8");
+  // A client gone before its response must not bring down the runner
+  connection.on("error", (err) => console.error("Connection error:", err.message));
+  connection.on("data", (chunk) => {
+    buffer += chunk;
+    let newline;
+    while ((newline = buffer.indexOf("\n")) !== -1) {
+      const line = buffer.slice(0, newline);
+      buffer = buffer.slice(newline + 1);
+      let job;
+      try {
+        job = JSON.parse(line);
+      } catch (err) {
+        // A malformed line only fails its own job, not the runner
+        queue = queue.then(() => connection.write(JSON.stringify({ error: "Malformed job: " + err.message }) + "\n"));
+        continue;
+      }
+
+      if (job.type === "shutdown") {
+        // The running drytest restores its contract before the runner exits
+        queue = queue.then(() => {
+          connection.end(JSON.stringify({ ok: true }) + "\n");
+          server.close();
+          process.exit(0);
+        });
+        continue;
+      }
+      queue = queue
+        .then(() => handle(job))
+        .catch((err) => ({ error: String(err && err.stack ? err.stack : err) }))
+        .then((response) => connection.write(JSON.stringify(response) + "\n"));
+    }
+  });
+});
+
+// Interrupted (e.g.: Ctrl-C to the process group): the SUT must not be left mutated
+for (const [signal, code] of [["SIGINT", 130], ["SIGTERM", 143]]) {
+  process.on(signal, () => {
+    restoreMutatedContract();
+    process.exit(code);
+  });
+}
+restoreMutatedContract();
+
+if (fs.existsSync(socketPath)) {
+  fs.unlinkSync(socketPath);
+}
+
+// Warm up the compilation cache before accepting jobs
+hre.run("compile", { quiet: true })
+  .catch((err) => console.error("Initial compilation failed:", err.message))
+  .then(() => server.listen(socketPath, () => console.log(`SuMo runner listening on ${socketPath}`)));
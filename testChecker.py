@@ -0,0 +1,159 @@
+import atexit
+import json
+import os
+import subprocess
+import threading
+from utils import get_relative_test_file_path
+
+CHECKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sumo_runner", "checker.js")
+
+# Static check of generated tests before their pretest (see configure_static_check)
+static_check = False
+
+
+def configure_static_check(enabled: bool):
+    """
+    Enable the static check of generated tests: syntax errors, unresolved imports and calls to functions missing
+    from the ABI are reported without running the (expensive) SuMo pretest. The other type errors are only
+    logged, since Hardhat runs tests without type-checking them.
+
+    :param enabled: True to enable the check
+    """
+    global static_check
+    static_check = enabled
+
+
+class TestChecker:
+    """
+    Client of a persistent TypeScript checker (sumo_runner/checker.js) serving a single SUT.
+    The checker keeps a TypeScript language service on the SUT's tsconfig and typechain types,
+    so each check only re-analyzes the test file. Jobs are newline-delimited JSON over stdin/stdout.
+    """
+    def __init__(self, project_dir: str):
+        """
+        Starts the checker for the given SUT.
+
+        :param project_dir: the SUT folder
+        """
+        self.project_dir = os.path.abspath(project_dir)
+        self._lock = threading.Lock()
+
+        print(f"### <Static check>: starting checker for {self.project_dir}")
+        self.process = subprocess.Popen(['node', CHECKER_SCRIPT],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL,
+                                        text=True,
+                                        cwd=self.project_dir
+                                        )
+        ready = self._read()
+        if "error" in ready:
+            self.close()
+            raise RuntimeError(ready["error"])
+
+    def _read(self) -> dict:
+        line = self.process.stdout.readline()
+        if not line:
+            return {"error": f"The checker exited with code {self.process.poll()}"}
+        return json.loads(line)
+
+    def check(self, test_file_path: str) -> list:
+        """
+        Checks a test file.
+
+        :param test_file_path: the absolute path to the test file
+        :return: the list of errors (empty if the test file passed the check)
+        """
+        with self._lock:
+            self.process.stdin.write(json.dumps({"test_file": get_relative_test_file_path(test_file_path)}) + "\n")
+            self.process.stdin.flush()
+            response = self._read()
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        if response.get("warnings"):
+            print(f"### <Static check>: type errors in {test_file_path} (not failing the pretest): {response['warnings']}")
+        return response["diagnostics"]
+
+    def exited(self) -> bool:
+        """
+        Returns True if the checker process exited (waiting briefly, since a failed check may precede its exit).
+        """
+        try:
+            self.process.wait(timeout=1)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+
+    def close(self):
+        """
+        Stops the checker.
+        """
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+# One checker per SUT, None if the checker cannot run there (e.g.: no typescript)
+_checkers = {}
+_checkers_lock = threading.Lock()
+
+
+def _get_checker(key: str) -> TestChecker:
+    # Returns the checker of a SUT, starting it if needed (None if it cannot run there)
+    with _checkers_lock:
+        if key not in _checkers:
+            try:
+                _checkers[key] = TestChecker(key)
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"### <Static check>: disabled for {key}: {e}")
+                _checkers[key] = None
+        return _checkers[key]
+
+
+def check_test_file(test_file_path: str, project_dir: str) -> list:
+    """
+    Statically checks a generated test file, starting the checker of the SUT on first use.
+    If the checker cannot run (e.g.: typescript is not installed in the SUT), the test file is
+    considered valid and left to the pretest. A checker that died since it was started is restarted once.
+
+    :param test_file_path: the absolute path to the test file
+    :param project_dir: the SUT folder
+    :return: the list of errors (empty if the test file passed the check)
+    """
+    key = os.path.abspath(project_dir)
+    for attempt in range(2):
+        checker = _get_checker(key)
+        if checker is None:
+            return []
+        try:
+            return checker.check(test_file_path)
+        except (OSError, RuntimeError, ValueError) as e:
+            if not checker.exited():
+                print(f"### <Static check>: check of {test_file_path} failed: {e}")
+                return []
+            # The checker died: forget it, so that it is started again
+            with _checkers_lock:
+                if _checkers.get(key) is checker:
+                    del _checkers[key]
+            if attempt == 0:
+                print(f"### <Static check>: the checker of {key} exited with code {checker.process.returncode} - restarting it")
+            else:
+                print(f"### <Static check>: check of {test_file_path} failed: {e}")
+    return []
+
+
+def shutdown_test_checkers():
+    """
+    Stops all the running checkers.
+    """
+    with _checkers_lock:
+        for checker in _checkers.values():
+            if checker is not None:
+                checker.close()
+        _checkers.clear()
+
+
+atexit.register(shutdown_test_checkers)
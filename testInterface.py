@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import shutil
@@ -5,8 +6,91 @@ import sys
 import subprocess
 import pandas as pd
 import time
+from dotenv import load_dotenv
 from utils import *
+from mutantArtifactCache import MutantArtifactCache
+from runTrace import traced_sumo, traced_sumo_batch
+
+try:
+    # Optional: stream large mochawesome reports instead of loading them at once
+    import ijson
+except ImportError:
+    ijson = None
+
+# Max time (in seconds) to wait for the mochawesome report of a failed pretest
+mocha_report_timeout = float(os.getenv("MOCHA_REPORT_TIMEOUT", "3"))
+
+# How SuMo is invoked: "cli" spawns npx sumo for each call, "daemon" uses a persistent runner per SUT
+sumo_runner = "cli"
+
+def configure_sumo_runner(runner: str):
+    """
+    Select how SuMo pretests and drytests are executed.
     
+    :param runner: cli (a new npx sumo process per call) or daemon (a persistent runner per SUT, see sumoDaemon.py)
+    """
+    global sumo_runner
+    if runner not in ["cli", "daemon"]:
+        raise ValueError(f"Unsupported SuMo runner: {runner}")
+    sumo_runner = runner
+
+# Executor that takes over SuMo calls (e.g.: the asyncio pipeline), None to run them in the calling thread
+sumo_executor = None
+
+def configure_sumo_executor(executor):
+    """
+    Route SuMo pretests and drytests through an executor exposing run_sumo_pretest and run_sumo_drytest.
+    
+    :param executor: the executor, or None to run SuMo in the calling thread
+    """
+    global sumo_executor
+    sumo_executor = executor
+    
+# Cache of the compiled artifacts of mutants, None if disabled
+mutant_artifact_cache = None
+
+def configure_mutant_artifact_cache(enabled: bool):
+    """
+    Enable the on-disk cache of compiled mutant artifacts, so that drytests of a mutant already compiled
+    (in a previous attempt or run) do not recompile it.
+    The cache folder and max size are read from the MUTANT_CACHE_DIR and MUTANT_CACHE_MAX_MB env variables.
+    
+    :param enabled: True to enable the cache
+    """
+    global mutant_artifact_cache
+    if enabled:
+        load_dotenv()
+        cache_dir = os.getenv("MUTANT_CACHE_DIR", os.path.join(os.getcwd(), "mutant_cache"))
+        max_size = int(float(os.getenv("MUTANT_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+        mutant_artifact_cache = MutantArtifactCache(cache_dir, max_size)
+    else:
+        mutant_artifact_cache = None
+
+def restore_mutant_artifacts(mutant_id : str, project_dir:str):
+    """
+    Before a drytest: restore the cached compiled artifacts of the mutant into the SUT.
+    
+    :return: the cache key of the mutant (None if the cache is disabled)
+    """
+    if mutant_artifact_cache is None:
+        return None
+    key = mutant_artifact_cache.key(mutant_id, project_dir)
+    if mutant_artifact_cache.restore(key, project_dir):
+        print(f"### <SuMo>: reusing the compiled artifacts of mutant {mutant_id}")
+    return key
+
+def store_mutant_artifacts(key : str, project_dir:str, outcome : str):
+    """
+    After a drytest: cache the compiled artifacts of the mutant, unless the drytest failed.
+    """
+    if key is None:
+        return
+    if outcome in ["live", "killed"]:
+        mutant_artifact_cache.store(key, project_dir)
+    else:
+        mutant_artifact_cache.discard(key, project_dir)
+
+@traced_sumo("pretest")
 def run_sumo_pretest(test_file_path : str,  project_dir:str) -> str:
     """
     Run sumo pretest on a given test file.
@@ -18,6 +102,11 @@ def run_sumo_pretest(test_file_path : str,  project_dir:str) -> str:
              True - If the pretest is successfull
              HardHat's error message -  if the pretest failed
     """
+    if sumo_executor is not None:
+        return sumo_executor.run_sumo_pretest(test_file_path, project_dir)
+    if sumo_runner == "daemon":
+        from sumoDaemon import get_sumo_daemon
+        return get_sumo_daemon(project_dir).run_sumo_pretest(test_file_path)
         
     package_manager = check_package_manager(project_dir)
     
@@ -51,6 +140,7 @@ def run_sumo_pretest(test_file_path : str,  project_dir:str) -> str:
         print("### An error occurred:", str(e))
 
 
+@traced_sumo("drytest")
 def run_sumo_drytest(mutant_id : str, test_file_path : str, project_dir:str) -> str:
     """
     Run sumo drytest on a given mutant and test file.
@@ -64,6 +154,11 @@ def run_sumo_drytest(mutant_id : str, test_file_path : str, project_dir:str) ->
              killed -  if the mutant was killed by the test
              Errror message -  if an error occurred             
     """
+    if sumo_executor is not None:
+        return sumo_executor.run_sumo_drytest(mutant_id, test_file_path, project_dir)
+    if sumo_runner == "daemon":
+        from sumoDaemon import get_sumo_daemon
+        return get_sumo_daemon(project_dir).run_sumo_drytest(mutant_id, test_file_path)
     
     package_manager = check_package_manager(project_dir)
     print("Run: ", package_manager, " sumo test ",mutant_id, test_file_path)  
@@ -73,6 +168,7 @@ def run_sumo_drytest(mutant_id : str, test_file_path : str, project_dir:str) ->
     relative_test_file_path = os.path.join(dir_name, file_name)
     
     try:
+        artifacts_key = restore_mutant_artifacts(mutant_id, project_dir)
         result = subprocess.run(['npx', 'sumo', 'testDry', mutant_id, relative_test_file_path], 
                                 stdout=subprocess.PIPE, 
                                 stderr=subprocess.PIPE, 
@@ -84,13 +180,98 @@ def run_sumo_drytest(mutant_id : str, test_file_path : str, project_dir:str) ->
         if result.returncode == 0:
             print("Script executed successfully")
             print("Output:\n", result.stdout)
-            return parse_sumo_drytest(result.stdout)
+            outcome = parse_sumo_drytest(result.stdout)
             
         else:
             print("Script failed with errors")
             print("Error:\n", result.stderr)
-            return parse_sumo_drytest(result.stderr)            
+            outcome = parse_sumo_drytest(result.stderr)            
+        
+        store_mutant_artifacts(artifacts_key, project_dir, outcome)
+        return outcome
+    
+    except Exception as e:
+        print("An error occurred:", str(e))
+
+
+@traced_sumo_batch("drytest")
+def run_sumo_drytests(mutant_ids : list, test_file_path : str, project_dir:str) -> dict:
+    """
+    Run sumo drytest on several mutants with the same test file (e.g.: a killer test swept across
+    the other live mutants). With the daemon runner, the mutants are sent to the runner as a single job.
+    
+    :param mutant_ids: the hashes of the mutants to be tested, in order
+    :param test_file_path: the absolute path to the test file to be run
+    :param project_dir: project folder
+       
+    :return: the outcome of the drytest (live, killed or an error message) of each mutant
+    """
+    if sumo_executor is None and sumo_runner == "daemon" and mutant_artifact_cache is None:
+        from sumoDaemon import get_sumo_daemon
+        return get_sumo_daemon(project_dir).run_sumo_drytests(mutant_ids, test_file_path)
+    
+    return {mutant_id: run_sumo_drytest(mutant_id, test_file_path, project_dir) for mutant_id in mutant_ids}
+
+
+async def async_run_command(command: list, cwd: str) -> tuple[int, str, str]:
+    """
+    Run a command without blocking the event loop.
     
+    :param command: the command to be run
+    :param cwd: the working directory
+    
+    :return: the return code, stdout and stderr of the command
+    """
+    process = await asyncio.create_subprocess_exec(*command,
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE,
+                                                   cwd=cwd
+                                                   )
+    stdout, stderr = await process.communicate()
+    return process.returncode, stdout.decode('utf-8', errors='replace'), stderr.decode('utf-8', errors='replace')
+
+
+async def async_run_sumo_pretest(test_file_path : str,  project_dir:str) -> str:
+    """
+    Run sumo pretest on a given test file as an asyncio subprocess (see run_sumo_pretest).
+    
+    :param test_file_path: the absolute path to the test file to be run
+    :project_dir: project folder
+       
+    :return: True - If the pretest is successfull
+             HardHat's error message -  if the pretest failed
+    """
+    package_manager = check_package_manager(project_dir)
+    relative_test_file_path = get_relative_test_file_path(test_file_path)
+    print(f"### <Run SuMo>: {package_manager} sumo pretest {project_dir}/{relative_test_file_path}")  
+    
+    try:
+        returncode, stdout, stderr = await async_run_command([package_manager, 'sumo', 'pretest', relative_test_file_path], project_dir)
+        # Parsing may wait for the mochawesome report: keep it off the event loop
+        return await asyncio.to_thread(parse_sumo_pretest, stdout, stderr, project_dir)
+    except Exception as e:
+        print("### An error occurred:", str(e))
+
+
+async def async_run_sumo_drytest(mutant_id : str, test_file_path : str, project_dir:str) -> str:
+    """
+    Run sumo drytest on a given mutant and test file as an asyncio subprocess (see run_sumo_drytest).
+    
+    :param mutant_id: the hash of the mutant to be tested
+    :param test_file_path: the absolute path to the test file to be run
+    :param project_dir: project folder
+       
+    :return: live, killed or an error message
+    """
+    relative_test_file_path = get_relative_test_file_path(test_file_path)
+    print("Run: npx sumo testDry", mutant_id, relative_test_file_path)  
+    
+    try:
+        artifacts_key = await asyncio.to_thread(restore_mutant_artifacts, mutant_id, project_dir)
+        returncode, stdout, stderr = await async_run_command(['npx', 'sumo', 'testDry', mutant_id, relative_test_file_path], project_dir)
+        outcome = parse_sumo_drytest(stdout if returncode == 0 else stderr)
+        await asyncio.to_thread(store_mutant_artifacts, artifacts_key, project_dir, outcome)
+        return outcome
     except Exception as e:
         print("An error occurred:", str(e))
         
@@ -116,23 +297,20 @@ def parse_sumo_pretest(stdout : str, stderr: str, project_dir:str) -> str:
    
     if success == False:
         print("#### Wait and read mochawesome")
-        time.sleep(3)  # Wait for a couple of seconds before reading file
 
-        if os.path.isfile(mochatestFile):
+        # mochawesome logs where it saves the report: when it did not, a report is unlikely and the wait is short
+        report_timeout = mocha_report_timeout if is_string_in_message("[mochawesome]", stdout) else min(mocha_report_timeout, 0.5)
+        if wait_for_mocha_report(mochatestFile, report_timeout):
             print("#### mocha report exists")
             
-            with open(mochatestFile, 'r') as file:
-                    # Load the JSON data using json.load()
-                    testing_report = json.load(file)
-                    
-            # Main logic to go through the report
-            if not isinstance(testing_report["results"][0], bool):        
-                for result in testing_report["results"]: 
+            with open(mochatestFile, 'rb') as file:
+                for result in iter_report_results(file):
+                    if isinstance(result, bool):
+                        print("#### The test file is empty.")
+                        failed_tests.append("empty-test-file")
+                        break
                     # Handle any top-level hooks or tests directly within the result object
                     extract_errors_from_suite(result, failed_tests)
-            else:
-                print("#### The test file is empty.", testing_report)
-                failed_tests.append("empty-test-file")
         else : 
             print("####  The mocha report was not created: Extracting error message from stderr.")
             # Extract specific error message
@@ -160,6 +338,45 @@ def parse_sumo_pretest(stdout : str, stderr: str, project_dir:str) -> str:
     else:
         return "True"
 
+def wait_for_mocha_report(report_path: str, timeout: float) -> bool:
+    """
+    Wait until the mochawesome report is written: poll with a short exponential backoff until the
+    report exists and its size is stable, or the deadline is reached.
+    The report is usually there as soon as SuMo exits, so there is no wait in the common case.
+    
+    :param report_path: the path to the mochawesome JSON report
+    :param timeout: max time (in seconds) to wait for the report
+    :return: True if the report is ready, False otherwise
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    last_size = None
+    while True:
+        if os.path.isfile(report_path):
+            size = os.path.getsize(report_path)
+            if size > 0 and size == last_size:
+                return True
+            last_size = size
+        if time.monotonic() >= deadline:
+            # A report still being written is read anyway (as with the previous fixed wait)
+            return last_size is not None and last_size > 0
+        time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+        delay = min(delay * 2, 0.25)
+
+
+def iter_report_results(report_file):
+    """
+    Yield the results (top-level suites) of a mochawesome report one at a time, parsing the report
+    incrementally when ijson is installed.
+    
+    :param report_file: the report, opened in binary mode
+    """
+    if ijson is not None:
+        yield from ijson.items(report_file, 'results.item')
+    else:
+        yield from json.load(report_file)["results"]
+
+
 def parse_sumo_drytest(stdout : str) -> str:
     """
     Parse the stdout of sumo drytest.
@@ -222,29 +439,34 @@ def check_package_manager(project_dir:str) -> str:
 
 
 def extract_errors_from_suite(suite_or_result, failed_tests):
-    # Check for "beforeHooks" and add failed hooks
-    if "beforeHooks" in suite_or_result:
-        for hook in suite_or_result["beforeHooks"]:
-            print("##Found hook")            
-            if hook["state"] == "failed":
-                print("##Found failed hook", hook["title"])
-                failed_tests.append({
-                    "test title": hook["title"],
-                    "error": hook["err"]["message"],
-                })
-
-    # Check for tests and add failed tests
-    if "tests" in suite_or_result:
-        for test in suite_or_result["tests"]:
-            #print("##Found test")                        
-            if test["state"] == "failed":
-                print("### Failed test name: ", test["title"])     
-                failed_tests.append({
-                    "test title": test["title"],
-                    "error": test["err"]["message"],
-                })
-
-    # If the suite has nested suites, recursively process them
-    if "suites" in suite_or_result:
-        for nested_suite in suite_or_result["suites"]:
-            extract_errors_from_suite(nested_suite, failed_tests)
\ No newline at end of file
+    # Visit the suite and its nested suites depth-first, in report order (iteratively, so deeply
+    # nested reports cannot exceed the recursion limit)
+    suites = [suite_or_result]
+    while suites:
+        suite = suites.pop()
+        
+        # Check for "beforeHooks" and add failed hooks
+        if "beforeHooks" in suite:
+            for hook in suite["beforeHooks"]:
+                print("##Found hook")            
+                if hook["state"] == "failed":
+                    print("##Found failed hook", hook["title"])
+                    failed_tests.append({
+                        "test title": hook["title"],
+                        "error": hook["err"]["message"],
+                    })
+
+        # Check for tests and add failed tests
+        if "tests" in suite:
+            for test in suite["tests"]:
+                #print("##Found test")                        
+                if test["state"] == "failed":
+                    print("### Failed test name: ", test["title"])     
+                    failed_tests.append({
+                        "test title": test["title"],
+                        "error": test["err"]["message"],
+                    })
+
+        # Nested suites are processed next, in order
+        if "suites" in suite:
+            suites.extend(reversed(suite["suites"]))
\ No newline at end of file
@@ -1,6 +1,7 @@
 import os
 import re
 import shutil
+import resultsArchive
           
 def saveInteraction(interactions_dir: str, fileName:str, prompt:str, response:str):  
     """
@@ -10,6 +11,10 @@ def saveInteraction(interactions_dir: str, fileName:str, prompt:str, response:st
     :prompt: prompt used for the request
     :response: response from the model 
     """     
+    if resultsArchive.results_archive is not None:
+        resultsArchive.results_archive.put_interaction(fileName, prompt, response)
+        print("## <RESPONSE> archived as ", fileName + "\n")
+        return
     
     prompt_file_path = os.path.join(interactions_dir, f"interaction_{fileName}.txt")
         
@@ -78,6 +83,16 @@ def save_testfile_in_SUT(mutant_id: str, test_folder:str, test_file_code:str, te
     save_file(test_file_path, test_file_code)
     return test_file_path    
 
+def get_relative_test_file_path(test_file_path: str) -> str:
+    """
+    Returns the path of a test file relative to the SUT (e.g.: test/test_m1_1.ts)
+    
+    :param test_file_path: the path to the test file
+    """
+    file_name = os.path.basename(test_file_path)
+    dir_name = os.path.basename(os.path.dirname(test_file_path))
+    return os.path.join(dir_name, file_name)
+
 def save_test_to_file(path:str, content:str):
     """
     Saves a test file to a specified path.    
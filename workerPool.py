@@ -0,0 +1,113 @@
+import os
+import queue
+import shutil
+
+# Entries of the SUT that are never cloned into a worker workspace
+CLONE_EXCLUDED = [".git", "mochawesome-report"]
+
+# Entries of the SUT that are only read at runtime and can be hardlinked instead of copied
+CLONE_HARDLINKED = ["node_modules"]
+
+
+def link_or_copy(source_path: str, destination_path: str):
+    """
+    Hardlinks a file to the destination path, falling back to a regular copy
+    when hardlinks are not supported (e.g.: different filesystems).
+
+    :param source_path: the path of the file to be linked
+    :param destination_path: the path of the link to be created
+    """
+    try:
+        os.link(source_path, destination_path)
+    except OSError:
+        shutil.copy2(source_path, destination_path)
+
+
+def clone_sut(sut_path: str, clone_path: str) -> str:
+    """
+    Creates an isolated clone of the SUT for a worker.
+    Read-only dependencies (node_modules) are hardlinked, while sources, tests and
+    build artifacts are copied, since SuMo mutates contracts in place and generated
+    tests are written into the test folder.
+
+    :param sut_path: the path to the SUT
+    :param clone_path: the path where the clone will be created
+
+    :return: the path to the cloned SUT
+    """
+    if os.path.exists(clone_path):
+        shutil.rmtree(clone_path)
+    os.makedirs(clone_path)
+
+    for entry in os.listdir(sut_path):
+        if entry in CLONE_EXCLUDED:
+            continue
+        source = os.path.join(sut_path, entry)
+        destination = os.path.join(clone_path, entry)
+
+        if os.path.isdir(source) and not os.path.islink(source):
+            if entry in CLONE_HARDLINKED:
+                shutil.copytree(source, destination, symlinks=True, copy_function=link_or_copy)
+            else:
+                shutil.copytree(source, destination, symlinks=True)
+        else:
+            shutil.copy2(source, destination, follow_symlinks=False)
+
+    return clone_path
+
+
+class Workspace:
+    """
+    A cloned SUT owned by a single worker.
+
+    :worker_id: the worker number
+    :sut_path: path to the cloned SUT
+    :test_dir: path to the test folder of the cloned SUT
+    """
+    def __init__(self, worker_id: int, sut_path: str):
+        self.worker_id = worker_id
+        self.sut_path = sut_path
+        self.test_dir = os.path.join(sut_path, "test")
+
+
+class WorkspacePool:
+    """
+    A pool of isolated SUT clones. Each mutant being processed acquires a workspace,
+    so that generated tests and mochawesome reports of concurrent mutants never collide.
+    """
+    def __init__(self, sut_path: str, workspaces_dir: str, size: int):
+        """
+        :param sut_path: the path to the SUT
+        :param workspaces_dir: the folder where the clones are created
+        :param size: the number of workspaces (workers)
+        """
+        self.workspaces_dir = workspaces_dir
+        self.workspaces = []
+        self._available = queue.Queue()
+
+        os.makedirs(workspaces_dir, exist_ok=True)
+        for worker_id in range(size):
+            clone_path = os.path.join(workspaces_dir, f"worker_{worker_id}")
+            print(f"## Cloning SUT for worker {worker_id} into {clone_path}")
+            workspace = Workspace(worker_id, clone_sut(os.path.abspath(sut_path), clone_path))
+            self.workspaces.append(workspace)
+            self._available.put(workspace)
+
+    def acquire(self) -> Workspace:
+        """
+        Blocks until a workspace is available and returns it.
+        """
+        return self._available.get()
+
+    def release(self, workspace: Workspace):
+        """
+        Returns a workspace to the pool.
+        """
+        self._available.put(workspace)
+
+    def cleanup(self):
+        """
+        Deletes all the cloned workspaces.
+        """
+        shutil.rmtree(self.workspaces_dir, ignore_errors=True)
+